@@ -0,0 +1,237 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = []
+# ///
+
+import sqlite3
+import sys
+from pathlib import Path
+
+from migrate import optimize_database, table_exists
+from node_profile import CLIMATE_COLUMNS
+
+# Rollup levels: (rollup table, t_node_profile column keying it)
+ROLLUP_LEVELS = {
+    "department": ("t_department_rollup", "department_code"),
+    "region": ("t_region_rollup", "region_code"),
+}
+
+# Aggregated metrics: rollup column prefix -> (t_node_profile column, SQL type
+# of the sum)
+ROLLUP_METRICS = {
+    "population": ("population", "INTEGER"),
+    "museums": ("museum_count", "INTEGER"),
+    **{column: (column, "REAL") for column in CLIMATE_COLUMNS},
+}
+
+
+def create_rollup_tables(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the t_department_rollup and t_region_rollup tables.
+
+    Each metric has a count of the stations where it is known, a sum and a
+    generated mean, so that rows can be updated by adding and subtracting
+    stations.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    metric_columns = ",\n".join(
+        f"""            {name}_count INTEGER NOT NULL DEFAULT 0,
+            {name}_sum {sum_type} NOT NULL DEFAULT 0,
+            {name}_mean REAL GENERATED ALWAYS AS (
+                CAST({name}_sum AS REAL) / NULLIF({name}_count, 0)
+            ) VIRTUAL"""
+        for name, (_, sum_type) in ROLLUP_METRICS.items()
+    )
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS t_department_rollup (
+            department_code TEXT PRIMARY KEY,
+            region_code TEXT,
+            station_count INTEGER NOT NULL DEFAULT 0,
+{metric_columns}
+        )
+    """)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS t_region_rollup (
+            region_code TEXT PRIMARY KEY,
+            station_count INTEGER NOT NULL DEFAULT 0,
+{metric_columns}
+        )
+    """)
+
+
+def canonical_condition(cursor: sqlite3.Cursor, node_id: str) -> str:
+    """
+    Build the SQL condition selecting the profiles counted as stations: the
+    canonical node of each physical station, or every node.
+
+    Args:
+        cursor: SQLite database cursor
+        node_id: SQL expression of the node id, e.g. "new.node_id"
+
+    Returns:
+        SQL condition
+    """
+    if table_exists(cursor, "t_physical_station"):
+        return f"{node_id} IN (SELECT node_id FROM t_physical_station)"
+    return "1"
+
+
+def create_rollup_triggers(cursor: sqlite3.Cursor) -> None:
+    """
+    (Re)create the triggers adding the t_node_profile rows to the rollups and
+    subtracting them.
+
+    t_node_profile is refreshed by deleting and reinserting the rows of the
+    changed nodes, so the rollups follow every stage that refreshes profiles.
+    The triggers depend on t_physical_station, so this is called again once it
+    is created.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'area_rollup_%'"
+    )
+    for (name,) in cursor.fetchall():
+        cursor.execute(f"DROP TRIGGER {name}")
+
+    def add(row: str) -> str:
+        statements = []
+        for level, (table, key) in ROLLUP_LEVELS.items():
+            region = ["region_code"] if level == "department" else []
+            columns = [key, *region, "station_count"]
+            values = [f"{row}.{key}", *(f"{row}.{c}" for c in region), "1"]
+            updates = ["station_count = station_count + 1"]
+            updates += [f"{c} = excluded.{c}" for c in region]
+            for name, (column, _) in ROLLUP_METRICS.items():
+                columns += [f"{name}_count", f"{name}_sum"]
+                values += [
+                    f"{row}.{column} IS NOT NULL",
+                    f"COALESCE({row}.{column}, 0)",
+                ]
+                updates += [
+                    f"{name}_count = {name}_count + excluded.{name}_count",
+                    f"{name}_sum = {name}_sum + excluded.{name}_sum",
+                ]
+            statements.append(f"""
+                INSERT INTO {table} ({", ".join(columns)})
+                SELECT {", ".join(values)}
+                WHERE {row}.{key} IS NOT NULL
+                    AND {canonical_condition(cursor, f"{row}.node_id")}
+                ON CONFLICT ({key}) DO UPDATE SET {", ".join(updates)};
+            """)
+        return "".join(statements)
+
+    def remove(row: str) -> str:
+        statements = []
+        for table, key in ROLLUP_LEVELS.values():
+            updates = ["station_count = station_count - 1"]
+            for name, (column, _) in ROLLUP_METRICS.items():
+                updates += [
+                    f"{name}_count = {name}_count - ({row}.{column} IS NOT NULL)",
+                    f"{name}_sum = {name}_sum - COALESCE({row}.{column}, 0)",
+                ]
+            statements.append(f"""
+                UPDATE {table} SET {", ".join(updates)}
+                WHERE {key} = {row}.{key}
+                    AND {canonical_condition(cursor, f"{row}.node_id")};
+                DELETE FROM {table} WHERE {key} = {row}.{key} AND station_count <= 0;
+            """)
+        return "".join(statements)
+
+    triggers = {
+        "insert": ("AFTER INSERT ON t_node_profile", add("new")),
+        "update": ("AFTER UPDATE ON t_node_profile", remove("old") + add("new")),
+        "delete": ("AFTER DELETE ON t_node_profile", remove("old")),
+    }
+    for name, (event, statements) in triggers.items():
+        cursor.execute(f"""
+            CREATE TRIGGER area_rollup_{name} {event}
+            BEGIN
+                {statements}
+            END
+        """)
+
+
+def rebuild_rollups(cursor: sqlite3.Cursor) -> None:
+    """
+    Recompute every rollup row from t_node_profile.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    for level, (table, key) in ROLLUP_LEVELS.items():
+        region = ["region_code"] if level == "department" else []
+        columns = [key, *region, "station_count"]
+        values = [key, *(f"MAX({c})" for c in region), "COUNT(*)"]
+        for name, (column, _) in ROLLUP_METRICS.items():
+            columns += [f"{name}_count", f"{name}_sum"]
+            values += [f"COUNT({column})", f"COALESCE(SUM({column}), 0)"]
+        cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"""
+            INSERT INTO {table} ({", ".join(columns)})
+            SELECT {", ".join(values)}
+            FROM t_node_profile
+            WHERE {key} IS NOT NULL AND {canonical_condition(cursor, "node_id")}
+            GROUP BY {key}
+        """)
+
+
+def create_area_rollups(conn: sqlite3.Connection, rebuild: bool = False) -> None:
+    """
+    Create the rollup tables and their triggers, filling them if needed.
+
+    Args:
+        conn: SQLite database connection
+        rebuild: Recompute every row, e.g. after physical stations changed
+    """
+    cursor = conn.cursor()
+    created = not table_exists(cursor, "t_department_rollup")
+    create_rollup_tables(cursor)
+    create_rollup_triggers(cursor)
+
+    if (created or rebuild) and table_exists(cursor, "t_node_profile"):
+        rebuild_rollups(cursor)
+    conn.commit()
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Build the department and region rollups of t_node_profile"
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        print(f"Error: Database file {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Connecting to {args.db}...")
+    conn = sqlite3.connect(args.db)
+
+    print("Rebuilding tables t_department_rollup and t_region_rollup...")
+    create_area_rollups(conn, rebuild=True)
+    optimize_database(conn)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM t_department_rollup")
+    departments = cursor.fetchone()[0]
+    cursor.execute("SELECT COUNT(*) FROM t_region_rollup")
+    regions = cursor.fetchone()[0]
+    conn.close()
+
+    print(f"✓ Built rollups of {departments} departments and {regions} regions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "httpx>=0.28.1",
+#     "python-dotenv>=1.0.0",
+# ]
+# ///
+
+import json
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+
+from ingest_museums import create_museum_table
+from ingest_nodes import create_nodes_table
+from ingest_weather_stations import create_weather_station_table
+from insee_code import create_insee_table
+from migrate import (
+    KEY_QUERIES,
+    MIGRATIONS,
+    explain_query_plan,
+    optimize_database,
+    unexpected_plan_details,
+)
+from weather_data import create_weather_data_table
+
+# Node counts of the synthetic databases
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+
+# Node looked up by the station_with_weather key query
+BENCH_SNCF_ID = "stop_point:SNCF:87271007:LongDistanceTrain"
+
+# Share of the nodes whose INSEE lookup failed, and of the postal codes
+# without museum
+INSEE_ERROR_RATE = 0.05
+NO_MUSEUM_RATE = 0.7
+
+
+def generate_database(db_path: Path, node_count: int, seed: int = 0) -> None:
+    """
+    Create a synthetic enrichment database with the schema of the ingestion
+    scripts: nodes, INSEE records, weather stations, 12 months of weather data
+    per node and museum counts per postal code.
+
+    The data only depends on node_count and seed, so databases can be reused
+    across runs.
+
+    Args:
+        db_path: Path of the database to create
+        node_count: Number of nodes
+        seed: Random seed
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    cursor = conn.cursor()
+
+    create_nodes_table(cursor)
+    create_insee_table(cursor)
+    create_weather_station_table(cursor)
+    create_weather_data_table(cursor)
+    create_museum_table(cursor)
+    # The create_*_table functions already produce the latest schema
+    cursor.execute(f"PRAGMA user_version = {MIGRATIONS[-1][0]}")
+
+    station_count = max(10, node_count // 50)
+    cursor.executemany(
+        """
+        INSERT INTO t_weather_station
+        (id, station_id, nom, department_code, poste_ouvert, type_poste, lon, lat, alt, poste_public)
+        VALUES (?, ?, ?, ?, 1, 0, ?, ?, ?, 1)
+        """,
+        (
+            (
+                i,
+                f"{i:08d}",
+                f"Station {i}",
+                f"{i % 95 + 1:02d}",
+                rng.uniform(-4.5, 7.5),
+                rng.uniform(42.5, 51.0),
+                rng.randint(0, 2000),
+            )
+            for i in range(1, station_count + 1)
+        ),
+    )
+
+    def node_rows():
+        yield 1, BENCH_SNCF_ID, "Bench Station", 44.8259, -0.5564, "87271007"
+        for i in range(2, node_count + 1):
+            uic_code = f"87{i:06d}"
+            yield (
+                i,
+                f"stop_point:SNCF:{uic_code}:Train",
+                f"Station {i}",
+                rng.uniform(42.5, 51.0),
+                rng.uniform(-4.5, 7.5),
+                uic_code,
+            )
+
+    cursor.executemany(
+        "INSERT INTO t_nodes (id, sncf_id, name, lat, lon, uic_code) VALUES (?, ?, ?, ?, ?, ?)",
+        node_rows(),
+    )
+
+    postal_codes = [
+        f"{i % 95 + 1:02d}{i:03d}" for i in range(max(100, node_count // 10))
+    ]
+
+    def insee_rows():
+        for i in range(1, node_count + 1):
+            if rng.random() < INSEE_ERROR_RATE:
+                yield i, None, None, None, None, None, None, "API returned empty result"
+                continue
+            codes = rng.sample(postal_codes, rng.randint(1, 2))
+            yield (
+                i,
+                f"{codes[0][:2]}{i % 1000:03d}",
+                f"City {i % 5000}",
+                codes[0][:2],
+                f"{int(codes[0][:2]) % 13 + 1}",
+                rng.randint(100, 500_000),
+                json.dumps(codes),
+                None,
+            )
+
+    cursor.executemany(
+        """
+        INSERT INTO t_insee
+        (node_id, insee_code, city_name, department_code, region_code, population, postal_codes, error_message)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        insee_rows(),
+    )
+
+    def weather_rows():
+        for i in range(1, node_count + 1):
+            station_id = rng.randint(1, station_count)
+            base = rng.uniform(5, 15)
+            for month in range(1, 13):
+                yield (
+                    i,
+                    station_id,
+                    month,
+                    rng.uniform(20, 150),
+                    base + 8 * (1 - abs(month - 7) / 6) - 4,
+                    rng.uniform(0, 25),
+                )
+
+    cursor.executemany(
+        """
+        INSERT INTO t_weather_data
+        (node_id, weather_station_id, month, precipitation, average_temp, sunny_days)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        weather_rows(),
+    )
+
+    cursor.executemany(
+        "INSERT INTO t_museum (postal_code, museum_count) VALUES (?, ?)",
+        (
+            (code, 0 if rng.random() < NO_MUSEUM_RATE else rng.randint(1, 20))
+            for code in postal_codes
+        ),
+    )
+
+    conn.commit()
+    optimize_database(conn)
+    conn.close()
+
+
+def time_query(
+    cursor: sqlite3.Cursor, query: str, runs: int
+) -> tuple[list[float], int]:
+    """
+    Run a query several times, reading every row.
+
+    Args:
+        cursor: SQLite database cursor
+        query: SQL query
+        runs: Number of runs
+
+    Returns:
+        Tuple of (duration of each run in milliseconds, number of rows)
+    """
+    samples = []
+    rows = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        rows = len(cursor.execute(query).fetchall())
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, rows
+
+
+def summarize_samples(samples: list[float]) -> dict:
+    """
+    Summarize durations like the app benchmarks (bench_results.jsonl).
+
+    Args:
+        samples: Durations in milliseconds
+
+    Returns:
+        Dictionary with min, max, mean, median and the sorted samples
+    """
+    samples = sorted(round(sample, 3) for sample in samples)
+    return {
+        "max": samples[-1],
+        "mean": round(statistics.mean(samples), 3),
+        "median": round(statistics.median(samples), 3),
+        "min": samples[0],
+        "samples": samples,
+    }
+
+
+def bench_database(
+    db_path: Path, node_count: int, runs: int, description: str | None
+) -> list[dict]:
+    """
+    Time the key queries of db.md on a database and get their plans.
+
+    Args:
+        db_path: Path to SQLite database file
+        node_count: Number of nodes of the database
+        runs: Number of runs of each query
+        description: Label of the benchmark run
+
+    Returns:
+        One result per query
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    cursor = conn.cursor()
+    results = []
+
+    for name, (query, forbidden) in KEY_QUERIES.items():
+        plan = explain_query_plan(cursor, query)
+        samples, rows = time_query(cursor, query, runs)
+        results.append(
+            {
+                "description": description,
+                "nodes": node_count,
+                "plan": plan,
+                "query": name,
+                "query_ms": summarize_samples(samples),
+                "rows": rows,
+                "runs": runs,
+                "sqlite_version": sqlite3.sqlite_version,
+                "timestamp": datetime.now(UTC).isoformat(),
+                "unexpected_plan": unexpected_plan_details(plan, forbidden),
+            }
+        )
+
+    conn.close()
+    return results
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the key queries of db.md on synthetic databases"
+    )
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SCALES,
+        metavar="NODES",
+        help=f"Node counts of the synthetic databases (default: {' '.join(map(str, DEFAULT_SCALES))})",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=5,
+        help="Number of runs of each query (default: 5)",
+    )
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        help="Keep the synthetic databases in this directory and reuse them "
+        "(default: temporary directory)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path(__file__).parent / "bench_queries.jsonl",
+        help="File to append results to (JSONL format, default: bench_queries.jsonl in script directory)",
+    )
+    parser.add_argument(
+        "--description",
+        help='Label for this run (e.g. "baseline", "covering index on t_insee")',
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Fail if a query plan uses a full scan or temporary sort forbidden by migrate.KEY_QUERIES",
+    )
+
+    args = parser.parse_args()
+
+    if args.runs < 1:
+        print("Error: --runs must be at least 1", file=sys.stderr)
+        sys.exit(1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = args.data_dir or Path(tmp_dir)
+        data_dir.mkdir(parents=True, exist_ok=True)
+
+        results = []
+        for node_count in args.scales:
+            db_path = data_dir / f"bench_{node_count}.db"
+            if not db_path.exists():
+                print(f"Generating {db_path} ({node_count} nodes)...")
+                start = time.perf_counter()
+                generate_database(db_path, node_count)
+                print(f"  generated in {time.perf_counter() - start:.1f}s")
+
+            for result in bench_database(
+                db_path, node_count, args.runs, args.description
+            ):
+                ms = result["query_ms"]
+                print(
+                    f"  nodes={node_count} {result['query']}: rows={result['rows']} "
+                    f"min={ms['min']}ms median={ms['median']}ms mean={ms['mean']}ms "
+                    f"(over {args.runs} runs)"
+                )
+                for detail in result["unexpected_plan"]:
+                    print(f"    unexpected plan: {detail}")
+                results.append(result)
+
+    with open(args.output, "a") as f:
+        for result in results:
+            f.write(
+                json.dumps(
+                    result, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+                )
+                + "\n"
+            )
+    print(f"✓ Appended {len(results)} results to {args.output}")
+
+    if args.check and any(result["unexpected_plan"] for result in results):
+        print("Error: some key queries use unexpected plans", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "numpy>=2.0.0",
+# ]
+# ///
+
+import os
+import sqlite3
+import struct
+import sys
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from pathlib import Path
+
+import numpy as np
+
+from migrate import table_exists
+
+# File layout (little-endian):
+#   header: magic, format version, record count, padding to 16 bytes
+#   index:  record count × int64 keys (node or weather station ids), sorted
+#   data:   record count × 12 months × 3 float32 (precipitation, average_temp,
+#           sunny_days), NaN where missing
+MAGIC = b"TCCL"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sII4x")
+CLIMATE_FIELDS = ("precipitation", "average_temp", "sunny_days")
+BLOCK_SHAPE = (12, len(CLIMATE_FIELDS))
+
+
+def export_climate(db_path: Path, out_path: Path, key: str = "node") -> int:
+    """
+    Export monthly climate data from the database to a fixed-layout binary file.
+
+    Args:
+        db_path: Path to SQLite database file
+        out_path: Path to the binary file to write
+        key: "node" to key records by node id, "station" by weather station id
+
+    Returns:
+        Number of exported records
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Prefer the fan-out view so every stop point variant gets a record
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'v_node_weather_data'"
+    )
+    if cursor.fetchone():
+        source = "v_node_weather_data"
+    elif table_exists(cursor, "t_weather_data"):
+        source = "t_weather_data"
+    elif table_exists(cursor, "t_physical_station"):
+        # Packed storage, fanned out to the stop point variants
+        source = """(
+            SELECT n.id AS node_id, w.weather_station_id, w.month, w.precipitation,
+                   w.average_temp, w.sunny_days
+            FROM t_nodes n
+            JOIN t_physical_station p ON p.uic_code = n.uic_code
+            JOIN v_weather_vector_data w ON w.node_id = p.node_id
+        )"""
+    else:
+        source = "v_weather_vector_data"
+    key_column = "node_id" if key == "node" else "weather_station_id"
+
+    cursor.execute(f"""
+        SELECT {key_column}, month, precipitation, average_temp, sunny_days
+        FROM {source}
+        ORDER BY {key_column}, month
+    """)
+    rows = cursor.fetchall()
+    conn.close()
+
+    ids = np.array(sorted({row[0] for row in rows}), dtype="<i8")
+    blocks = np.full((len(ids), *BLOCK_SHAPE), np.nan, dtype="<f4")
+    positions = np.searchsorted(ids, [row[0] for row in rows])
+    for position, (_, month, *values) in zip(positions, rows):
+        blocks[position, month - 1] = [np.nan if v is None else v for v in values]
+
+    # Write next to the target and rename, so readers never map a partial file
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(ids)))
+        f.write(ids.tobytes())
+        f.write(blocks.tobytes())
+    os.replace(tmp_path, out_path)
+
+    return len(ids)
+
+
+class ClimateLookup:
+    """
+    Zero-copy reader over a file written by export_climate.
+
+    climate_for returns NumPy arrays backed by the memory-mapped file, only
+    climate_for_many copies the blocks it gathers. Derived scores computed
+    through score() are kept in a bounded LRU cache.
+    """
+
+    def __init__(self, path: Path, cache_size: int = 4096):
+        """
+        Args:
+            path: Path to the binary climate file
+            cache_size: Maximum number of cached derived scores
+        """
+        raw = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, count = HEADER.unpack(raw[: HEADER.size].tobytes())
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a climate file (version {FORMAT_VERSION})")
+
+        index_end = HEADER.size + count * 8
+        self.ids = raw[HEADER.size : index_end].view("<i8")
+        self.blocks = raw[index_end:].view("<f4").reshape(count, *BLOCK_SHAPE)
+
+        self.cache_size = cache_size
+        self._scores: OrderedDict[tuple[Callable, int], float] = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def positions(self, ids: Iterable[int]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Locate records in the file.
+
+        Args:
+            ids: Node (or weather station) ids
+
+        Returns:
+            Tuple of (positions, found) arrays; positions are only meaningful
+            where found is True
+        """
+        ids = np.asarray(list(ids), dtype="<i8")
+        positions = np.searchsorted(self.ids, ids)
+        clipped = np.minimum(positions, max(len(self.ids) - 1, 0))
+        found = (positions < len(self.ids)) & (self.ids[clipped] == ids)
+        return clipped, found
+
+    def climate_for(self, node_id: int) -> np.ndarray | None:
+        """
+        Get the climate block of a node.
+
+        Args:
+            node_id: Node (or weather station) id
+
+        Returns:
+            12×3 view (month × precipitation/average_temp/sunny_days), or None if unknown
+        """
+        position = int(np.searchsorted(self.ids, node_id))
+        if position >= len(self.ids) or self.ids[position] != node_id:
+            return None
+        return self.blocks[position]
+
+    def climate_for_many(self, ids: Iterable[int]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the climate blocks of several nodes in one vectorized lookup.
+
+        Unlike climate_for, which returns a view of the memory-mapped file, the
+        blocks are copied into a new array of N×144 bytes, whose rows of unknown
+        ids are set to NaN. Use positions to index the blocks without copying.
+
+        Args:
+            ids: Node (or weather station) ids
+
+        Returns:
+            Tuple of (blocks, found): an N×12×3 copy, NaN for unknown ids, and a
+            boolean array telling which ids were found
+        """
+        positions, found = self.positions(ids)
+        if len(self.ids) == 0:
+            return np.full((len(positions), *BLOCK_SHAPE), np.nan, dtype="<f4"), found
+        blocks = self.blocks[positions]
+        blocks[~found] = np.nan
+        return blocks, found
+
+    def score(
+        self, node_id: int, score_fn: Callable[[np.ndarray], float]
+    ) -> float | None:
+        """
+        Compute a derived score from the climate block of a node, with LRU caching.
+
+        Args:
+            node_id: Node (or weather station) id
+            score_fn: Function mapping a 12×3 climate block to a score
+
+        Returns:
+            Score, or None if the node is unknown
+        """
+        key = (score_fn, node_id)
+        if key in self._scores:
+            self._scores.move_to_end(key)
+            self.cache_hits += 1
+            return self._scores[key]
+
+        self.cache_misses += 1
+        block = self.climate_for(node_id)
+        if block is None:
+            return None
+
+        value = score_fn(block)
+        self._scores[key] = value
+        if len(self._scores) > self.cache_size:
+            self._scores.popitem(last=False)
+        return value
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Export monthly climate data to a memory-mappable binary file"
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+    parser.add_argument(
+        "--out",
+        type=Path,
+        default=Path(__file__).parent / "climate.bin",
+        help="Path to the binary file (default: climate.bin in script directory)",
+    )
+    parser.add_argument(
+        "--key",
+        choices=["node", "station"],
+        default="node",
+        help="Key records by node id or by weather station id (default: node)",
+    )
+
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        print(f"Error: Database file {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Exporting climate data from {args.db}...")
+    count = export_climate(args.db, args.out, args.key)
+    print(f"✓ Exported {count} climate records to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
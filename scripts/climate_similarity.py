@@ -0,0 +1,354 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "numpy>=2.0.0",
+# ]
+# ///
+
+import os
+import sqlite3
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+from migrate import table_exists
+
+CLIMATE_FIELDS = ("precipitation", "average_temp", "sunny_days")
+DIMENSIONS = 12 * len(CLIMATE_FIELDS)
+
+
+def weather_sources(cursor: sqlite3.Cursor) -> tuple[str, str]:
+    """
+    Get the weather data sources of the database, in row storage or packed
+    storage (weather_data.py --storage packed).
+
+    Args:
+        cursor: SQLite database cursor
+
+    Returns:
+        Tuple of (table with one node_id and created_at per written node,
+        table or view with the monthly rows)
+    """
+    if table_exists(cursor, "t_weather_data"):
+        return "t_weather_data", "t_weather_data"
+    return "t_weather_vector", "v_weather_vector_data"
+
+
+def load_climate_vectors(
+    cursor: sqlite3.Cursor, since: str | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Load the 36-dimensional climate vectors of the enriched nodes.
+
+    Args:
+        cursor: SQLite database cursor
+        since: Only load the nodes with rows written at or after this
+            timestamp (CURRENT_TIMESTAMP format), None for every node
+
+    Returns:
+        Tuple of (ids, vectors): sorted node ids and an N×36 float32 matrix
+        (12 months × precipitation/average_temp/sunny_days), NaN where missing
+    """
+    table, source = weather_sources(cursor)
+    condition = ""
+    params = ()
+    if since is not None:
+        condition = (
+            f"WHERE node_id IN (SELECT node_id FROM {table} WHERE created_at >= ?)"
+        )
+        params = (since,)
+    cursor.execute(
+        f"""
+        SELECT node_id, month, {", ".join(CLIMATE_FIELDS)}
+        FROM {source}
+        {condition}
+        ORDER BY node_id, month
+        """,
+        params,
+    )
+    rows = cursor.fetchall()
+
+    ids = np.array(sorted({row[0] for row in rows}), dtype=np.int64)
+    vectors = np.full((len(ids), 12, len(CLIMATE_FIELDS)), np.nan, dtype=np.float32)
+    positions = np.searchsorted(ids, [row[0] for row in rows])
+    for position, (_, month, *values) in zip(positions, rows):
+        vectors[position, month - 1] = [np.nan if v is None else v for v in values]
+
+    return ids, vectors.reshape(len(ids), DIMENSIONS)
+
+
+class ClimateIndex:
+    """
+    Nearest-neighbour index over the monthly climate of the enriched nodes.
+
+    Each dimension is standardized (z-score over every node) so that
+    temperature, precipitation and sunshine weigh the same, and missing values
+    are set to the dimension mean. Queries are a vectorized brute-force search
+    over the normalized matrix, a few milliseconds for tens of thousands of
+    nodes.
+    """
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray, built_at: str):
+        """
+        Args:
+            ids: Sorted node ids
+            vectors: N×36 raw climate matrix, NaN where missing
+            built_at: Database time of the last build or update
+        """
+        self.ids = ids
+        self.vectors = vectors
+        self.built_at = built_at
+        self._normalize()
+
+    def _normalize(self) -> None:
+        # Dimensions without any value (e.g. sunshine never measured) get a
+        # neutral mean of 0 and a std of 1
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mean = np.nanmean(self.vectors, axis=0)
+            std = np.nanstd(self.vectors, axis=0)
+        self.mean = np.nan_to_num(mean).astype(np.float32)
+        self.std = np.where(np.nan_to_num(std) > 0, std, 1).astype(np.float32)
+        self.matrix = np.nan_to_num(self.normalize(self.vectors))
+        self.norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, db_path: Path) -> "ClimateIndex":
+        """
+        Build the index from every node with weather data.
+
+        Args:
+            db_path: Path to SQLite database file
+
+        Returns:
+            Climate index
+        """
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT CURRENT_TIMESTAMP")
+        built_at = cursor.fetchone()[0]
+        ids, vectors = load_climate_vectors(cursor)
+        conn.close()
+        return cls(ids, vectors, built_at)
+
+    def update(self, db_path: Path) -> int:
+        """
+        Reload the nodes whose weather data was written since the last build or
+        update, and drop the nodes that no longer have weather data.
+
+        Args:
+            db_path: Path to SQLite database file
+
+        Returns:
+            Number of reloaded or dropped nodes
+        """
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT CURRENT_TIMESTAMP")
+        built_at = cursor.fetchone()[0]
+        changed_ids, changed_vectors = load_climate_vectors(cursor, self.built_at)
+        cursor.execute(f"SELECT DISTINCT node_id FROM {weather_sources(cursor)[0]}")
+        current_ids = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+        conn.close()
+
+        keep = np.isin(self.ids, current_ids) & ~np.isin(self.ids, changed_ids)
+        dropped = int(np.count_nonzero(~np.isin(self.ids, current_ids)))
+        ids = np.concatenate([self.ids[keep], changed_ids])
+        vectors = np.concatenate([self.vectors[keep], changed_vectors])
+        order = np.argsort(ids)
+
+        self.ids = ids[order]
+        self.vectors = vectors[order]
+        self.built_at = built_at
+        self._normalize()
+        return len(changed_ids) + dropped
+
+    def save(self, path: Path) -> None:
+        """
+        Save the index, replacing the file atomically.
+
+        Args:
+            path: Path to the index file (.npz)
+        """
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                ids=self.ids,
+                vectors=self.vectors,
+                built_at=np.array(self.built_at),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "ClimateIndex":
+        """
+        Load an index written by save.
+
+        Args:
+            path: Path to the index file (.npz)
+
+        Returns:
+            Climate index
+        """
+        with np.load(path) as data:
+            return cls(data["ids"], data["vectors"], str(data["built_at"]))
+
+    def normalize(self, profile: np.ndarray) -> np.ndarray:
+        """
+        Standardize raw climate vectors with the statistics of the index.
+
+        Args:
+            profile: Array of 36 values, or N×36 matrix, NaN where missing
+
+        Returns:
+            Standardized array of the same shape, NaN where missing
+        """
+        return (np.asarray(profile, dtype=np.float32) - self.mean) / self.std
+
+    def vector_for(self, node_id: int) -> np.ndarray | None:
+        """
+        Get the raw climate vector of a node.
+
+        Args:
+            node_id: Node id
+
+        Returns:
+            36 values, or None if the node is not indexed
+        """
+        position = int(np.searchsorted(self.ids, node_id))
+        if position >= len(self.ids) or self.ids[position] != node_id:
+            return None
+        return self.vectors[position]
+
+    def _distances(self, target: np.ndarray) -> np.ndarray:
+        query = np.nan_to_num(self.normalize(np.reshape(target, DIMENSIONS)))
+        squared = self.norms - 2 * (self.matrix @ query) + query @ query
+        return np.sqrt(np.maximum(squared, 0))
+
+    def nearest(
+        self, target: np.ndarray, k: int = 10, exclude: int | None = None
+    ) -> list[tuple[int, float]]:
+        """
+        Find the nodes with the climate most similar to a target profile.
+
+        Args:
+            target: Raw climate profile (36 values or a 12×3 block), e.g.
+                vector_for(node_id)
+            k: Number of nodes to return
+            exclude: Node id to leave out, typically the node of the target
+
+        Returns:
+            List of (node_id, distance) sorted by increasing distance
+        """
+        distances = self._distances(target)
+        if exclude is not None:
+            position = int(np.searchsorted(self.ids, exclude))
+            if position < len(self.ids) and self.ids[position] == exclude:
+                distances[position] = np.inf
+        k = min(k, len(distances))
+        if k == 0:
+            return []
+        candidates = np.argpartition(distances, k - 1)[:k]
+        candidates = candidates[np.argsort(distances[candidates])]
+        return [
+            (int(self.ids[i]), float(distances[i]))
+            for i in candidates
+            if np.isfinite(distances[i])
+        ]
+
+    def within(self, target: np.ndarray, radius: float) -> list[tuple[int, float]]:
+        """
+        Find the nodes within a distance of a target profile.
+
+        Args:
+            target: Raw climate profile (36 values or a 12×3 block)
+            radius: Maximum distance in the normalized space
+
+        Returns:
+            List of (node_id, distance) sorted by increasing distance
+        """
+        distances = self._distances(target)
+        matches = np.flatnonzero(distances <= radius)
+        matches = matches[np.argsort(distances[matches])]
+        return [(int(self.ids[i]), float(distances[i])) for i in matches]
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Build the climate similarity index and find nodes with a similar climate"
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        help="Path to the index file (default: next to the database, e.g. nodes.climate_index.npz)",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Rebuild the whole index instead of updating the changed nodes",
+    )
+    parser.add_argument(
+        "--like",
+        type=int,
+        metavar="NODE_ID",
+        help="Print the nodes with the climate most similar to this node",
+    )
+    parser.add_argument(
+        "-k",
+        type=int,
+        default=10,
+        help="Number of similar nodes to print (default: 10)",
+    )
+    parser.add_argument(
+        "--radius",
+        type=float,
+        help="Print every node within this distance instead of the k nearest",
+    )
+
+    args = parser.parse_args()
+    if args.index is None:
+        args.index = args.db.with_suffix(".climate_index.npz")
+
+    if not args.db.exists():
+        print(f"Error: Database file {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    if args.rebuild or not args.index.exists():
+        print(f"Building climate index from {args.db}...")
+        index = ClimateIndex.build(args.db)
+        print(f"✓ Indexed {len(index)} nodes")
+    else:
+        index = ClimateIndex.load(args.index)
+        changed = index.update(args.db)
+        print(f"✓ Updated {changed} of {len(index)} indexed nodes")
+    index.save(args.index)
+
+    if args.like is not None:
+        target = index.vector_for(args.like)
+        if target is None:
+            print(f"Error: Node {args.like} is not indexed", file=sys.stderr)
+            sys.exit(1)
+        if args.radius is not None:
+            matches = index.within(target, args.radius)
+        else:
+            matches = index.nearest(target, args.k, exclude=args.like)
+        for node_id, distance in matches:
+            print(f"  {node_id}\t{distance:.3f}")
+
+
+if __name__ == "__main__":
+    main()
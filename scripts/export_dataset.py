@@ -0,0 +1,281 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "pyarrow>=18.0.0",
+# ]
+# ///
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+# Exported datasets: Arrow schema and sources, the first source whose tables
+# and views all exist being exported. Enrichment data is read through the
+# v_node_* views, which fan the canonical node's rows out to every node of its
+# physical station. Low-cardinality strings are dictionary-encoded.
+DICTIONARY_STRING = pa.dictionary(pa.int32(), pa.string())
+INSEE_COLUMNS = """node_id, insee_code, city_name, department_code, region_code,
+               population, postal_codes"""
+CLIMATE_COLUMNS = """node_id, weather_station_id, month, precipitation, average_temp,
+               sunny_days"""
+DATASETS = {
+    "nodes": (
+        pa.schema(
+            [
+                ("id", pa.int64()),
+                ("sncf_id", pa.string()),
+                ("name", pa.string()),
+                ("lat", pa.float64()),
+                ("lon", pa.float64()),
+                ("uic_code", pa.string()),
+            ]
+        ),
+        [
+            (
+                ("t_physical_station",),
+                "SELECT id, sncf_id, name, lat, lon, uic_code FROM t_nodes ORDER BY id",
+            ),
+            (
+                ("t_nodes",),
+                "SELECT id, sncf_id, name, lat, lon, NULL FROM t_nodes ORDER BY id",
+            ),
+        ],
+    ),
+    "insee": (
+        pa.schema(
+            [
+                ("node_id", pa.int64()),
+                ("insee_code", pa.string()),
+                ("city_name", pa.string()),
+                ("department_code", DICTIONARY_STRING),
+                ("region_code", DICTIONARY_STRING),
+                ("population", pa.int64()),
+                ("postal_codes", pa.string()),
+            ]
+        ),
+        [
+            (
+                (source,),
+                f"""
+                SELECT {INSEE_COLUMNS}
+                FROM {source}
+                WHERE error_message IS NULL
+                ORDER BY node_id
+                """,
+            )
+            for source in ("v_node_insee", "t_insee")
+        ],
+    ),
+    "climate": (
+        pa.schema(
+            [
+                ("node_id", pa.int64()),
+                ("weather_station_id", pa.int64()),
+                ("month", pa.int8()),
+                ("precipitation", pa.float32()),
+                ("average_temp", pa.float32()),
+                ("sunny_days", pa.float32()),
+            ]
+        ),
+        [
+            (
+                ("v_node_weather_data",),
+                f"SELECT {CLIMATE_COLUMNS} FROM v_node_weather_data ORDER BY node_id, month",
+            ),
+            # Packed storage: v_weather_vector_data only has the canonical nodes
+            (
+                ("v_weather_vector_data", "t_physical_station"),
+                """
+                SELECT n.id, w.weather_station_id, w.month, w.precipitation,
+                       w.average_temp, w.sunny_days
+                FROM t_nodes n
+                JOIN t_physical_station p ON p.uic_code = n.uic_code
+                JOIN v_weather_vector_data w ON w.node_id = p.node_id
+                ORDER BY n.id, w.month
+                """,
+            ),
+            (
+                ("t_weather_data",),
+                f"SELECT {CLIMATE_COLUMNS} FROM t_weather_data ORDER BY node_id, month",
+            ),
+            (
+                ("v_weather_vector_data",),
+                f"SELECT {CLIMATE_COLUMNS} FROM v_weather_vector_data ORDER BY node_id, month",
+            ),
+        ],
+    ),
+    "museums": (
+        pa.schema([("postal_code", pa.string()), ("museum_count", pa.int32())]),
+        [
+            (
+                ("t_museum",),
+                "SELECT postal_code, museum_count FROM t_museum ORDER BY postal_code",
+            )
+        ],
+    ),
+}
+
+
+def dataset_query(cursor: sqlite3.Cursor, sources: list[tuple]) -> str | None:
+    """
+    Pick the first source of a dataset whose tables and views all exist.
+
+    Args:
+        cursor: SQLite database cursor
+        sources: Sources of the dataset, as (required tables and views, query)
+
+    Returns:
+        SQL query, or None if no source exists
+    """
+    for names, query in sources:
+        placeholders = ",".join("?" * len(names))
+        cursor.execute(
+            f"SELECT COUNT(*) FROM sqlite_master WHERE type IN ('table', 'view') AND name IN ({placeholders})",
+            names,
+        )
+        if cursor.fetchone()[0] == len(names):
+            return query
+    return None
+
+
+def record_batches(
+    cursor: sqlite3.Cursor, query: str, schema: pa.Schema, batch_size: int
+):
+    """
+    Stream a query result as Arrow record batches.
+
+    Dictionary-encoded columns share one dictionary that grows across batches,
+    so that Arrow IPC files can store it once plus deltas.
+
+    Args:
+        cursor: SQLite database cursor
+        query: SQL query, its columns matching the schema
+        schema: Arrow schema of the batches
+        batch_size: Number of rows per batch
+
+    Yields:
+        Record batches of at most batch_size rows
+    """
+    dictionaries = {
+        field.name: {} for field in schema if pa.types.is_dictionary(field.type)
+    }
+
+    cursor.execute(query)
+    while rows := cursor.fetchmany(batch_size):
+        arrays = []
+        for field, values in zip(schema, zip(*rows)):
+            if field.name in dictionaries:
+                dictionary = dictionaries[field.name]
+                indices = [
+                    None
+                    if value is None
+                    else dictionary.setdefault(value, len(dictionary))
+                    for value in values
+                ]
+                arrays.append(
+                    pa.DictionaryArray.from_arrays(
+                        pa.array(indices, field.type.index_type),
+                        pa.array(list(dictionary), field.type.value_type),
+                    )
+                )
+            else:
+                arrays.append(pa.array(values, field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_dataset(
+    db_path: Path, out_dir: Path, fmt: str = "parquet", batch_size: int = 65536
+) -> dict[str, int]:
+    """
+    Export the enrichment tables to Parquet or Arrow IPC files.
+
+    Args:
+        db_path: Path to SQLite database file
+        out_dir: Directory to write one file per dataset to
+        fmt: "parquet" or "arrow" (Arrow IPC file format, memory-mappable)
+        batch_size: Number of rows read from SQLite per batch
+
+    Returns:
+        Dictionary mapping dataset name to number of exported rows
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    exported = {}
+
+    for name, (schema, sources) in DATASETS.items():
+        query = dataset_query(cursor, sources)
+        if query is None:
+            print(f"Skipping {name}: its source tables do not exist")
+            continue
+
+        path = out_dir / f"{name}.{fmt}"
+        rows = 0
+        if fmt == "parquet":
+            with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+                for batch in record_batches(cursor, query, schema, batch_size):
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+        else:
+            with pa.OSFile(str(path), "wb") as sink:
+                options = ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+                with ipc.new_file(sink, schema, options=options) as writer:
+                    for batch in record_batches(cursor, query, schema, batch_size):
+                        writer.write_batch(batch)
+                        rows += batch.num_rows
+
+        exported[name] = rows
+        print(f"  {name}: {rows} rows → {path}")
+
+    conn.close()
+    return exported
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Export the enrichment dataset to Parquet or Arrow IPC files"
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+    parser.add_argument(
+        "--out",
+        type=Path,
+        default=Path(__file__).parent / "export",
+        help="Output directory (default: export in script directory)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["parquet", "arrow"],
+        default="parquet",
+        help="File format; Arrow IPC files can be memory-mapped (default: parquet)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=65536,
+        help="Number of rows read from SQLite per batch (default: 65536)",
+    )
+
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        print(f"Error: Database file {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Exporting {args.db} to {args.out}...")
+    exported = export_dataset(args.db, args.out, args.format, args.batch_size)
+    print(f"✓ Exported {len(exported)} datasets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "httpx>=0.28.1",
+# ]
+# ///
+
+import json
+import math
+import re
+import sqlite3
+import sys
+import unicodedata
+from pathlib import Path
+
+import httpx
+
+from http_fixtures import http_stream, iter_json_array, iter_text
+from migrate import table_exists
+from providers import load_stage_nodes, node_country
+
+# Every commune, in the format of the geo.api.gouv.fr lookups of insee_code.py
+COMMUNES_URL = "https://geo.api.gouv.fr/communes"
+COMMUNE_FIELDS = "nom,code,codeDepartement,codeRegion,population,codesPostaux,centre"
+
+# Maximum distance between the cached city centre and the centre of a commune
+# of the same name, beyond which homonyms are not trusted
+MAX_MATCH_KM = 15.0
+
+# Abbreviations expanded before comparing names
+NAME_ABBREVIATIONS = {"st": "saint", "ste": "sainte"}
+
+
+def commune_name_key(name: str) -> str:
+    """
+    Normalize a city name for comparisons: no accents, case, punctuation nor
+    abbreviations.
+
+    Args:
+        name: City name, e.g. "St-Étienne"
+
+    Returns:
+        Normalized name, e.g. "saint etienne"
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    words = re.findall(r"[a-z0-9]+", stripped.casefold())
+    return " ".join(NAME_ABBREVIATIONS.get(word, word) for word in words)
+
+
+def create_commune_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the t_commune reference table and associated indexes.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS t_commune (
+            insee_code TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            department_code TEXT,
+            region_code TEXT,
+            population INTEGER,
+            postal_codes TEXT,
+            lat REAL,
+            lon REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_commune_name_key ON t_commune(name_key)
+    """)
+
+
+def load_communes(conn: sqlite3.Connection) -> int:
+    """
+    Fill t_commune with every commune from geo.api.gouv.fr, if empty.
+
+    The list (about 35,000 communes) is one streamed request.
+
+    Args:
+        conn: SQLite database connection
+
+    Returns:
+        Number of communes in t_commune
+    """
+    cursor = conn.cursor()
+    create_commune_table(cursor)
+    cursor.execute("SELECT COUNT(*) FROM t_commune")
+    count = cursor.fetchone()[0]
+    if count:
+        return count
+
+    print("Fetching the list of communes from geo.api.gouv.fr...")
+    rows = []
+    try:
+        with http_stream(
+            COMMUNES_URL, params={"fields": COMMUNE_FIELDS}, timeout=60.0
+        ) as response:
+            response.raise_for_status()
+            for commune in iter_json_array(iter_text(response)):
+                lon, lat = (commune.get("centre") or {}).get("coordinates") or (
+                    None,
+                    None,
+                )
+                rows.append(
+                    (
+                        commune["code"],
+                        commune["nom"],
+                        commune_name_key(commune["nom"]),
+                        commune.get("codeDepartement"),
+                        commune.get("codeRegion"),
+                        commune.get("population"),
+                        json.dumps(commune.get("codesPostaux", [])),
+                        lat,
+                        lon,
+                    )
+                )
+    except (httpx.HTTPError, ValueError) as e:
+        print(
+            f"Error fetching communes: {type(e).__name__}: {e}",
+            file=sys.stderr,
+        )
+        return 0
+
+    cursor.executemany(
+        """
+        INSERT OR REPLACE INTO t_commune
+        (insee_code, name, name_key, department_code, region_code, population,
+         postal_codes, lat, lon)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+    conn.commit()
+    return len(rows)
+
+
+def match_commune(
+    cursor: sqlite3.Cursor, city: str, city_lat: float, city_lon: float
+) -> dict | None:
+    """
+    Find the commune of a city by name, the nearest one among homonyms.
+
+    Args:
+        cursor: SQLite database cursor
+        city: City name
+        city_lat: Latitude of the city centre
+        city_lon: Longitude of the city centre
+
+    Returns:
+        Commune in the format of geo.api.gouv.fr (nom, code, codeDepartement,
+        codeRegion, population, codesPostaux), or None if no commune of that
+        name is within MAX_MATCH_KM
+    """
+    cursor.execute(
+        """
+        SELECT insee_code, name, department_code, region_code, population,
+               postal_codes, lat, lon
+        FROM t_commune
+        WHERE name_key = ? AND lat IS NOT NULL
+        """,
+        (commune_name_key(city),),
+    )
+    best, best_km = None, MAX_MATCH_KM
+    for row in cursor.fetchall():
+        # Equirectangular distance, precise enough at a few kilometres
+        dx = (row[7] - city_lon) * math.cos(math.radians(city_lat))
+        distance_km = 111.2 * math.hypot(row[6] - city_lat, dx)
+        if distance_km <= best_km:
+            best, best_km = row, distance_km
+    if best is None:
+        return None
+
+    code, name, department_code, region_code, population, postal_codes = best[:6]
+    return {
+        "code": code,
+        "nom": name,
+        "codeDepartement": department_code,
+        "codeRegion": region_code,
+        "population": population,
+        "codesPostaux": json.loads(postal_codes or "[]"),
+    }
+
+
+def node_coordinates(cursor: sqlite3.Cursor, node_ids: set[int]) -> dict:
+    """
+    Get the coordinates under which the app may have geocoded each node: those
+    of its stop point variants and of the app stations synced onto them.
+
+    Args:
+        cursor: SQLite database cursor
+        node_ids: Nodes enriched by insee_code.py (canonical nodes)
+
+    Returns:
+        Dictionary mapping (lat, lon) to node_id
+    """
+    if table_exists(cursor, "t_physical_station"):
+        variants = """
+            SELECT p.node_id, n.id AS variant_id, n.lat, n.lon
+            FROM t_physical_station p
+            JOIN t_nodes n ON n.uic_code = p.uic_code
+        """
+    else:
+        variants = "SELECT id AS node_id, id AS variant_id, lat, lon FROM t_nodes"
+    queries = [f"SELECT node_id, lat, lon FROM ({variants})"]
+    if table_exists(cursor, "t_app_station"):
+        queries.append(f"""
+            SELECT v.node_id, a.lat, a.lon
+            FROM t_app_station a
+            JOIN ({variants}) v ON v.variant_id = a.node_id
+        """)
+
+    cursor.execute(" UNION ALL ".join(queries))
+    return {
+        (lat, lon): node_id
+        for node_id, lat, lon in cursor.fetchall()
+        if node_id in node_ids
+    }
+
+
+def resolve_from_geocode_cache(
+    conn: sqlite3.Connection, cache_path: Path, node_ids: set[int]
+) -> dict[int, dict]:
+    """
+    Resolve the commune of nodes from the app's Nominatim geocode cache.
+
+    A node of France (by the country of its UIC code) is resolved when the
+    cache holds one of its coordinates (exact match, as the app caches them)
+    with a city that matches a commune by name within MAX_MATCH_KM. The
+    country of the cached city is not used: it is the localized name returned
+    by Nominatim.
+
+    Args:
+        conn: SQLite database connection
+        cache_path: Path to the app's geocode cache (geo-cache.db)
+        node_ids: Nodes to resolve
+
+    Returns:
+        Dictionary mapping node_id to commune, in the format of geo.api.gouv.fr
+    """
+    cursor = conn.cursor()
+    french_ids = {
+        node_id
+        for node_id, uic_code in load_stage_nodes(cursor)
+        if node_id in node_ids and node_country(uic_code) == "FR"
+    }
+    coordinates = node_coordinates(cursor, french_ids)
+    if not coordinates or not load_communes(conn):
+        return {}
+
+    cache = sqlite3.connect(f"file:{cache_path}?mode=ro", uri=True)
+    cached = cache.execute("""
+        SELECT lat, lon, city, city_lat, city_lon
+        FROM geocode_cache
+    """).fetchall()
+    cache.close()
+
+    resolved = {}
+    for lat, lon, city, city_lat, city_lon in cached:
+        node_id = coordinates.get((lat, lon))
+        if node_id is None or node_id in resolved:
+            continue
+        commune = match_commune(cursor, city, city_lat, city_lon)
+        if commune is not None:
+            resolved[node_id] = commune
+
+    return resolved
@@ -0,0 +1,557 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "httpx>=0.28.1",
+# ]
+# ///
+
+import codecs
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlencode
+
+import httpx
+
+# Responses that are never recorded: replaying them would only replay the wait
+UNRECORDED_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Hosts whose requests count against a quota: never hedged, a duplicate would
+# spend the quota twice
+UNHEDGED_HOSTS = {"public-api.meteofrance.fr"}
+
+# Latency-based timeouts: used once a host has enough samples, as a multiple
+# of its p99 latency, never below the floor nor above the caller's timeout
+DEFAULT_TIMEOUT = 30.0
+MIN_TIMEOUT = 5.0
+TIMEOUT_P99_FACTOR = 4
+LATENCY_WINDOW = 256
+MIN_LATENCY_SAMPLES = 20
+
+
+def fixture_key(request: httpx.Request) -> str:
+    """
+    Build the key of a request: method, URL without query, and sorted params.
+
+    Headers are left out, so API keys are never part of the store.
+
+    Args:
+        request: HTTP request
+
+    Returns:
+        Key string, e.g. "GET https://geo.api.gouv.fr/communes?lat=43.3&lon=5.4"
+    """
+    params = sorted(request.url.params.multi_items())
+    url = request.url.copy_with(query=None, fragment=None)
+    return f"{request.method} {url}?{urlencode(params)}"
+
+
+class RecordReplayTransport(httpx.BaseTransport):
+    """
+    HTTP transport recording responses to a SQLite store, or replaying them.
+
+    In record mode, requests go to the network and their responses are stored
+    (the last response of a key wins, so a polled file that eventually becomes
+    available is replayed as available). In replay mode, requests are answered
+    from the store only, and a request that was never recorded fails with an
+    httpx.TransportError, handled by the scripts as any network error.
+    """
+
+    def __init__(self, store_path: Path, mode: str):
+        self.mode = mode
+        self.conn = sqlite3.connect(store_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS t_http_fixture (
+                key TEXT PRIMARY KEY,
+                status_code INTEGER NOT NULL,
+                content_type TEXT,
+                body BLOB NOT NULL,
+                recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID
+        """)
+        self.transport = httpx.HTTPTransport() if mode == "record" else None
+        # Hedged requests use the store from two threads
+        self.lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = fixture_key(request)
+
+        if self.mode == "replay":
+            with self.lock:
+                row = self.conn.execute(
+                    "SELECT status_code, content_type, body FROM t_http_fixture WHERE key = ?",
+                    (key,),
+                ).fetchone()
+            if row is None:
+                raise httpx.TransportError(f"No recorded response for {key}")
+            status_code, content_type, body = row
+            content = zlib.decompress(body)
+        else:
+            response = self.transport.handle_request(request)
+            response.read()
+            response.close()
+            status_code = response.status_code
+            content_type = response.headers.get("content-type")
+            content = response.content
+            if status_code not in UNRECORDED_STATUS_CODES:
+                with self.lock:
+                    self.conn.execute(
+                        """
+                        INSERT OR REPLACE INTO t_http_fixture (key, status_code, content_type, body)
+                        VALUES (?, ?, ?, ?)
+                        """,
+                        (key, status_code, content_type, zlib.compress(content)),
+                    )
+                    self.conn.commit()
+
+        headers = {"content-type": content_type} if content_type else {}
+        return httpx.Response(
+            status_code, headers=headers, content=content, request=request
+        )
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+        self.conn.close()
+
+
+class HostLatencies:
+    """
+    Sliding window of the response times of each host, with hedging counters.
+    """
+
+    def __init__(self):
+        self.samples: dict[str, deque[float]] = {}
+        self.requests: dict[str, int] = {}
+        self.hedged: dict[str, int] = {}
+        self.hedge_wins: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def record(self, host: str, seconds: float) -> None:
+        with self.lock:
+            self.samples.setdefault(host, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def percentile(self, host: str, q: float) -> float | None:
+        """
+        Get a latency percentile of a host.
+
+        Args:
+            host: Host name
+            q: Percentile, between 0 and 100
+
+        Returns:
+            Latency in seconds, or None with too few samples
+        """
+        with self.lock:
+            samples = sorted(self.samples.get(host, ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+    def timeout(self, host: str, max_timeout: float) -> float:
+        """
+        Get the timeout of a request to a host.
+
+        Args:
+            host: Host name
+            max_timeout: Timeout requested by the caller, used as an upper bound
+
+        Returns:
+            Timeout in seconds
+        """
+        p99 = self.percentile(host, 99)
+        if p99 is None:
+            return max_timeout
+        return min(max_timeout, max(MIN_TIMEOUT, TIMEOUT_P99_FACTOR * p99))
+
+    def count(self, counter: dict[str, int], host: str) -> None:
+        with self.lock:
+            counter[host] = counter.get(host, 0) + 1
+
+
+# Client shared by the scripts, replaced by configure_http_fixtures
+_client = httpx.Client()
+_replaying = False
+_latencies = HostLatencies()
+_hedge_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedge")
+
+
+def configure_http_fixtures(store_path: Path | None, mode: str = "off") -> None:
+    """
+    Route the requests of http_get through a record/replay transport.
+
+    Args:
+        store_path: Path to the SQLite fixture store
+        mode: "record" to store real responses, "replay" to only answer from
+            the store, "off" to use the network directly
+    """
+    global _client, _replaying
+
+    _client.close()
+    if mode == "off":
+        _client = httpx.Client()
+    else:
+        _client = httpx.Client(transport=RecordReplayTransport(store_path, mode))
+    _replaying = mode == "replay"
+
+
+def _timed_get(host: str, url: str, timeout: float, kwargs: dict) -> httpx.Response:
+    start = time.perf_counter()
+    try:
+        return _client.get(url, timeout=timeout, **kwargs)
+    finally:
+        if not _replaying:
+            _latencies.record(host, time.perf_counter() - start)
+
+
+def _hedge_failed(future: Future) -> bool:
+    """
+    Check whether a hedged request failed, or got a throttled or server error
+    response, so that the other request should win.
+
+    Args:
+        future: Completed future of _timed_get
+
+    Returns:
+        True if the request raised or got a status code of 429 or more
+    """
+    return future.exception() is not None or future.result().status_code >= 429
+
+
+def http_get(
+    url: str, timeout: float = DEFAULT_TIMEOUT, hedge: bool = False, **kwargs
+) -> httpx.Response:
+    """
+    Send a GET request through the shared client, with the arguments of httpx.get.
+
+    The timeout adapts to the latency of the host. With hedge, a duplicate
+    request is sent once the first one is slower than the host's p95 latency,
+    and the first successful response wins (a 429 or 5xx response only wins
+    if both requests fail): only use it for requests without side effects.
+    Hosts of UNHEDGED_HOSTS are never hedged.
+
+    Args:
+        url: Request URL
+        timeout: Maximum timeout in seconds
+        hedge: Send a hedged duplicate of slow requests
+        **kwargs: params, headers, ...
+
+    Returns:
+        HTTP response
+    """
+    host = httpx.URL(url).host
+    _latencies.count(_latencies.requests, host)
+    timeout = _latencies.timeout(host, timeout)
+
+    hedge = hedge and not _replaying and host not in UNHEDGED_HOSTS
+    delay = _latencies.percentile(host, 95) if hedge else None
+    if delay is None:
+        return _timed_get(host, url, timeout, kwargs)
+
+    primary = _hedge_executor.submit(_timed_get, host, url, timeout, kwargs)
+    if wait([primary], timeout=delay).done:
+        return primary.result()
+
+    _latencies.count(_latencies.hedged, host)
+    duplicate = _hedge_executor.submit(_timed_get, host, url, timeout, kwargs)
+    pending = {primary, duplicate}
+    while True:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        # Fall back to the other request if the first one to finish failed
+        if primary in done and not _hedge_failed(primary):
+            return primary.result()
+        if duplicate in done and not _hedge_failed(duplicate):
+            _latencies.count(_latencies.hedge_wins, host)
+            return duplicate.result()
+        if not pending:
+            return primary.result()
+
+
+@contextmanager
+def http_stream(
+    url: str, timeout: float = DEFAULT_TIMEOUT, **kwargs
+) -> Iterator[httpx.Response]:
+    """
+    Send a streamed GET request through the shared client, asking for a
+    compressed body. The body is read by iterating over the response, e.g.
+    with iter_text.
+
+    Streamed requests are not hedged; their latency is the time to the
+    response headers.
+
+    Args:
+        url: Request URL
+        timeout: Maximum timeout in seconds
+        **kwargs: params, headers, ...
+
+    Yields:
+        HTTP response, with the body not read yet
+    """
+    host = httpx.URL(url).host
+    _latencies.count(_latencies.requests, host)
+    timeout = _latencies.timeout(host, timeout)
+    headers = {"accept-encoding": "gzip, deflate", **kwargs.pop("headers", {})}
+
+    start = time.perf_counter()
+    stream = _client.stream("GET", url, timeout=timeout, headers=headers, **kwargs)
+    try:
+        response = stream.__enter__()
+    finally:
+        if not _replaying:
+            _latencies.record(host, time.perf_counter() - start)
+    try:
+        yield response
+    finally:
+        stream.__exit__(None, None, None)
+
+
+def iter_text(response: httpx.Response, archive: Path | None = None) -> Iterator[str]:
+    """
+    Iterate over the decompressed, decoded body of a streamed response.
+
+    Args:
+        response: Response of http_stream
+        archive: File receiving a copy of the body as it is read, gzipped if
+            its name ends with .gz; written atomically once the body is complete
+
+    Yields:
+        Text chunks
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(
+        errors="replace"
+    )
+    if archive is None:
+        for chunk in response.iter_bytes():
+            yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+        return
+
+    tmp_path = archive.with_name(archive.name + ".tmp")
+    opener = gzip.open if archive.suffix == ".gz" else open
+    try:
+        with opener(tmp_path, "wb") as f:
+            for chunk in response.iter_bytes():
+                f.write(chunk)
+                yield decoder.decode(chunk)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, archive)
+    yield decoder.decode(b"", final=True)
+
+
+def iter_json_array(
+    chunks: Iterator[str], key: str | None = None, members: dict | None = None
+) -> Iterator:
+    """
+    Incrementally decode the items of a JSON array, holding only one item and
+    one chunk in memory at a time.
+
+    Args:
+        chunks: Text chunks, e.g. from iter_text
+        key: None if the document is the array, otherwise the name of the
+            member of the top-level object holding it
+        members: Dictionary receiving the other top-level members read before
+            the array (e.g. a total count)
+
+    Yields:
+        Decoded items
+
+    Raises:
+        ValueError: If the document is not valid JSON or has no such array
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ""
+    pos = 0
+
+    def fill() -> bool:
+        nonlocal buffer, pos
+        for chunk in chunks:
+            if chunk:
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                return True
+        return False
+
+    def peek() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(chars: str) -> str:
+        nonlocal pos
+        char = peek()
+        if char not in chars:
+            raise ValueError(
+                f"Expected one of {chars!r} in JSON document, got {char!r}"
+            )
+        pos += 1
+        return char
+
+    def decode():
+        # A value at the end of the buffer may be cut (e.g. "1.5" of "1.5e3"),
+        # so it is only accepted once followed by a delimiter or the end of
+        # the body
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                if end < len(buffer) and buffer[end] in " \t\r\n,:]}":
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                value, end = None, None
+            if not fill():
+                if end is None:
+                    raise ValueError("Invalid JSON document")
+                pos = end
+                return value
+
+    if key is not None:
+        expect("{")
+        if peek() == "}":
+            raise ValueError(f"No {key!r} member in JSON document")
+        while True:
+            name = decode()
+            expect(":")
+            if name == key:
+                break
+            value = decode()
+            if members is not None:
+                members[name] = value
+            if expect(",}") == "}":
+                raise ValueError(f"No {key!r} member in JSON document")
+
+    expect("[")
+    if peek() != "]":
+        while True:
+            yield decode()
+            if expect(",]") == "]":
+                break
+    else:
+        pos += 1
+
+    # Read the rest of the body, so that iter_text completes its archive
+    for _ in chunks:
+        pass
+
+
+def print_http_stats() -> None:
+    """
+    Print the latency percentiles and hedging counters of each host.
+    """
+    for host, count in sorted(_latencies.requests.items()):
+        percentiles = [_latencies.percentile(host, q) for q in (50, 95, 99)]
+        latencies = (
+            "p50/p95/p99 "
+            + "/".join(f"{value * 1000:.0f}" for value in percentiles)
+            + " ms"
+            if percentiles[0] is not None
+            else "too few samples for percentiles"
+        )
+        hedged = _latencies.hedged.get(host, 0)
+        print(
+            f"  {host}: {count} requests, {latencies}, {hedged} hedged "
+            f"({_latencies.hedge_wins.get(host, 0)} won by the duplicate)"
+        )
+
+
+def pace(seconds: float) -> None:
+    """
+    Wait between API calls to respect rate limits, unless replaying.
+
+    Args:
+        seconds: Delay in seconds
+    """
+    if not _replaying:
+        time.sleep(seconds)
+
+
+def add_http_fixture_arguments(parser) -> None:
+    """
+    Add the --http-record and --http-replay options to a script parser.
+
+    Args:
+        parser: argparse.ArgumentParser of the script
+    """
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--http-record",
+        type=Path,
+        metavar="STORE",
+        help="Record the API responses to the STORE fixture database",
+    )
+    group.add_argument(
+        "--http-replay",
+        type=Path,
+        metavar="STORE",
+        help="Answer API requests from the STORE fixture database, without network",
+    )
+
+
+def raw_archive_path(archive_dir: Path | None, name: str) -> Path | None:
+    """
+    Get the path where a raw API response is archived.
+
+    Args:
+        archive_dir: Directory of --raw-archive, None if not archiving
+        name: File name, e.g. "liste-stations_13.json.gz"
+
+    Returns:
+        Path in archive_dir, created if needed, or None if not archiving
+    """
+    if archive_dir is None:
+        return None
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    return archive_dir / name
+
+
+def add_raw_archive_argument(parser) -> None:
+    """
+    Add the --raw-archive option to a script parser.
+
+    Args:
+        parser: argparse.ArgumentParser of the script
+    """
+    parser.add_argument(
+        "--raw-archive",
+        type=Path,
+        metavar="DIR",
+        help="Also write the raw API responses to DIR (gzipped), as they are read",
+    )
+
+
+def configure_http_fixtures_from_args(args) -> None:
+    """
+    Configure the fixture layer from the options of add_http_fixture_arguments.
+
+    Args:
+        args: Parsed arguments
+    """
+    if args.http_record is not None:
+        configure_http_fixtures(args.http_record, "record")
+    elif args.http_replay is not None:
+        if not args.http_replay.exists():
+            print(
+                f"Error: HTTP fixture store {args.http_replay} does not exist",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        configure_http_fixtures(args.http_replay, "replay")
@@ -10,10 +10,24 @@ import sqlite3
 import sys
 from pathlib import Path
 
+from http_fixtures import (
+    add_http_fixture_arguments,
+    add_raw_archive_argument,
+    configure_http_fixtures_from_args,
+    http_stream,
+    iter_json_array,
+    iter_text,
+    raw_archive_path,
+)
+from migrate import optimize_database
+from node_profile import refresh_tracked_profiles, start_change_tracking
+from profiling import Profiler, add_profile_arguments
+from providers import Provider, fetch_stage, load_stage_nodes, register_provider
+
 
 def create_museum_table(cursor: sqlite3.Cursor) -> None:
     """
-    Create the t_museum table and associated indexes.
+    Create the t_museum table.
 
     Args:
         cursor: SQLite database cursor
@@ -27,15 +41,17 @@ def create_museum_table(cursor: sqlite3.Cursor) -> None:
         )
     """)
 
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_museum_postal_code ON t_museum(postal_code)
-    """)
-
 
-def fetch_museum_data() -> list[dict]:
+def fetch_museum_data(archive_dir: Path | None = None) -> list[dict]:
     """
     Fetch museum count per postal code from French culture API.
 
+    The response is streamed into an incremental JSON parser, so only the
+    parsed records are held in memory.
+
+    Args:
+        archive_dir: Directory receiving a copy of the raw response, if set
+
     Returns:
         List of dictionaries with postal_code and count
     """
@@ -48,12 +64,15 @@ def fetch_museum_data() -> list[dict]:
 
     try:
         print("Fetching museum data from culture.gouv.fr API...")
-        response = httpx.get(url, params=params, timeout=30.0)
-        response.raise_for_status()
-        data = response.json()
+        members = {}
+        with http_stream(url, params=params, timeout=30.0) as response:
+            response.raise_for_status()
+            chunks = iter_text(
+                response, raw_archive_path(archive_dir, "musees.json.gz")
+            )
+            results = list(iter_json_array(chunks, "results", members))
 
-        total_count = data.get("total_count", 0)
-        results = data.get("results", [])
+        total_count = members.get("total_count", 0)
 
         print(f"Fetched {len(results)} postal codes with museum data")
 
@@ -80,6 +99,52 @@ def fetch_museum_data() -> list[dict]:
         return []
 
 
+def fetch_french_museums(
+    node_ids: set[int], archive_dir: Path | None = None, **options
+) -> list[dict]:
+    """
+    Fetch hook of the culture.gouv.fr POI provider. Its dataset covers every
+    French postal code, so the nodes are not used.
+
+    Args:
+        node_ids: French nodes
+        archive_dir: Directory receiving a copy of the raw response, if set
+        **options: Options of the other POI providers
+
+    Returns:
+        List of dictionaries with code_postal and count
+    """
+    return fetch_museum_data(archive_dir)
+
+
+# Museums of the French postal codes, from the culture.gouv.fr dataset
+register_provider(
+    Provider("data.culture.gouv.fr", "poi", {"FR"}, fetch=fetch_french_museums)
+)
+
+
+def fetch_poi_data(db_path: Path, archive_dir: Path | None = None) -> list[dict]:
+    """
+    Fetch the museum counts per postal code through the providers of the "poi"
+    stage serving the countries of the nodes (see providers.py).
+
+    Args:
+        db_path: Path to SQLite database file
+        archive_dir: Directory receiving a copy of the raw responses, if set
+
+    Returns:
+        List of dictionaries with code_postal and count, of every provider
+    """
+    conn = sqlite3.connect(db_path)
+    nodes = load_stage_nodes(conn.cursor())
+    conn.close()
+    return [
+        record
+        for _, records in fetch_stage("poi", nodes, archive_dir=archive_dir)
+        for record in records
+    ]
+
+
 def insert_museum_data(cursor: sqlite3.Cursor, data: list[dict]) -> int:
     """
     Insert museum data into the database.
@@ -137,8 +202,13 @@ def main() -> None:
         default=Path(__file__).parent / "nodes.db",
         help="Path to SQLite database file (default: nodes.db in script directory)",
     )
+    add_raw_archive_argument(parser)
+    add_http_fixture_arguments(parser)
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
+    profiler = Profiler.from_args(args)
+    configure_http_fixtures_from_args(args)
 
     # Connect to database
     print(f"Connecting to {args.db}...")
@@ -148,9 +218,11 @@ def main() -> None:
     # Create table
     print("Creating table t_museum...")
     create_museum_table(cursor)
+    start_change_tracking(conn)
 
     # Fetch data from API
-    museum_data = fetch_museum_data()
+    with profiler.phase("fetch_poi_data"):
+        museum_data = fetch_poi_data(args.db, args.raw_archive)
 
     if not museum_data:
         print("No museum data fetched. Exiting.")
@@ -163,6 +235,8 @@ def main() -> None:
 
     # Commit and close
     conn.commit()
+    refresh_tracked_profiles(conn)
+    optimize_database(conn)
     conn.close()
 
     print(f"\n✓ Inserted {inserted} postal code records with museum counts")
@@ -4,9 +4,132 @@
 # ///
 
 import json
+import re
 import sqlite3
 from pathlib import Path
 
+from area_rollup import create_area_rollups
+from migrate import optimize_database, table_exists
+from node_profile import refresh_node_profiles
+from node_search import create_node_search_index
+
+
+def parse_uic_code(sncf_id: str) -> str:
+    """
+    Extract the UIC code of the physical station from an SNCF stop point ID.
+
+    The same physical station appears once per mode suffix, e.g.
+    "stop_point:SNCF:87271007:LongDistanceTrain" and
+    "stop_point:SNCF:87271007:Train" both map to "87271007". The stop IDs of
+    the SNCF GTFS feed imported by the app are also supported, e.g.
+    "StopArea:OCE87271007" and "StopPoint:OCETrain TER-87271007".
+
+    Args:
+        sncf_id: SNCF station identifier
+
+    Returns:
+        UIC code, or the full identifier if it does not follow the SNCF format
+    """
+    parts = sncf_id.split(":")
+    if len(parts) >= 3 and parts[0] == "stop_point" and parts[2]:
+        return parts[2]
+    if len(parts) == 2 and parts[0] in ("StopArea", "StopPoint"):
+        match = re.search(r"(?:OCE|-)(\d{8})$", parts[1])
+        if match:
+            return match.group(1)
+    return sncf_id
+
+
+def create_nodes_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the t_nodes table and associated indexes.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS t_nodes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sncf_id TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            uic_code TEXT
+        );
+    """)
+
+    # Databases created before physical stations existed lack the uic_code column
+    cursor.execute("PRAGMA table_info(t_nodes)")
+    if "uic_code" not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute("ALTER TABLE t_nodes ADD COLUMN uic_code TEXT")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_nodes_uic_code ON t_nodes(uic_code);
+    """)
+
+
+def create_physical_station_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the t_physical_station table and associated indexes.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS t_physical_station (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            uic_code TEXT UNIQUE NOT NULL,
+            node_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            variant_count INTEGER NOT NULL,
+            FOREIGN KEY (node_id) REFERENCES t_nodes(id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_physical_station_node ON t_physical_station(node_id)
+    """)
+
+
+def build_physical_stations(cursor: sqlite3.Cursor) -> int:
+    """
+    Rebuild t_physical_station from t_nodes, one row per UIC code.
+
+    The canonical node of a physical station is its variant with the lowest id,
+    and its representative coordinate is the mean of all variant coordinates.
+    Enrichment scripts only process canonical nodes and fan their results back
+    out to every variant through views. Nodes inserted before the uic_code
+    column existed get it from their sncf_id first.
+
+    Args:
+        cursor: SQLite database cursor
+
+    Returns:
+        Number of physical stations
+    """
+    cursor.execute("SELECT id, sncf_id FROM t_nodes WHERE uic_code IS NULL")
+    cursor.executemany(
+        "UPDATE t_nodes SET uic_code = ? WHERE id = ?",
+        [(parse_uic_code(sncf_id), node_id) for node_id, sncf_id in cursor.fetchall()],
+    )
+
+    cursor.execute("DELETE FROM t_physical_station")
+    cursor.execute("""
+        INSERT INTO t_physical_station (uic_code, node_id, name, lat, lon, variant_count)
+        SELECT g.uic_code, g.node_id, n.name, g.lat, g.lon, g.variant_count
+        FROM (
+            SELECT uic_code, MIN(id) AS node_id, AVG(lat) AS lat, AVG(lon) AS lon,
+                   COUNT(*) AS variant_count
+            FROM t_nodes
+            WHERE uic_code IS NOT NULL
+            GROUP BY uic_code
+        ) g
+        JOIN t_nodes n ON n.id = g.node_id
+    """)
+    cursor.execute("SELECT COUNT(*) FROM t_physical_station")
+    return cursor.fetchone()[0]
+
 
 def main() -> None:
     # Paths
@@ -26,18 +149,7 @@ def main() -> None:
 
     # Create table
     print("Creating table t_nodes...")
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS t_nodes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sncf_id TEXT UNIQUE NOT NULL,
-            name TEXT NOT NULL,
-            lat REAL NOT NULL,
-            lon REAL NOT NULL
-        );
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_sncf_id ON t_nodes(sncf_id);
-    """)
+    create_nodes_table(cursor)
 
     # Insert data
     print("Inserting nodes...")
@@ -52,16 +164,41 @@ def main() -> None:
 
         node = entry[1]
         cursor.execute(
-            "INSERT OR REPLACE INTO t_nodes (sncf_id, name, lat, lon) VALUES (?, ?, ?, ?)",
-            (node["id"], node["name"], float(node["lat"]), float(node["lon"])),
+            "INSERT OR REPLACE INTO t_nodes (sncf_id, name, lat, lon, uic_code) VALUES (?, ?, ?, ?, ?)",
+            (
+                node["id"],
+                node["name"],
+                float(node["lat"]),
+                float(node["lon"]),
+                parse_uic_code(node["id"]),
+            ),
         )
         inserted += 1
 
+    # Group stop point variants into physical stations
+    print("Building table t_physical_station...")
+    create_physical_station_table(cursor)
+    physical_count = build_physical_stations(cursor)
+
+    # Re-ingesting nodes can change their ids, rebuild the search index, every
+    # profile and the rollups of the canonical nodes
+    print("Building table t_node_search...")
+    create_node_search_index(conn, rebuild=True)
+
+    if table_exists(cursor, "t_node_profile"):
+        print("Rebuilding table t_node_profile...")
+        refresh_node_profiles(conn)
+
+    print("Building tables t_department_rollup and t_region_rollup...")
+    create_area_rollups(conn, rebuild=True)
+
     # Commit and close
     conn.commit()
+    optimize_database(conn)
     conn.close()
 
     print(f"✓ Inserted {inserted} nodes (skipped {skipped} empty entries)")
+    print(f"✓ Grouped nodes into {physical_count} physical stations")
     print(f"✓ Database saved to {db_file}")
 
 
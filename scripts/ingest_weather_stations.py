@@ -15,6 +15,19 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
+from http_fixtures import (
+    add_http_fixture_arguments,
+    add_raw_archive_argument,
+    configure_http_fixtures_from_args,
+    http_stream,
+    iter_json_array,
+    iter_text,
+    print_http_stats,
+    raw_archive_path,
+)
+from migrate import optimize_database
+from profiling import Profiler, add_profile_arguments
+
 
 def create_weather_station_table(cursor: sqlite3.Cursor) -> None:
     """
@@ -39,10 +52,6 @@ def create_weather_station_table(cursor: sqlite3.Cursor) -> None:
         )
     """)
 
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_station_id ON t_weather_station(station_id)
-    """)
-
     cursor.execute("""
         CREATE INDEX IF NOT EXISTS idx_weather_station_coords ON t_weather_station(lat, lon)
     """)
@@ -52,13 +61,19 @@ def create_weather_station_table(cursor: sqlite3.Cursor) -> None:
     """)
 
 
-def fetch_weather_stations(api_key: str, department_ids: list[str]) -> list[dict]:
+def fetch_weather_stations(
+    api_key: str, department_ids: list[str], archive_dir: Path | None = None
+) -> list[dict]:
     """
     Fetch weather stations from Meteo France API for given departments.
 
+    Each response is streamed into an incremental JSON parser, so only the
+    parsed stations are held in memory.
+
     Args:
         api_key: API key
         department_ids: List of department IDs to fetch stations for
+        archive_dir: Directory receiving a copy of each raw response, if set
 
     Returns:
         List of station dictionaries
@@ -80,9 +95,14 @@ def fetch_weather_stations(api_key: str, department_ids: list[str]) -> list[dict
 
         for attempt in range(max_retries):
             try:
-                response = httpx.get(url, headers=headers, params=params, timeout=30.0)
-                response.raise_for_status()
-                stations = response.json()
+                archive = raw_archive_path(
+                    archive_dir, f"liste-stations_{dept_id}.json.gz"
+                )
+                with http_stream(
+                    url, headers=headers, params=params, timeout=30.0
+                ) as response:
+                    response.raise_for_status()
+                    stations = list(iter_json_array(iter_text(response, archive)))
                 print(f"  Found {len(stations)} stations")
                 # Add department code to each station
                 for station in stations:
@@ -202,8 +222,13 @@ def main() -> None:
         nargs="+",
         help="Department IDs to fetch (e.g., 13 75 69). If not provided, will use departments from t_insee table.",
     )
+    add_raw_archive_argument(parser)
+    add_http_fixture_arguments(parser)
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
+    profiler = Profiler.from_args(args)
+    configure_http_fixtures_from_args(args)
 
     # Get API token from argument or environment variable
     api_token = os.getenv("METEO_FRANCE_API_KEY")
@@ -238,7 +263,8 @@ def main() -> None:
 
     # Fetch stations from API
     print(f"\nFetching stations for {len(department_ids)} departments...")
-    stations = fetch_weather_stations(api_token, department_ids)
+    with profiler.phase("fetch_weather_stations"):
+        stations = fetch_weather_stations(api_token, department_ids, args.raw_archive)
 
     if not stations:
         print("No stations fetched. Exiting.")
@@ -253,11 +279,15 @@ def main() -> None:
 
     # Commit and close
     conn.commit()
+    optimize_database(conn)
     conn.close()
 
     print(f"\n✓ Inserted {inserted} weather stations")
     print(f"✓ Database saved to {args.db}")
 
+    print("\nHTTP latency:")
+    print_http_stats()
+
 
 if __name__ == "__main__":
     main()
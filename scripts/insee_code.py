@@ -9,9 +9,37 @@ import httpx
 import json
 import sqlite3
 import sys
-import time
+from concurrent.futures import Future
+from itertools import chain
 from pathlib import Path
 
+from geocode_cache import resolve_from_geocode_cache
+from http_fixtures import (
+    add_http_fixture_arguments,
+    configure_http_fixtures_from_args,
+    http_get,
+    print_http_stats,
+)
+from ingest_nodes import parse_uic_code
+from migrate import apply_migrations, optimize_database, table_exists
+from node_profile import refresh_tracked_profiles, start_change_tracking
+from node_search import create_node_search_index
+from profiling import Profiler, add_profile_arguments
+from providers import (
+    Provider,
+    add_provider_arguments,
+    configure_providers_from_args,
+    print_provider_stats,
+    register_provider,
+    run_stage,
+)
+from shadow_db import (
+    add_shadow_arguments,
+    publish_shadow_from_args,
+    shadow_db_from_args,
+)
+from sharding import add_shard_arguments, shard_db_from_args, shard_node_ids
+
 
 def get_city_from_coordinates(lat: float, lon: float) -> dict | tuple[None, str]:
     """
@@ -32,7 +60,7 @@ def get_city_from_coordinates(lat: float, lon: float) -> dict | tuple[None, str]
     }
 
     try:
-        response = httpx.get(url, params=params)
+        response = http_get(url, params=params, hedge=True)
         response.raise_for_status()
         communes = response.json()
 
@@ -53,6 +81,20 @@ def get_city_from_coordinates(lat: float, lon: float) -> dict | tuple[None, str]
         return None, error_msg
 
 
+# Communes of the French nodes, geo.api.gouv.fr allowing 50 calls/s
+register_provider(
+    Provider(
+        "geo.api.gouv.fr",
+        "admin",
+        {"FR"},
+        get_city_from_coordinates,
+        concurrency=4,
+        calls_per_second=50,
+        cache_precision=4,
+    )
+)
+
+
 def create_insee_table(cursor: sqlite3.Cursor) -> None:
     """
     Create the t_insee table and associated indexes.
@@ -77,52 +119,148 @@ def create_insee_table(cursor: sqlite3.Cursor) -> None:
     """)
 
     cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_insee_node_id ON t_insee(node_id)
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_insee_node_id ON t_insee(node_id)
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_insee_node_dept ON t_insee(node_id, department_code)
+    """)
+
+
+def create_node_insee_view(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the v_node_insee view, fanning INSEE data out to every node.
+
+    Only the canonical node of each physical station is enriched; the view
+    exposes its row for every stop point variant of the same station.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS v_node_insee AS
+        SELECT n.id AS node_id, i.insee_code, i.city_name, i.department_code,
+               i.region_code, i.population, i.postal_codes, i.error_message,
+               i.created_at
+        FROM t_nodes n
+        JOIN t_physical_station p ON p.uic_code = n.uic_code
+        JOIN t_insee i ON i.node_id = p.node_id
     """)
 
 
-def enrich_cities_from_db(db_path: Path) -> None:
+def record_insee_error(
+    cursor: sqlite3.Cursor, node_id: int, error_message: str
+) -> None:
+    """
+    Record a failed lookup of a node. A node that already has INSEE data keeps
+    it, with its old created_at, so a transient failure (timeout, 429) does
+    not destroy valid data and the node stays stale for the next refresh.
+
+    Args:
+        cursor: SQLite database cursor
+        node_id: Node id
+        error_message: Error of the lookup
+    """
+    cursor.execute(
+        """
+        INSERT INTO t_insee (node_id, error_message)
+        VALUES (?, ?)
+        ON CONFLICT (node_id) DO UPDATE SET error_message = excluded.error_message
+        WHERE t_insee.insee_code IS NULL
+        """,
+        (node_id, error_message),
+    )
+
+
+def enrich_cities_from_db(
+    db_path: Path,
+    shard: str | None = None,
+    geocode_cache: Path | None = None,
+    node_ids: set[int] | None = None,
+) -> None:
     """
     Load nodes from t_nodes table, enrich each with API data, and save to t_insee table.
 
     Args:
         db_path: Path to SQLite database file
+        shard: Shard specification restricting the nodes to enrich (see sharding.py)
+        geocode_cache: Path to the app's geocode cache, whose cities resolve
+            nodes without calling the API (see geocode_cache.py)
+        node_ids: Canonical node ids restricting the nodes to enrich
     """
     # Connect to database
     print(f"Connecting to {db_path}...")
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
+    # Databases predating migrate.py have a non-unique idx_insee_node_id, on
+    # which INSERT OR REPLACE would append duplicates
+    apply_migrations(conn)
+
     # Create t_insee table
     print("Creating table t_insee...")
     create_insee_table(cursor)
 
-    # Load nodes from t_nodes
-    print("Loading nodes from t_nodes...")
-    cursor.execute("SELECT id, sncf_id, name, lat, lon FROM t_nodes")
+    # Load one canonical node per physical station, falling back to every node
+    grouped = table_exists(cursor, "t_physical_station")
+    if grouped:
+        create_node_insee_view(cursor)
+        print("Loading physical stations from t_physical_station...")
+        cursor.execute("""
+            SELECT p.node_id, p.uic_code, p.name, p.lat, p.lon
+            FROM t_physical_station p
+        """)
+    else:
+        print("Loading nodes from t_nodes...")
+        cursor.execute("SELECT id, sncf_id, name, lat, lon FROM t_nodes")
     nodes = cursor.fetchall()
+    if not grouped:
+        nodes = [
+            (node_id, parse_uic_code(sncf_id), name, lat, lon)
+            for node_id, sncf_id, name, lat, lon in nodes
+        ]
+    if shard is not None:
+        shard_ids = shard_node_ids(cursor, shard)
+        nodes = [node for node in nodes if node[0] in shard_ids]
+        print(f"Restricting to shard {shard}")
+    if node_ids is not None:
+        nodes = [node for node in nodes if node[0] in node_ids]
+    # City names and postal codes are indexed by the t_insee triggers
+    create_node_search_index(conn)
+    start_change_tracking(conn)
+
+    resolved = {}
+    if geocode_cache is not None:
+        print(f"Matching cached cities of {geocode_cache}...")
+        resolved = resolve_from_geocode_cache(
+            conn, geocode_cache, {node[0] for node in nodes}
+        )
+        print(f"  {len(resolved)} nodes resolved from the geocode cache")
 
     total_entries = len(nodes)
     enriched_count = 0
     error_count = 0
 
-    # Rate limiting: 50 calls/s = 0.02s per call
-    rate_limit_delay = 0.02
-
     print(f"Processing {total_entries} nodes...")
-    print(f"Rate limit: 50 calls/s (waiting {rate_limit_delay}s between calls)")
 
-    for i, (node_id, sncf_id, name, lat, lon) in enumerate(nodes):
+    # Cities from the geocode cache first, then from the provider of the
+    # country of each node, as the lookups complete
+    lookups = chain(
+        ((node, resolved[node[0]]) for node in nodes if node[0] in resolved),
+        run_stage("admin", (node for node in nodes if node[0] not in resolved)),
+    )
+
+    for i, (node, lookup) in enumerate(lookups):
+        node_id, name = node[0], node[2]
         try:
-            # Get city information from API
-            result = get_city_from_coordinates(lat, lon)
+            result = lookup.result() if isinstance(lookup, Future) else lookup
 
             if isinstance(result, dict):
                 # Insert enriched data
                 postal_codes_json = json.dumps(result.get("codesPostaux", []))
                 cursor.execute(
                     """
-                    INSERT INTO t_insee 
+                    INSERT OR REPLACE INTO t_insee 
                     (node_id, insee_code, city_name, department_code, region_code, population, postal_codes)
                     VALUES (?, ?, ?, ?, ?, ?, ?)
                     """,
@@ -140,13 +278,7 @@ def enrich_cities_from_db(db_path: Path) -> None:
             else:
                 # result is (None, error_message)
                 _, error_message = result
-                cursor.execute(
-                    """
-                    INSERT INTO t_insee (node_id, error_message)
-                    VALUES (?, ?)
-                    """,
-                    (node_id, error_message),
-                )
+                record_insee_error(cursor, node_id, error_message)
                 error_count += 1
 
             # Commit every 50 entries
@@ -156,31 +288,24 @@ def enrich_cities_from_db(db_path: Path) -> None:
                     f"Progress: {i + 1}/{total_entries} | Enriched: {enriched_count} | Errors: {error_count}"
                 )
 
-            # Rate limiting
-            time.sleep(rate_limit_delay)
-
         except Exception as e:
             error_message = f"{type(e).__name__}: {str(e)}"
             print(
                 f"Error processing node {node_id} ({name}): {error_message}",
                 file=sys.stderr,
             )
-            cursor.execute(
-                """
-                INSERT INTO t_insee (node_id, error_message)
-                VALUES (?, ?)
-                """,
-                (node_id, error_message),
-            )
+            record_insee_error(cursor, node_id, error_message)
             error_count += 1
 
     # Final commit
     conn.commit()
+    refresh_tracked_profiles(conn)
+    optimize_database(conn)
     conn.close()
 
     print(f"\nDone!")
     print(f"  Total nodes: {total_entries}")
-    print(f"  Enriched: {enriched_count}")
+    print(f"  Enriched: {enriched_count} ({len(resolved)} from the geocode cache)")
     print(f"  Errors: {error_count}")
 
 
@@ -196,14 +321,43 @@ def main() -> None:
         default=Path(__file__).parent / "nodes.db",
         help="Path to SQLite database file (default: nodes.db in script directory)",
     )
+    parser.add_argument(
+        "--geocode-cache",
+        type=Path,
+        help="Path to the app's geocode cache (geo-cache.db), to resolve the cached cities locally",
+    )
+    add_provider_arguments(parser)
+    add_shard_arguments(parser)
+    add_shadow_arguments(parser)
+    add_http_fixture_arguments(parser)
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
+    profiler = Profiler.from_args(args)
+    configure_http_fixtures_from_args(args)
+    configure_providers_from_args(args)
 
     if not args.db.exists():
         print(f"Error: Database file {args.db} does not exist", file=sys.stderr)
         sys.exit(1)
 
-    enrich_cities_from_db(args.db)
+    if args.geocode_cache is not None and not args.geocode_cache.exists():
+        print(
+            f"Error: Geocode cache {args.geocode_cache} does not exist",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    db_path = shadow_db_from_args(args, shard_db_from_args(args))
+
+    with profiler.phase("enrich_cities_from_db"):
+        enrich_cities_from_db(db_path, args.shard, args.geocode_cache)
+    publish_shadow_from_args(args)
+
+    print("\nProviders:")
+    print_provider_stats()
+    print("\nHTTP latency:")
+    print_http_stats()
 
 
 if __name__ == "__main__":
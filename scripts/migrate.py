@@ -0,0 +1,273 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = []
+# ///
+
+import sqlite3
+import sys
+from pathlib import Path
+
+# Versioned schema migrations, applied in order and tracked with PRAGMA
+# user_version. Each migration targets one table and is skipped when that table
+# does not exist yet: the create_*_table functions of the ingestion scripts
+# already produce the latest schema.
+MIGRATIONS = [
+    (
+        1,
+        "Unique INSEE record per node",
+        "t_insee",
+        [
+            # Keep the most recent record of nodes enriched several times
+            "DELETE FROM t_insee WHERE id NOT IN (SELECT MAX(id) FROM t_insee GROUP BY node_id)",
+            "DROP INDEX IF EXISTS idx_insee_node_id",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_insee_node_id ON t_insee(node_id)",
+            "CREATE INDEX IF NOT EXISTS idx_insee_node_dept ON t_insee(node_id, department_code)",
+        ],
+    ),
+    (
+        2,
+        "Drop index duplicating UNIQUE(sncf_id)",
+        "t_nodes",
+        ["DROP INDEX IF EXISTS idx_sncf_id"],
+    ),
+    (
+        3,
+        "Drop index duplicating UNIQUE(station_id)",
+        "t_weather_station",
+        ["DROP INDEX IF EXISTS idx_station_id"],
+    ),
+    (
+        4,
+        "Covering index for monthly rankings, drop index duplicating UNIQUE(node_id, month)",
+        "t_weather_data",
+        [
+            "DROP INDEX IF EXISTS idx_weather_data_node",
+            "DROP INDEX IF EXISTS idx_weather_data_month",
+            """CREATE INDEX IF NOT EXISTS idx_weather_data_month_temp
+               ON t_weather_data(month, average_temp, precipitation, node_id)""",
+        ],
+    ),
+    (
+        5,
+        "Drop index duplicating UNIQUE(postal_code)",
+        "t_museum",
+        ["DROP INDEX IF EXISTS idx_museum_postal_code"],
+    ),
+]
+
+# Key queries documented in db.md, with the plan details they must not use
+KEY_QUERIES = {
+    "station_with_weather": (
+        """
+        SELECT n.name, n.lat, n.lon,
+               w.month, w.precipitation, w.average_temp, w.sunny_days,
+               ws.nom as station_name
+        FROM t_nodes n
+        JOIN t_weather_data w ON n.id = w.node_id
+        JOIN t_weather_station ws ON w.weather_station_id = ws.id
+        WHERE n.sncf_id = 'stop_point:SNCF:87271007:LongDistanceTrain'
+        """,
+        ["SCAN n", "SCAN w", "SCAN ws"],
+    ),
+    "all_january": (
+        """
+        SELECT n.name, w.precipitation, w.average_temp
+        FROM t_nodes n
+        JOIN t_weather_data w ON n.id = w.node_id
+        WHERE w.month = 1
+        ORDER BY w.average_temp DESC
+        """,
+        ["SCAN w", "SCAN n", "USE TEMP B-TREE"],
+    ),
+    "station_with_city": (
+        """
+        SELECT n.name, i.city_name, i.department_code, i.population
+        FROM t_nodes n
+        JOIN t_insee i ON n.id = i.node_id
+        WHERE i.error_message IS NULL
+        """,
+        ["SCAN n"],
+    ),
+    "stations_with_museum_count": (
+        """
+        SELECT n.name, i.city_name, i.postal_codes, m.museum_count
+        FROM t_nodes n
+        JOIN t_insee i ON n.id = i.node_id
+        JOIN t_museum m ON json_extract(i.postal_codes, '$[0]') = m.postal_code
+        WHERE m.museum_count > 0
+        ORDER BY m.museum_count DESC
+        """,
+        ["SCAN n", "SCAN m"],
+    ),
+}
+
+
+def table_exists(cursor: sqlite3.Cursor, table: str) -> bool:
+    """
+    Check whether a table exists.
+
+    Args:
+        cursor: SQLite database cursor
+        table: Table name
+
+    Returns:
+        True if the table exists
+    """
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    )
+    return cursor.fetchone() is not None
+
+
+def optimize_database(conn: sqlite3.Connection) -> None:
+    """
+    Refresh query planner statistics.
+
+    Args:
+        conn: SQLite database connection
+    """
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+
+
+def apply_migrations(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending migrations, each in its own transaction.
+
+    Args:
+        conn: SQLite database connection
+
+    Returns:
+        Number of applied migrations
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA user_version")
+    current_version = cursor.fetchone()[0]
+    applied = 0
+
+    for version, description, table, statements in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        if table_exists(cursor, table):
+            print(f"Applying migration {version}: {description}...")
+            for statement in statements:
+                cursor.execute(statement)
+        else:
+            print(f"Skipping migration {version}: {table} does not exist yet")
+
+        # PRAGMA does not accept bound parameters
+        cursor.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+        optimize_database(conn)
+        applied += 1
+
+    return applied
+
+
+def explain_query_plan(cursor: sqlite3.Cursor, query: str) -> list[str]:
+    """
+    Get the EXPLAIN QUERY PLAN details of a query.
+
+    Args:
+        cursor: SQLite database cursor
+        query: SQL query
+
+    Returns:
+        List of plan details, one per plan node
+    """
+    cursor.execute(f"EXPLAIN QUERY PLAN {query}")
+    return [row[3] for row in cursor.fetchall()]
+
+
+def unexpected_plan_details(plan: list[str], forbidden: list[str]) -> list[str]:
+    """
+    Get the plan details of a key query that use a forbidden pattern.
+
+    Args:
+        plan: Plan details, from explain_query_plan
+        forbidden: Plan detail prefixes the query must not use, from KEY_QUERIES
+
+    Returns:
+        List of unexpected plan details
+    """
+    return [detail for detail in plan if detail.startswith(tuple(forbidden))]
+
+
+def check_query_plans(conn: sqlite3.Connection) -> list[str]:
+    """
+    Check that the key queries avoid full scans and temporary sorts.
+
+    Queries on tables that do not exist yet are skipped.
+
+    Args:
+        conn: SQLite database connection
+
+    Returns:
+        List of problems, empty if every plan is as expected
+    """
+    cursor = conn.cursor()
+    problems = []
+
+    for name, (query, forbidden) in KEY_QUERIES.items():
+        try:
+            plan = explain_query_plan(cursor, query)
+        except sqlite3.OperationalError as e:
+            print(f"  {name}: skipped ({e})")
+            continue
+
+        print(f"  {name}:")
+        for detail in plan:
+            print(f"    {detail}")
+
+        for detail in unexpected_plan_details(plan, forbidden):
+            problems.append(f"{name}: {detail}")
+
+    return problems
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Apply schema migrations to the enrichment database"
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Check the query plans of the key queries after migrating",
+    )
+
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        print(f"Error: Database file {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Connecting to {args.db}...")
+    conn = sqlite3.connect(args.db)
+
+    applied = apply_migrations(conn)
+    print(f"✓ Applied {applied} migrations")
+
+    if args.check:
+        print("\nChecking query plans...")
+        problems = check_query_plans(conn)
+        if problems:
+            for problem in problems:
+                print(f"Unexpected plan: {problem}", file=sys.stderr)
+            conn.close()
+            sys.exit(1)
+        print("✓ Query plans use indexes")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
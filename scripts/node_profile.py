@@ -0,0 +1,271 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = []
+# ///
+
+import sqlite3
+import sys
+from pathlib import Path
+
+from migrate import optimize_database, table_exists
+
+MONTHS = range(1, 13)
+CLIMATE_FIELDS = ("precipitation", "average_temp", "sunny_days")
+CLIMATE_COLUMNS = [f"{field}_{month}" for field in CLIMATE_FIELDS for month in MONTHS]
+
+# Tables whose writes are tracked: (changes table, changes column, row key)
+TRACKED_TABLES = {
+    "t_nodes": ("changed_nodes", "node_id", "id"),
+    "t_insee": ("changed_nodes", "node_id", "node_id"),
+    "t_weather_data": ("changed_nodes", "node_id", "node_id"),
+    "t_weather_vector": ("changed_nodes", "node_id", "node_id"),
+    "t_museum": ("changed_postal_codes", "postal_code", "postal_code"),
+}
+
+
+def create_node_profile_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the t_node_profile table and associated indexes.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    climate_columns = ",\n".join(
+        f"            {column} REAL" for column in CLIMATE_COLUMNS
+    )
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS t_node_profile (
+            node_id INTEGER PRIMARY KEY,
+            sncf_id TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            insee_code TEXT,
+            city_name TEXT,
+            department_code TEXT,
+            region_code TEXT,
+            population INTEGER,
+            museum_count INTEGER,
+{climate_columns},
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (node_id) REFERENCES t_nodes(id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_node_profile_dept ON t_node_profile(department_code)
+    """)
+
+
+def start_change_tracking(conn: sqlite3.Connection) -> None:
+    """
+    Record the nodes and postal codes written through this connection.
+
+    Installs temporary triggers on the tracked tables that exist, so call it
+    after the stage created its tables. The recorded changes are consumed by
+    refresh_tracked_profiles.
+
+    Args:
+        conn: SQLite database connection
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS changed_nodes (node_id INTEGER PRIMARY KEY)"
+    )
+    cursor.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS changed_postal_codes (postal_code TEXT PRIMARY KEY)"
+    )
+
+    for table, (changes, column, key) in TRACKED_TABLES.items():
+        if not table_exists(cursor, table):
+            continue
+        for event, row in (("INSERT", "new"), ("UPDATE", "new"), ("DELETE", "old")):
+            cursor.execute(f"""
+                CREATE TEMP TRIGGER IF NOT EXISTS track_{table}_{event.lower()}
+                AFTER {event} ON main.{table}
+                BEGIN
+                    INSERT OR IGNORE INTO {changes} ({column}) VALUES ({row}.{key});
+                END
+            """)
+
+
+def refresh_node_profiles(
+    conn: sqlite3.Connection, node_ids_query: str | None = None
+) -> int:
+    """
+    Recompute t_node_profile rows.
+
+    Args:
+        conn: SQLite database connection
+        node_ids_query: SQL query selecting the node ids to refresh, None to
+            rebuild every row
+
+    Returns:
+        Number of refreshed rows
+    """
+    cursor = conn.cursor()
+    create_node_profile_table(cursor)
+
+    # Read through the fan-out views when nodes are grouped into physical stations
+    grouped = table_exists(cursor, "t_physical_station")
+    insee_source = "v_node_insee" if grouped else "t_insee"
+    weather_source = "v_node_weather_data" if grouped else "t_weather_data"
+
+    cursor.execute("DROP TABLE IF EXISTS temp.profile_refresh")
+    cursor.execute("CREATE TEMP TABLE profile_refresh (node_id INTEGER PRIMARY KEY)")
+    cursor.execute(
+        f"INSERT OR IGNORE INTO temp.profile_refresh {node_ids_query or 'SELECT id FROM t_nodes'}"
+    )
+
+    if node_ids_query is None:
+        cursor.execute("DELETE FROM t_node_profile")
+    else:
+        cursor.execute("""
+            DELETE FROM t_node_profile
+            WHERE node_id IN (SELECT node_id FROM temp.profile_refresh)
+        """)
+
+    has_insee = table_exists(cursor, "t_insee")
+    has_weather = table_exists(cursor, "t_weather_data")
+    # Packed climate vectors (weather_data.py --storage packed), decoded by
+    # v_weather_vector_data and fanned out here to the stop point variants
+    if not has_weather and table_exists(cursor, "t_weather_vector"):
+        has_weather = True
+        weather_source = "v_weather_vector_data"
+        if grouped:
+            weather_source = """(
+                SELECT n.id AS node_id, w.month, w.precipitation, w.average_temp,
+                       w.sunny_days
+                FROM t_nodes n
+                JOIN t_physical_station p ON p.uic_code = n.uic_code
+                JOIN v_weather_vector_data w ON w.node_id = p.node_id
+            )"""
+    has_museum = table_exists(cursor, "t_museum")
+
+    insee_columns = (
+        "i.insee_code, i.city_name, i.department_code, i.region_code, i.population"
+        if has_insee
+        else "NULL, NULL, NULL, NULL, NULL"
+    )
+    museum_column = "m.museum_count" if has_insee and has_museum else "NULL"
+    climate_values = ", ".join(
+        f"w.{column}" if has_weather else "NULL" for column in CLIMATE_COLUMNS
+    )
+
+    joins = []
+    if has_insee:
+        joins.append(f"LEFT JOIN {insee_source} i ON i.node_id = n.id")
+    if has_insee and has_museum:
+        joins.append(
+            "LEFT JOIN t_museum m ON m.postal_code = json_extract(i.postal_codes, '$[0]')"
+        )
+    if has_weather:
+        pivot = ", ".join(
+            f"MAX(CASE WHEN month = {month} THEN {field} END) AS {field}_{month}"
+            for field in CLIMATE_FIELDS
+            for month in MONTHS
+        )
+        joins.append(f"""
+            LEFT JOIN (
+                SELECT node_id, {pivot}
+                FROM {weather_source}
+                WHERE node_id IN (SELECT node_id FROM temp.profile_refresh)
+                GROUP BY node_id
+            ) w ON w.node_id = n.id
+        """)
+
+    cursor.execute(f"""
+        INSERT INTO t_node_profile
+        (node_id, sncf_id, name, lat, lon, insee_code, city_name, department_code,
+         region_code, population, museum_count, {", ".join(CLIMATE_COLUMNS)})
+        SELECT n.id, n.sncf_id, n.name, n.lat, n.lon, {insee_columns},
+               {museum_column}, {climate_values}
+        FROM t_nodes n
+        {" ".join(joins)}
+        WHERE n.id IN (SELECT node_id FROM temp.profile_refresh)
+    """)
+    refreshed = cursor.rowcount
+
+    cursor.execute("DROP TABLE temp.profile_refresh")
+    conn.commit()
+
+    return refreshed
+
+
+def refresh_tracked_profiles(conn: sqlite3.Connection) -> int:
+    """
+    Refresh the t_node_profile rows affected by the writes recorded since
+    start_change_tracking, then clear the recorded changes.
+
+    A change to a canonical node refreshes every variant of its physical
+    station, and a change to a museum count refreshes the nodes of its postal
+    code. If t_node_profile does not exist yet, it is fully built.
+
+    Args:
+        conn: SQLite database connection
+
+    Returns:
+        Number of refreshed rows
+    """
+    cursor = conn.cursor()
+    conn.commit()
+
+    if not table_exists(cursor, "t_node_profile"):
+        refreshed = refresh_node_profiles(conn)
+    else:
+        queries = ["SELECT node_id FROM temp.changed_nodes"]
+        grouped = table_exists(cursor, "t_physical_station")
+        if grouped:
+            queries.append("""
+                SELECT n.id FROM t_nodes n
+                JOIN t_physical_station p ON p.uic_code = n.uic_code
+                WHERE p.node_id IN (SELECT node_id FROM temp.changed_nodes)
+            """)
+        if table_exists(cursor, "t_insee"):
+            queries.append(f"""
+                SELECT node_id FROM {"v_node_insee" if grouped else "t_insee"}
+                WHERE json_extract(postal_codes, '$[0]')
+                    IN (SELECT postal_code FROM temp.changed_postal_codes)
+            """)
+        refreshed = refresh_node_profiles(conn, " UNION ".join(queries))
+
+    cursor.execute("DELETE FROM temp.changed_nodes")
+    cursor.execute("DELETE FROM temp.changed_postal_codes")
+    conn.commit()
+
+    print(f"✓ Refreshed {refreshed} node profiles")
+    return refreshed
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Rebuild the denormalized t_node_profile table"
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        print(f"Error: Database file {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Connecting to {args.db}...")
+    conn = sqlite3.connect(args.db)
+
+    print("Rebuilding table t_node_profile...")
+    refreshed = refresh_node_profiles(conn)
+    optimize_database(conn)
+    conn.close()
+
+    print(f"✓ Built {refreshed} node profiles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = []
+# ///
+
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+from migrate import optimize_database, table_exists
+
+# Column weights of the bm25 ranking: station name, city name, postal codes
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+def create_node_search_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the t_node_search full-text index, one row per node (rowid = node id).
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS t_node_search USING fts5(
+            name,
+            city_name,
+            postal_codes,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+
+
+def node_search_rows_query(cursor: sqlite3.Cursor, condition: str) -> str:
+    """
+    Build the query inserting the t_node_search rows of some nodes.
+
+    City names and postal codes are read from the canonical node of each
+    physical station when nodes are grouped, like v_node_insee.
+
+    Args:
+        cursor: SQLite database cursor
+        condition: SQL condition on the t_nodes row n selecting the nodes
+
+    Returns:
+        INSERT statement
+    """
+    if not table_exists(cursor, "t_insee"):
+        return f"""
+            INSERT INTO t_node_search (rowid, name)
+            SELECT n.id, n.name FROM t_nodes n WHERE {condition}
+        """
+    if table_exists(cursor, "t_physical_station"):
+        joins = """
+            LEFT JOIN t_physical_station p ON p.uic_code = n.uic_code
+            LEFT JOIN t_insee i ON i.node_id = p.node_id
+        """
+    else:
+        joins = "LEFT JOIN t_insee i ON i.node_id = n.id"
+    return f"""
+        INSERT INTO t_node_search (rowid, name, city_name, postal_codes)
+        SELECT n.id, n.name, i.city_name,
+               (SELECT group_concat(value, ' ') FROM json_each(i.postal_codes))
+        FROM t_nodes n
+        {joins}
+        WHERE {condition}
+    """
+
+
+def create_node_search_triggers(cursor: sqlite3.Cursor) -> None:
+    """
+    (Re)create the triggers keeping t_node_search in sync with t_nodes and
+    t_insee.
+
+    The triggers depend on the tables present, so this is called again once
+    t_insee or t_physical_station are created.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    # Nodes served by an INSEE record: the node, and the variants of its
+    # physical station
+    if table_exists(cursor, "t_physical_station"):
+        insee_nodes = """
+            SELECT id FROM t_nodes
+            WHERE id IN ({node_ids}) OR uic_code IN (
+                SELECT uic_code FROM t_physical_station WHERE node_id IN ({node_ids})
+            )
+        """
+    else:
+        insee_nodes = "SELECT id FROM t_nodes WHERE id IN ({node_ids})"
+
+    triggers = {
+        "t_nodes_insert": ("AFTER INSERT ON t_nodes", None, "n.id = new.id"),
+        "t_nodes_update": (
+            "AFTER UPDATE OF name, uic_code ON t_nodes",
+            "old.id",
+            "n.id = new.id",
+        ),
+        "t_nodes_delete": ("AFTER DELETE ON t_nodes", "old.id", None),
+    }
+    if table_exists(cursor, "t_insee"):
+        for event, node_ids in (
+            ("insert", "new.node_id"),
+            ("update", "old.node_id, new.node_id"),
+            ("delete", "old.node_id"),
+        ):
+            affected = insee_nodes.format(node_ids=node_ids)
+            triggers[f"t_insee_{event}"] = (
+                f"AFTER {event.upper()} ON t_insee",
+                affected,
+                f"n.id IN ({affected})",
+            )
+
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'node_search_%'"
+    )
+    for (name,) in cursor.fetchall():
+        cursor.execute(f"DROP TRIGGER {name}")
+
+    for name, (event, deleted, inserted) in triggers.items():
+        statements = []
+        if deleted is not None:
+            statements.append(f"DELETE FROM t_node_search WHERE rowid IN ({deleted});")
+        if inserted is not None:
+            statements.append(node_search_rows_query(cursor, inserted) + ";")
+        cursor.execute(f"""
+            CREATE TRIGGER node_search_{name} {event}
+            BEGIN
+                {" ".join(statements)}
+            END
+        """)
+
+
+def create_node_search_index(conn: sqlite3.Connection, rebuild: bool = False) -> int:
+    """
+    Create the t_node_search index and its triggers, filling it if needed.
+
+    Args:
+        conn: SQLite database connection
+        rebuild: Rebuild every row, e.g. after node ids changed
+
+    Returns:
+        Number of indexed rows written
+    """
+    cursor = conn.cursor()
+    created = not table_exists(cursor, "t_node_search")
+    create_node_search_table(cursor)
+    create_node_search_triggers(cursor)
+
+    indexed = 0
+    if created or rebuild:
+        cursor.execute("DELETE FROM t_node_search")
+        cursor.execute(node_search_rows_query(cursor, "1"))
+        indexed = cursor.rowcount
+        cursor.execute("INSERT INTO t_node_search (t_node_search) VALUES ('optimize')")
+    conn.commit()
+
+    return indexed
+
+
+def search_query(text: str) -> str | None:
+    """
+    Turn free text into an FTS5 query: every word must match a prefix of a
+    station name, city name or postal code token.
+
+    Args:
+        text: Free text, e.g. "marseille st ch"
+
+    Returns:
+        FTS5 query, or None if the text has no word
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_nodes(
+    cursor: sqlite3.Cursor, text: str, limit: int = 20
+) -> list[tuple[int, str, str | None, float]]:
+    """
+    Find the nodes matching free text, accents and case ignored.
+
+    Args:
+        cursor: SQLite database cursor
+        text: Free text, e.g. "Orleans" or "13001"
+        limit: Maximum number of matches
+
+    Returns:
+        List of (node_id, name, city_name, rank), best matches first (bm25
+        rank, lower is better, station name weighing most)
+    """
+    query = search_query(text)
+    if query is None:
+        return []
+    cursor.execute(
+        f"""
+        SELECT rowid, name, city_name, bm25(t_node_search, {", ".join(map(str, SEARCH_WEIGHTS))}) AS rank
+        FROM t_node_search
+        WHERE t_node_search MATCH ?
+        ORDER BY rank
+        LIMIT ?
+        """,
+        (query, limit),
+    )
+    return cursor.fetchall()
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Search nodes by station name, city name or postal code"
+    )
+    parser.add_argument("text", nargs="?", help="Text to search")
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=20,
+        help="Maximum number of matches (default: 20)",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Rebuild the t_node_search index",
+    )
+
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        print(f"Error: Database file {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    conn = sqlite3.connect(args.db)
+    cursor = conn.cursor()
+
+    if args.rebuild or not table_exists(cursor, "t_node_search"):
+        print("Building table t_node_search...")
+        indexed = create_node_search_index(conn, rebuild=True)
+        optimize_database(conn)
+        print(f"✓ Indexed {indexed} nodes")
+
+    if args.text is not None:
+        for node_id, name, city_name, rank in search_nodes(
+            cursor, args.text, args.limit
+        ):
+            print(f"  {node_id}\t{name}\t{city_name or ''}\t{rank:.2f}")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def add_profile_arguments(parser) -> None:
+    """
+    Add the --profile and --profile-sample-interval options to a script parser.
+
+    Args:
+        parser: argparse.ArgumentParser of the script
+    """
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        metavar="DIR",
+        help="Write CPU profiles and allocation snapshots of each phase to DIR",
+    )
+    parser.add_argument(
+        "--profile-sample-interval",
+        type=float,
+        metavar="SECONDS",
+        help="Also sample the stacks of every thread at this interval (with --profile)",
+    )
+
+
+class StackSampler:
+    """
+    Periodically record the stacks of threads, in collapsed stack format.
+
+    The output ("frame;frame;frame count" per line) can be loaded in speedscope
+    or rendered with flamegraph.pl. Each stack is rooted at the name of its
+    thread, so that the worker threads of the providers (e.g. the
+    geo.api.gouv.fr lookups) are profiled next to the main thread. Unlike
+    cProfile, which only traces the thread enabling it, the overhead does not
+    grow with the number of calls, so it is suited to long hot loops.
+    """
+
+    def __init__(self, interval: float, thread_id: int | None = None):
+        """
+        Args:
+            interval: Sampling interval in seconds
+            thread_id: Thread to sample (default: every thread)
+        """
+        self.interval = interval
+        self.thread_id = thread_id
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self._thread.ident:
+                    continue
+                if self.thread_id is not None and thread_id != self.thread_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(
+                        f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})"
+                    )
+                    frame = frame.f_back
+                frames.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: Path) -> None:
+        """
+        Write the collected samples in collapsed stack format.
+
+        Args:
+            path: Output file path
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """
+    Profile the phases of a script run.
+
+    For each phase, writes to the output directory:
+    - <phase>.prof: cProfile dump, readable with pstats or snakeviz
+    - <phase>.summary.txt: top allocation sites from a tracemalloc snapshot and
+      top functions by cumulative time
+    - <phase>.stacks.txt: sampled stacks of every thread, when a sample
+      interval is set
+
+    A disabled profiler runs phases without any overhead.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path | None,
+        sample_interval: float | None = None,
+        top: int = 25,
+    ):
+        """
+        Args:
+            output_dir: Directory to write profiles to, None to disable profiling
+            sample_interval: Stack sampling interval in seconds, None to disable sampling
+            top: Number of functions and allocation sites in the summaries
+        """
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.top = top
+        if output_dir is not None:
+            output_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_args(cls, args) -> "Profiler":
+        """
+        Build a profiler from the options added by add_profile_arguments.
+
+        Args:
+            args: Parsed arguments
+
+        Returns:
+            Profiler, disabled if --profile was not given
+        """
+        return cls(args.profile, args.profile_sample_interval)
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Profile the enclosed block as one phase.
+
+        Args:
+            name: Phase name, used for output file names
+        """
+        if self.output_dir is None:
+            yield
+            return
+
+        sampler = None
+        if self.sample_interval:
+            sampler = StackSampler(self.sample_interval)
+            sampler.start()
+
+        tracemalloc.start()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if sampler is not None:
+                sampler.stop()
+
+            self._write(name, profile, snapshot, sampler)
+            print(
+                f"[profile] {name}: {elapsed:.2f}s, peak traced memory "
+                f"{peak / 1024 / 1024:.1f} MiB → {self.output_dir}",
+                file=sys.stderr,
+            )
+
+    def _write(
+        self,
+        name: str,
+        profile: cProfile.Profile,
+        snapshot: tracemalloc.Snapshot,
+        sampler: StackSampler | None,
+    ) -> None:
+        profile.dump_stats(self.output_dir / f"{name}.prof")
+
+        # Ignore allocations made by the profilers themselves
+        snapshot = snapshot.filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, cProfile.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]
+        )
+        with open(self.output_dir / f"{name}.summary.txt", "w", encoding="utf-8") as f:
+            f.write(
+                f"Top {self.top} allocation sites still alive at the end of {name}\n\n"
+            )
+            for stat in snapshot.statistics("lineno")[: self.top]:
+                f.write(f"{stat}\n")
+
+            stream = io.StringIO()
+            stats = pstats.Stats(profile, stream=stream)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+            f.write(f"\nTop {self.top} functions by cumulative time\n")
+            f.write(stream.getvalue())
+
+        if sampler is not None:
+            sampler.write(self.output_dir / f"{name}.stacks.txt")
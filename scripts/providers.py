@@ -0,0 +1,379 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = []
+# ///
+
+import sqlite3
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from http_fixtures import pace
+from ingest_nodes import parse_uic_code
+from migrate import table_exists
+
+# Country of a station from the first two digits of its UIC code (UIC country
+# codes), as ISO 3166 codes
+UIC_COUNTRIES = {
+    "70": "GB",
+    "71": "ES",
+    "80": "DE",
+    "81": "AT",
+    "82": "LU",
+    "83": "IT",
+    "84": "NL",
+    "85": "CH",
+    "87": "FR",
+    "88": "BE",
+}
+
+# Settings of the --provider option, and their parser
+PROVIDER_SETTINGS = {
+    "concurrency": int,
+    "rate": float,
+    "cache": int,
+}
+
+
+def node_country(uic_code: str | None) -> str | None:
+    """
+    Get the country of a station from its UIC code.
+
+    Args:
+        uic_code: UIC code, e.g. "87271007"
+
+    Returns:
+        ISO 3166 country code, e.g. "FR", or None if unknown
+    """
+    if uic_code is None or len(uic_code) != 8 or not uic_code.isdigit():
+        return None
+    return UIC_COUNTRIES.get(uic_code[:2])
+
+
+class RateLimiter:
+    """
+    Spaces the calls of a provider, across its threads, by a minimum interval.
+    """
+
+    def __init__(self, calls_per_second: float | None):
+        self.interval = 1 / calls_per_second if calls_per_second else 0
+        self.next_call = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_call)
+            self.next_call = start + self.interval
+        pace(start - now)
+
+
+class Provider:
+    """
+    Enrichment backend of a stage (e.g. "admin") for some countries, with its
+    own concurrency, rate limit and cache.
+
+    Per-node stages call the provider, which looks up coordinates; results are
+    cached by coordinates rounded to cache_precision decimals (None disables
+    the cache), failures are not cached. Bulk stages (e.g. "climate") call its
+    fetch hook once with the ids of every node it serves, see fetch_stage.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        stage: str,
+        countries: set[str],
+        lookup: Callable[[float, float], object] | None = None,
+        concurrency: int = 1,
+        calls_per_second: float | None = None,
+        cache_precision: int | None = None,
+        fetch: Callable[..., object] | None = None,
+    ):
+        self.name = name
+        self.stage = stage
+        self.countries = countries
+        self.lookup = lookup
+        self.fetch = fetch
+        self.concurrency = concurrency
+        self.cache_precision = cache_precision
+        self.limiter = RateLimiter(calls_per_second)
+        self.cache: dict[tuple[float, float], object] = {}
+        self.calls = 0
+        self.cache_hits = 0
+        self.lock = threading.Lock()
+
+    def configure(
+        self,
+        concurrency: int | None = None,
+        rate: float | None = None,
+        cache: int | None = None,
+    ) -> None:
+        """
+        Override the settings of the provider, e.g. from --provider.
+
+        Args:
+            concurrency: Maximum number of concurrent lookups
+            rate: Maximum number of lookups per second, 0 for no limit
+            cache: Decimals of the cached coordinates, negative to disable
+        """
+        if concurrency is not None:
+            self.concurrency = max(1, concurrency)
+        if rate is not None:
+            self.limiter = RateLimiter(rate)
+        if cache is not None:
+            self.cache_precision = cache if cache >= 0 else None
+
+    def __call__(self, lat: float, lon: float) -> object:
+        key = None
+        if self.cache_precision is not None:
+            key = (round(lat, self.cache_precision), round(lon, self.cache_precision))
+            with self.lock:
+                if key in self.cache:
+                    self.cache_hits += 1
+                    return self.cache[key]
+
+        self.limiter.wait()
+        with self.lock:
+            self.calls += 1
+        result = self.lookup(lat, lon)
+
+        # Lookups report failures as (None, error_message)
+        if key is not None and not isinstance(result, tuple):
+            with self.lock:
+                self.cache[key] = result
+        return result
+
+
+# Registered providers, by stage, in registration order
+_providers: dict[str, list[Provider]] = {}
+
+
+def register_provider(provider: Provider) -> Provider:
+    """
+    Register a provider of a stage, replacing a provider of the same name.
+
+    Args:
+        provider: Provider to register
+
+    Returns:
+        The provider
+    """
+    providers = _providers.setdefault(provider.stage, [])
+    providers[:] = [p for p in providers if p.name != provider.name]
+    providers.append(provider)
+    return provider
+
+
+def provider_for(stage: str, country: str | None) -> Provider | None:
+    """
+    Get the provider of a stage serving a country.
+
+    Args:
+        stage: Stage name, e.g. "admin"
+        country: ISO 3166 country code, None if unknown
+
+    Returns:
+        Provider, or None if no provider serves the country or it is unknown
+    """
+    if country is None:
+        return None
+    for provider in _providers.get(stage, []):
+        if country in provider.countries:
+            return provider
+    return None
+
+
+def run_stage(stage: str, nodes: Iterable[tuple]) -> Iterator[tuple[tuple, Future]]:
+    """
+    Look up nodes through the providers of a stage, each node dispatched by the
+    country of its UIC code. Every provider runs in its own thread pool, so
+    providers run in parallel, each within its concurrency and rate limit.
+
+    Args:
+        stage: Stage name, e.g. "admin"
+        nodes: Tuples of (node_id, uic_code, name, lat, lon)
+
+    Yields:
+        Tuples of (node, future of the lookup result) as the lookups complete;
+        the future of a node without provider raises LookupError
+    """
+    executors: dict[str, ThreadPoolExecutor] = {}
+    futures: dict[Future, tuple] = {}
+    try:
+        for node in nodes:
+            country = node_country(node[1])
+            provider = provider_for(stage, country)
+            if provider is None:
+                future = Future()
+                future.set_exception(
+                    LookupError(
+                        f"No {stage} provider for country {country or 'unknown'}"
+                    )
+                )
+            else:
+                if provider.name not in executors:
+                    executors[provider.name] = ThreadPoolExecutor(
+                        max_workers=provider.concurrency,
+                        thread_name_prefix=provider.name,
+                    )
+                future = executors[provider.name].submit(provider, node[3], node[4])
+            futures[future] = node
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield futures.pop(future), future
+    finally:
+        for executor in executors.values():
+            executor.shutdown(cancel_futures=True)
+
+
+def load_stage_nodes(cursor: sqlite3.Cursor) -> list[tuple[int, str | None]]:
+    """
+    Load the nodes dispatched to the providers of a bulk stage: the canonical
+    node of each physical station, or every node.
+
+    Args:
+        cursor: SQLite database cursor
+
+    Returns:
+        List of (node_id, uic_code)
+    """
+    if table_exists(cursor, "t_physical_station"):
+        cursor.execute("SELECT node_id, uic_code FROM t_physical_station")
+        return cursor.fetchall()
+    if not table_exists(cursor, "t_nodes"):
+        return []
+    cursor.execute("SELECT id, sncf_id FROM t_nodes")
+    return [(node_id, parse_uic_code(sncf_id)) for node_id, sncf_id in cursor]
+
+
+def fetch_stage(
+    stage: str, nodes: Iterable[tuple], **options
+) -> list[tuple[Provider, object]]:
+    """
+    Fetch a bulk stage: nodes are grouped by the provider serving the country
+    of their UIC code, and the fetch hook of each provider is called once with
+    the ids of its nodes. Every provider is fetched in its own thread, so
+    providers run in parallel; nodes of unknown country are not fetched.
+
+    Args:
+        stage: Stage name, e.g. "climate"
+        nodes: Tuples of (node_id, uic_code)
+        **options: Options of the fetch hooks, each hook ignoring the ones it
+            does not use
+
+    Returns:
+        List of (provider, result of its fetch hook)
+    """
+    groups: dict[str, tuple[Provider, set[int]]] = {}
+    unserved: dict[str | None, int] = {}
+    for node_id, uic_code in nodes:
+        country = node_country(uic_code)
+        provider = provider_for(stage, country)
+        if provider is None or provider.fetch is None:
+            unserved[country] = unserved.get(country, 0) + 1
+            continue
+        groups.setdefault(provider.name, (provider, set()))[1].add(node_id)
+
+    for country, count in unserved.items():
+        print(
+            f"Warning: no {stage} provider for {count} nodes of country {country or 'unknown'}",
+            file=sys.stderr,
+        )
+    if not groups:
+        return []
+
+    def fetch(provider: Provider, node_ids: set[int]) -> object:
+        print(f"Fetching {stage} of {len(node_ids)} nodes from {provider.name}...")
+        with provider.lock:
+            provider.calls += 1
+        return provider.fetch(node_ids, **options)
+
+    with ThreadPoolExecutor(
+        max_workers=len(groups), thread_name_prefix=f"{stage}-fetch"
+    ) as executor:
+        futures = [
+            (provider, executor.submit(fetch, provider, node_ids))
+            for provider, node_ids in groups.values()
+        ]
+        return [(provider, future.result()) for provider, future in futures]
+
+
+def print_provider_stats() -> None:
+    """
+    Print the calls and cache hits of each registered provider.
+    """
+    for stage, providers in sorted(_providers.items()):
+        for provider in providers:
+            print(
+                f"  {stage}/{provider.name} ({', '.join(sorted(provider.countries))}): "
+                f"{provider.calls} calls, {provider.cache_hits} cache hits"
+            )
+
+
+def parse_provider_option(value: str) -> tuple[str, dict]:
+    """
+    Parse a --provider option.
+
+    Args:
+        value: NAME:KEY=VALUE[,KEY=VALUE...] with KEY in concurrency, rate and
+            cache (e.g. "geo.api.gouv.fr:concurrency=8,rate=40")
+
+    Returns:
+        Tuple of (provider name, settings)
+
+    Raises:
+        ValueError: If the option is invalid
+    """
+    name, _, settings_text = value.rpartition(":")
+    settings = {}
+    for setting in settings_text.split(","):
+        key, _, setting_value = setting.partition("=")
+        if not name or key not in PROVIDER_SETTINGS:
+            raise ValueError(
+                f"Invalid provider option {value!r}, expected NAME:KEY=VALUE with KEY in {', '.join(PROVIDER_SETTINGS)}"
+            )
+        settings[key] = PROVIDER_SETTINGS[key](setting_value)
+    return name, settings
+
+
+def add_provider_arguments(parser) -> None:
+    """
+    Add the --provider option to a script parser.
+
+    Args:
+        parser: argparse.ArgumentParser of the script
+    """
+    parser.add_argument(
+        "--provider",
+        action="append",
+        default=[],
+        metavar="NAME:KEY=VALUE",
+        help="Override a provider setting: concurrency, rate (calls/s) or cache (decimals), e.g. geo.api.gouv.fr:concurrency=8 (repeatable)",
+    )
+
+
+def configure_providers_from_args(args) -> None:
+    """
+    Apply the --provider options to the registered providers.
+
+    Args:
+        args: Parsed arguments, with the options of add_provider_arguments
+    """
+    providers = {p.name: p for stage in _providers.values() for p in stage}
+    for value in args.provider:
+        try:
+            name, settings = parse_provider_option(value)
+            if name not in providers:
+                raise ValueError(
+                    f"Unknown provider {name!r}, expected one of {', '.join(sorted(providers))}"
+                )
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        providers[name].configure(**settings)
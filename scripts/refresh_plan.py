@@ -0,0 +1,598 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "httpx>=0.28.1",
+#     "python-dotenv>=1.0.0",
+# ]
+# ///
+
+import os
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from http_fixtures import (
+    add_http_fixture_arguments,
+    configure_http_fixtures_from_args,
+    print_http_stats,
+)
+from ingest_museums import create_museum_table, fetch_poi_data, insert_museum_data
+from ingest_weather_stations import (
+    create_weather_station_table,
+    fetch_weather_stations,
+    insert_weather_stations,
+)
+from insee_code import enrich_cities_from_db
+from migrate import optimize_database, table_exists
+from node_profile import refresh_tracked_profiles, start_change_tracking
+from providers import add_provider_arguments, configure_providers_from_args
+from shadow_db import (
+    add_shadow_arguments,
+    publish_shadow_from_args,
+    shadow_db_from_args,
+)
+from weather_data import (
+    WEATHER_YEARS,
+    compute_all_monthly_averages,
+    fetch_weather_data_for_nodes,
+    insert_weather_data,
+    select_weather_stations,
+    weather_storage,
+)
+
+# Enrichment stages, in dependency order: the weather stations are fetched for
+# the departments of the communes, and the climate of a node needs both
+STAGES = ("communes", "stations", "museums", "climate")
+
+# Default time-to-live of the rows of each stage, in days
+DEFAULT_TTL_DAYS = {"communes": 365, "stations": 30, "museums": 30, "climate": 365}
+TTL_UNITS = {"d": 1, "w": 7, "m": 30, "y": 365}
+
+# Delay between two API calls of each stage, as paced by the scripts: 50 calls/s
+# for geo.api.gouv.fr, 100 calls/min for Météo-France
+CALL_SECONDS = {
+    "communes": 0.02,
+    "stations": 60 / 100,
+    "museums": 0,
+    "climate": 60 / 100,
+}
+
+
+def parse_ttl(value: str) -> tuple[str, int]:
+    """
+    Parse a --ttl option.
+
+    Args:
+        value: STAGE=DURATION, the duration in days or with a d/w/m/y unit
+            (e.g. "communes=1y", "stations=30d")
+
+    Returns:
+        Tuple of (stage, days)
+
+    Raises:
+        ValueError: If the stage or duration is invalid
+    """
+    stage, _, duration = value.partition("=")
+    match = re.fullmatch(r"(\d+)([dwmy]?)", duration.strip())
+    if stage not in STAGES or match is None:
+        raise ValueError(
+            f"Invalid TTL {value!r}, expected STAGE=DURATION with STAGE in {', '.join(STAGES)}"
+        )
+    return stage, int(match.group(1)) * TTL_UNITS[match.group(2) or "d"]
+
+
+def canonical_node_ids_query(cursor: sqlite3.Cursor) -> str:
+    """
+    Get the query selecting the nodes that are enriched: the canonical node of
+    each physical station, or every node.
+
+    Args:
+        cursor: SQLite database cursor
+
+    Returns:
+        SQL query selecting node ids
+    """
+    if table_exists(cursor, "t_physical_station"):
+        return "SELECT node_id FROM t_physical_station"
+    return "SELECT id AS node_id FROM t_nodes"
+
+
+def stale_commune_nodes(cursor: sqlite3.Cursor, ttl_days: int) -> list[int]:
+    """
+    Get the nodes without INSEE data, with a failed lookup, or with data older
+    than the TTL.
+
+    Args:
+        cursor: SQLite database cursor
+        ttl_days: Time-to-live in days
+
+    Returns:
+        Sorted node ids
+    """
+    nodes = canonical_node_ids_query(cursor)
+    if not table_exists(cursor, "t_insee"):
+        cursor.execute(f"{nodes} ORDER BY 1")
+        return [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        f"""
+        SELECT c.node_id
+        FROM ({nodes}) c
+        LEFT JOIN t_insee i ON i.node_id = c.node_id
+        WHERE i.node_id IS NULL
+           OR i.error_message IS NOT NULL
+           OR i.created_at < datetime('now', ?)
+        ORDER BY c.node_id
+        """,
+        (f"-{ttl_days} days",),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def stale_station_departments(cursor: sqlite3.Cursor, ttl_days: int) -> list[str]:
+    """
+    Get the departments of the communes without weather stations, or whose
+    stations are older than the TTL.
+
+    Args:
+        cursor: SQLite database cursor
+        ttl_days: Time-to-live in days
+
+    Returns:
+        Sorted department codes
+    """
+    if not table_exists(cursor, "t_insee"):
+        return []
+    if not table_exists(cursor, "t_weather_station"):
+        cursor.execute("""
+            SELECT DISTINCT department_code FROM t_insee
+            WHERE department_code IS NOT NULL
+            ORDER BY department_code
+        """)
+        return [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        """
+        SELECT d.department_code
+        FROM (
+            SELECT DISTINCT department_code FROM t_insee
+            WHERE department_code IS NOT NULL
+        ) d
+        LEFT JOIN (
+            SELECT department_code, MIN(created_at) AS created_at
+            FROM t_weather_station
+            GROUP BY department_code
+        ) s ON s.department_code = d.department_code
+        WHERE s.created_at IS NULL OR s.created_at < datetime('now', ?)
+        ORDER BY d.department_code
+        """,
+        (f"-{ttl_days} days",),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def museums_stale(cursor: sqlite3.Cursor, ttl_days: int) -> bool:
+    """
+    Check whether the museum counts are missing or older than the TTL.
+
+    Args:
+        cursor: SQLite database cursor
+        ttl_days: Time-to-live in days
+
+    Returns:
+        True if the museum counts must be fetched
+    """
+    if not table_exists(cursor, "t_museum"):
+        return True
+    cursor.execute(
+        "SELECT MIN(created_at) IS NULL OR MIN(created_at) < datetime('now', ?) FROM t_museum",
+        (f"-{ttl_days} days",),
+    )
+    return bool(cursor.fetchone()[0])
+
+
+def stale_climate_nodes(cursor: sqlite3.Cursor, ttl_days: int) -> list[int]:
+    """
+    Get the nodes with a department but without weather data, or with weather
+    data older than the TTL, in row or packed storage.
+
+    Args:
+        cursor: SQLite database cursor
+        ttl_days: Time-to-live in days
+
+    Returns:
+        Sorted node ids
+    """
+    if not table_exists(cursor, "t_insee"):
+        return []
+    sources = [
+        f"SELECT node_id, created_at FROM {table}"
+        for table in ("t_weather_data", "t_weather_vector")
+        if table_exists(cursor, table)
+    ]
+    weather = (
+        f"SELECT node_id, MIN(created_at) AS created_at FROM ({' UNION ALL '.join(sources)}) GROUP BY node_id"
+        if sources
+        else "SELECT NULL AS node_id, NULL AS created_at"
+    )
+    cursor.execute(
+        f"""
+        SELECT c.node_id
+        FROM ({canonical_node_ids_query(cursor)}) c
+        JOIN t_insee i ON i.node_id = c.node_id AND i.department_code IS NOT NULL
+        LEFT JOIN ({weather}) w ON w.node_id = c.node_id
+        WHERE w.created_at IS NULL OR w.created_at < datetime('now', ?)
+        ORDER BY c.node_id
+        """,
+        (f"-{ttl_days} days",),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def climate_station_years(
+    db_path: Path, node_ids: list[int], cover_distance_km: float | None = None
+) -> set[tuple[str, int]]:
+    """
+    Get the station-years to order for the climate of some nodes.
+
+    Args:
+        db_path: Path to SQLite database
+        node_ids: Nodes to refresh
+        cover_distance_km: Station selection of weather_data.py --cover-distance
+
+    Returns:
+        Set of (station_id, year)
+    """
+    conn = sqlite3.connect(db_path)
+    has_stations = table_exists(conn.cursor(), "t_weather_station")
+    conn.close()
+    if not node_ids or not has_stations:
+        return set()
+    node_to_station = select_weather_stations(
+        db_path, cover_distance_km, node_ids=set(node_ids)
+    )
+    return {
+        (station_id, year)
+        for _, station_id, _ in node_to_station.values()
+        for year in WEATHER_YEARS
+    }
+
+
+def expire_weather_orders(
+    conn: sqlite3.Connection, station_years: set[tuple[str, int]], ttl_days: int
+) -> int:
+    """
+    Delete the delivered orders of the ledger older than the TTL, so that their
+    data is ordered again.
+
+    Args:
+        conn: SQLite database connection
+        station_years: Station-years to refresh
+        ttl_days: Time-to-live in days
+
+    Returns:
+        Number of deleted orders
+    """
+    cursor = conn.cursor()
+    if not table_exists(cursor, "t_weather_command"):
+        return 0
+    cursor.executemany(
+        """
+        DELETE FROM t_weather_command
+        WHERE station_id = ? AND year = ? AND product = 'mensuelle'
+          AND status = 'done' AND submitted_at < datetime('now', ?)
+        """,
+        [(station_id, year, f"-{ttl_days} days") for station_id, year in station_years],
+    )
+    expired = cursor.rowcount
+    conn.commit()
+    return expired
+
+
+def live_weather_orders(
+    cursor: sqlite3.Cursor, station_years: set[tuple[str, int]], ttl_days: int
+) -> int:
+    """
+    Count the station-years whose order in the ledger is pending, or delivered
+    within the TTL, and will not be placed again.
+
+    Args:
+        cursor: SQLite database cursor
+        station_years: Station-years to refresh
+        ttl_days: Time-to-live in days
+
+    Returns:
+        Number of station-years
+    """
+    if not table_exists(cursor, "t_weather_command"):
+        return 0
+    cursor.execute(
+        """
+        SELECT station_id, year FROM t_weather_command
+        WHERE product = 'mensuelle'
+          AND (status = 'pending' OR (status = 'done' AND submitted_at >= datetime('now', ?)))
+        """,
+        (f"-{ttl_days} days",),
+    )
+    return len(station_years & set(cursor.fetchall()))
+
+
+def plan_stage(
+    db_path: Path,
+    stage: str,
+    ttl_days: dict[str, int],
+    cover_distance_km: float | None = None,
+) -> tuple[list, int]:
+    """
+    Compute the stale or missing work of a stage and its API calls.
+
+    The plan reflects the current database: the climate of nodes whose
+    communes are not fetched yet only appears once they are.
+
+    Args:
+        db_path: Path to SQLite database
+        stage: One of STAGES
+        ttl_days: Time-to-live of each stage in days
+        cover_distance_km: Station selection of weather_data.py --cover-distance
+
+    Returns:
+        Tuple of (keys, api_calls): node ids for communes and climate,
+        department codes for stations, [None] for museums
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    ttl = ttl_days[stage]
+
+    if stage == "communes":
+        keys = stale_commune_nodes(cursor, ttl)
+        calls = len(keys)
+    elif stage == "stations":
+        keys = stale_station_departments(cursor, ttl)
+        calls = len(keys)
+    elif stage == "museums":
+        keys = [None] if museums_stale(cursor, ttl) else []
+        calls = len(keys)
+    else:
+        keys = stale_climate_nodes(cursor, ttl)
+        # Each station-year is one order and one download, unless its order
+        # is pending or still fresh
+        station_years = climate_station_years(db_path, keys, cover_distance_km)
+        ordered = live_weather_orders(cursor, station_years, ttl)
+        calls = 2 * (len(station_years) - ordered) + ordered
+
+    conn.close()
+    return keys, calls
+
+
+def print_stage_plan(stage: str, keys: list, calls: int) -> float:
+    """
+    Print the work, API calls and minimum duration of a stage.
+
+    Args:
+        stage: One of STAGES
+        keys: Stale or missing keys returned by plan_stage
+        calls: API calls returned by plan_stage
+
+    Returns:
+        Minimum duration in seconds, under the rate limit of the provider
+    """
+    units = {
+        "communes": "nodes",
+        "stations": "departments",
+        "museums": "datasets",
+        "climate": "nodes",
+    }
+    seconds = calls * CALL_SECONDS[stage]
+    print(
+        f"  {stage:<10} {len(keys):>7} {units[stage]:<12} "
+        f"{calls:>7} API calls  ~{format_duration(seconds)}"
+    )
+    return seconds
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Format a duration for humans.
+
+    Args:
+        seconds: Duration in seconds
+
+    Returns:
+        Duration, e.g. "42s", "3m20s", "1h05m"
+    """
+    seconds = round(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+def refresh_stations(db_path: Path, api_key: str, departments: list[str]) -> None:
+    """
+    Fetch the weather stations of some departments.
+
+    Args:
+        db_path: Path to SQLite database
+        api_key: Meteo France API key
+        departments: Department codes
+    """
+    stations = fetch_weather_stations(api_key, departments)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_weather_station_table(cursor)
+    inserted = insert_weather_stations(cursor, stations)
+    conn.commit()
+    optimize_database(conn)
+    conn.close()
+    print(f"✓ Inserted {inserted} weather stations")
+
+
+def refresh_museums(db_path: Path) -> None:
+    """
+    Fetch the museum counts of every postal code of the countries of the
+    nodes.
+
+    Args:
+        db_path: Path to SQLite database
+    """
+    museum_data = fetch_poi_data(db_path)
+    if not museum_data:
+        return
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_museum_table(cursor)
+    start_change_tracking(conn)
+    inserted = insert_museum_data(cursor, museum_data)
+    conn.commit()
+    refresh_tracked_profiles(conn)
+    conn.close()
+    print(f"✓ Inserted {inserted} postal code records with museum counts")
+
+
+def refresh_climate(
+    db_path: Path,
+    api_key: str,
+    node_ids: list[int],
+    ttl_days: int,
+    cover_distance_km: float | None = None,
+) -> None:
+    """
+    Fetch the climate of some nodes, ordering again the expired station-years.
+
+    Args:
+        db_path: Path to SQLite database
+        api_key: Meteo France API key
+        node_ids: Nodes to refresh
+        ttl_days: Time-to-live of the delivered orders in days
+        cover_distance_km: Station selection of weather_data.py --cover-distance
+    """
+    conn = sqlite3.connect(db_path)
+    expired = expire_weather_orders(
+        conn, climate_station_years(db_path, node_ids, cover_distance_km), ttl_days
+    )
+    conn.close()
+    if expired:
+        print(f"Ordering again {expired} expired station-years")
+
+    node_to_csv_by_year, node_to_station = fetch_weather_data_for_nodes(
+        db_path, api_key, cover_distance_km, node_ids=set(node_ids)
+    )
+    node_to_monthly_averages = compute_all_monthly_averages(node_to_csv_by_year)
+    insert_weather_data(
+        db_path, node_to_monthly_averages, node_to_station, weather_storage(db_path)
+    )
+
+
+def main() -> None:
+    import argparse
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Refresh only the missing or stale enrichment data, stage by stage"
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+    parser.add_argument(
+        "--ttl",
+        action="append",
+        default=[],
+        metavar="STAGE=DURATION",
+        help="Time-to-live of a stage, in days or with a d/w/m/y unit, can be repeated "
+        f"(default: {', '.join(f'{stage}={days}d' for stage, days in DEFAULT_TTL_DAYS.items())})",
+    )
+    parser.add_argument(
+        "--stage",
+        action="append",
+        choices=STAGES,
+        help="Only refresh this stage, can be repeated (default: every stage)",
+    )
+    parser.add_argument(
+        "--cover-distance",
+        type=float,
+        metavar="KM",
+        help="Station selection of weather_data.py --cover-distance",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only print the plan",
+    )
+    add_provider_arguments(parser)
+    add_shadow_arguments(parser)
+    add_http_fixture_arguments(parser)
+
+    args = parser.parse_args()
+    configure_http_fixtures_from_args(args)
+    configure_providers_from_args(args)
+
+    if not args.db.exists():
+        print(f"Error: Database file {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    ttl_days = dict(DEFAULT_TTL_DAYS)
+    for value in args.ttl:
+        try:
+            stage, days = parse_ttl(value)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        ttl_days[stage] = days
+    stages = [stage for stage in STAGES if args.stage is None or stage in args.stage]
+
+    print("Refresh plan:")
+    total_calls = 0
+    total_seconds = 0.0
+    for stage in stages:
+        keys, calls = plan_stage(args.db, stage, ttl_days, args.cover_distance)
+        total_seconds += print_stage_plan(stage, keys, calls)
+        total_calls += calls
+    print(
+        f"  {'total':<10} {'':>20} {total_calls:>7} API calls  ~{format_duration(total_seconds)}"
+    )
+    if args.dry_run:
+        return
+
+    db_path = shadow_db_from_args(args, args.db)
+
+    api_token = os.getenv("METEO_FRANCE_API_KEY")
+
+    # Each stage is planned again before it runs, to include the rows written
+    # by the previous stages
+    for stage in stages:
+        keys, calls = plan_stage(db_path, stage, ttl_days, args.cover_distance)
+        if not keys:
+            print(f"\n✓ {stage}: up to date")
+            continue
+        print(f"\nRefreshing {stage}: {len(keys)} stale or missing, {calls} API calls")
+
+        if stage == "communes":
+            enrich_cities_from_db(db_path, node_ids=set(keys))
+        elif stage == "museums":
+            refresh_museums(db_path)
+        elif not api_token:
+            print(
+                f"Warning: skipping {stage}, set METEO_FRANCE_API_KEY in .env file",
+                file=sys.stderr,
+            )
+        elif stage == "stations":
+            refresh_stations(db_path, api_token, keys)
+        else:
+            refresh_climate(
+                db_path, api_token, keys, ttl_days["climate"], args.cover_distance
+            )
+
+    publish_shadow_from_args(args)
+
+    print("\nHTTP latency:")
+    print_http_stats()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = []
+# ///
+
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+from migrate import table_exists
+
+# Tables whose count a run must not decrease, with the counted expression:
+# the scripts only add or replace rows. t_insee is counted by node, since
+# migration 1 collapses its duplicate rows. t_physical_station and
+# t_node_profile are left out: the scripts rebuild them from t_nodes, and
+# regrouping the stop points legitimately changes their row count
+CHECKED_TABLES = {
+    "t_nodes": "COUNT(*)",
+    "t_insee": "COUNT(DISTINCT node_id)",
+    "t_weather_station": "COUNT(*)",
+    "t_weather_data": "COUNT(*)",
+    "t_weather_vector": "COUNT(*)",
+    "t_museum": "COUNT(*)",
+}
+
+
+def shadow_db_path(db_path: Path) -> Path:
+    """
+    Get the path of the shadow copy of a database.
+
+    Args:
+        db_path: Path to the live database
+
+    Returns:
+        Path next to the live database, e.g. nodes.shadow.db
+    """
+    return db_path.with_name(f"{db_path.stem}.shadow{db_path.suffix}")
+
+
+def live_db_stamp(db_path: Path) -> str:
+    """
+    Get a stamp of the live database file, changed by any write to it.
+
+    Args:
+        db_path: Path to the live database
+
+    Returns:
+        Modification time and size
+    """
+    stat = db_path.stat()
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def prepare_shadow_db(db_path: Path, shadow_path: Path) -> None:
+    """
+    Seed the shadow database with a copy of the live database, using the
+    online backup API so that live readers and writers are not blocked.
+
+    A shadow left by an interrupted run is resumed if the live database did not
+    change since it was seeded, so that the orders it recorded are not lost.
+
+    Args:
+        db_path: Path to the live database
+        shadow_path: Path to the shadow database
+
+    Raises:
+        RuntimeError: If the live database uses WAL, or changed since an
+            existing shadow was seeded
+    """
+    if Path(f"{db_path}-wal").exists():
+        raise RuntimeError(
+            f"{db_path} is in WAL mode, its WAL file would be applied to the published copy"
+        )
+
+    if shadow_path.exists():
+        shadow = sqlite3.connect(shadow_path)
+        cursor = shadow.cursor()
+        stamp = None
+        if table_exists(cursor, "t_shadow"):
+            cursor.execute("SELECT live_stamp FROM t_shadow")
+            stamp = cursor.fetchone()[0]
+        shadow.close()
+        if stamp != live_db_stamp(db_path):
+            raise RuntimeError(
+                f"{db_path} changed since {shadow_path} was seeded, delete the shadow to start over"
+            )
+        print(f"Resuming shadow database {shadow_path}...")
+        return
+
+    print(f"Seeding shadow database {shadow_path} from {db_path}...")
+    stamp = live_db_stamp(db_path)
+    source = sqlite3.connect(db_path)
+    shadow = sqlite3.connect(shadow_path)
+    source.backup(shadow)
+    source.close()
+
+    shadow.execute("PRAGMA journal_mode = DELETE")
+    shadow.execute("CREATE TABLE t_shadow (live_stamp TEXT NOT NULL)")
+    shadow.execute("INSERT INTO t_shadow (live_stamp) VALUES (?)", (stamp,))
+    shadow.commit()
+    shadow.close()
+
+
+def count_rows(cursor: sqlite3.Cursor) -> dict[str, int]:
+    """
+    Count the rows of the checked tables, or the nodes for t_insee.
+
+    Args:
+        cursor: SQLite database cursor
+
+    Returns:
+        Dictionary mapping table to count, for the existing tables
+    """
+    counts = {}
+    for table, expression in CHECKED_TABLES.items():
+        if table_exists(cursor, table):
+            cursor.execute(f"SELECT {expression} FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+    return counts
+
+
+def check_shadow_db(db_path: Path, shadow_path: Path) -> list[str]:
+    """
+    Check the shadow database before publishing it.
+
+    Args:
+        db_path: Path to the live database
+        shadow_path: Path to the shadow database
+
+    Returns:
+        List of problems, empty if the shadow can be published
+    """
+    problems = []
+
+    if not shadow_path.exists():
+        return [f"{shadow_path} does not exist"]
+    if not db_path.exists():
+        return [f"{db_path} does not exist"]
+
+    live = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    live_counts = count_rows(live.cursor())
+    live.close()
+
+    shadow = sqlite3.connect(shadow_path)
+    cursor = shadow.cursor()
+
+    cursor.execute("PRAGMA quick_check")
+    result = [row[0] for row in cursor.fetchall()]
+    if result != ["ok"]:
+        problems.append(f"quick_check failed: {'; '.join(result[:5])}")
+
+    if not table_exists(cursor, "t_shadow"):
+        problems.append("t_shadow is missing, not a shadow database")
+    else:
+        cursor.execute("SELECT live_stamp FROM t_shadow")
+        if cursor.fetchone()[0] != live_db_stamp(db_path):
+            problems.append(f"{db_path} changed since the shadow was seeded")
+
+    shadow_counts = count_rows(cursor)
+    for table, live_count in live_counts.items():
+        shadow_count = shadow_counts.get(table)
+        if shadow_count is None:
+            problems.append(f"{table} is missing")
+        elif shadow_count < live_count:
+            problems.append(f"{table} lost rows: {live_count} → {shadow_count}")
+
+    if table_exists(cursor, "t_weather_data"):
+        cursor.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT node_id FROM t_weather_data
+                GROUP BY node_id
+                HAVING COUNT(*) > 12 OR MIN(month) < 1 OR MAX(month) > 12
+            )
+        """)
+        invalid = cursor.fetchone()[0]
+        if invalid:
+            problems.append(f"{invalid} nodes have invalid months in t_weather_data")
+
+    for table in ("t_insee", "t_weather_data", "t_weather_vector"):
+        if table_exists(cursor, table):
+            cursor.execute(f"""
+                SELECT COUNT(DISTINCT node_id) FROM {table}
+                WHERE node_id NOT IN (SELECT id FROM t_nodes)
+            """)
+            orphans = cursor.fetchone()[0]
+            if orphans:
+                problems.append(f"{table} has rows of {orphans} unknown nodes")
+
+    shadow.close()
+    return problems
+
+
+def publish_shadow_db(db_path: Path, shadow_path: Path) -> None:
+    """
+    Replace the live database with the shadow database, atomically.
+
+    Readers opening the database after the rename see the new dataset, readers
+    with an open connection keep reading the old one until they reconnect.
+
+    Args:
+        db_path: Path to the live database
+        shadow_path: Path to the shadow database
+    """
+    shadow = sqlite3.connect(shadow_path)
+    shadow.execute("DROP TABLE t_shadow")
+    shadow.commit()
+    shadow.close()
+
+    # Make the shadow durable before the rename, and the rename after it
+    fd = os.open(shadow_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(shadow_path, db_path)
+    fd = os.open(db_path.parent, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def add_shadow_arguments(parser) -> None:
+    """
+    Add the --shadow option to a script parser.
+
+    Args:
+        parser: argparse.ArgumentParser of the script
+    """
+    parser.add_argument(
+        "--shadow",
+        action="store_true",
+        help="Write to a shadow copy of --db, published atomically once checked",
+    )
+
+
+def shadow_db_from_args(args, db_path: Path) -> Path:
+    """
+    Get the database a script should write to, seeding the shadow if needed.
+
+    Args:
+        args: Parsed arguments, with the options of add_shadow_arguments
+        db_path: Database the script would write to without --shadow
+
+    Returns:
+        The shadow database path with --shadow, db_path otherwise
+    """
+    if not args.shadow:
+        return db_path
+    if getattr(args, "shard", None) is not None:
+        print(
+            "Error: --shadow is not needed with --shard, shards are already separate databases",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    try:
+        prepare_shadow_db(db_path, shadow_db_path(db_path))
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    return shadow_db_path(db_path)
+
+
+def publish_shadow_from_args(args) -> None:
+    """
+    Check and publish the shadow database of a run with --shadow.
+
+    The shadow is kept if a check fails, and the script exits with an error.
+
+    Args:
+        args: Parsed arguments, with the options of add_shadow_arguments and --db
+    """
+    if not args.shadow:
+        return
+
+    shadow_path = shadow_db_path(args.db)
+    print(f"\nChecking shadow database {shadow_path}...")
+    problems = check_shadow_db(args.db, shadow_path)
+    if problems:
+        for problem in problems:
+            print(f"  ✗ {problem}", file=sys.stderr)
+        print(
+            f"Error: {shadow_path} not published, {args.db} is unchanged",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    publish_shadow_db(args.db, shadow_path)
+    print(f"✓ Published {shadow_path} as {args.db}")
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Check and publish the shadow database left by a run with --shadow"
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only check the shadow database, without publishing it",
+    )
+
+    args = parser.parse_args()
+
+    shadow_path = shadow_db_path(args.db)
+    problems = check_shadow_db(args.db, shadow_path)
+    if problems:
+        for problem in problems:
+            print(f"  ✗ {problem}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✓ {shadow_path} passes every check")
+
+    if not args.check:
+        publish_shadow_db(args.db, shadow_path)
+        print(f"✓ Published {shadow_path} as {args.db}")
+
+
+if __name__ == "__main__":
+    main()
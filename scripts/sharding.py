@@ -0,0 +1,391 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = []
+# ///
+
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+from migrate import optimize_database, table_exists
+from node_profile import refresh_tracked_profiles, start_change_tracking
+
+# Tables written by sharded stages: key columns, compared value columns and
+# row preference. Tables keyed by node only take the rows of the shard's nodes,
+# and two shards writing different values conflict. Tables with a preference
+# (an ORDER BY expression) take every row, the preferred row of the shards and
+# the main database winning without conflict.
+SHARDED_TABLES = {
+    "t_insee": (
+        ("node_id",),
+        (
+            "insee_code",
+            "city_name",
+            "department_code",
+            "region_code",
+            "population",
+            "postal_codes",
+            "error_message",
+        ),
+        None,
+    ),
+    "t_weather_data": (
+        ("node_id", "month"),
+        ("weather_station_id", "precipitation", "average_temp", "sunny_days"),
+        None,
+    ),
+    "t_weather_vector": (("node_id",), ("weather_station_id", "climate"), None),
+    # Météo-France orders, keyed by station-year: shards sharing a station
+    # order it twice, the delivered then most recent order wins
+    "t_weather_command": (
+        ("station_id", "year", "product"),
+        ("command_id", "submitted_at", "status", "attempts", "csv_data"),
+        "status = 'done' DESC, submitted_at DESC",
+    ),
+}
+
+
+def parse_shard_spec(spec: str) -> tuple[str, list]:
+    """
+    Parse a shard specification.
+
+    Two kinds of shards are supported:
+    - "nodes:1-5000,8000-9000": node id ranges (inclusive)
+    - "departments:13,75,69": department codes, from t_insee
+
+    Args:
+        spec: Shard specification
+
+    Returns:
+        Tuple of (kind, values): "nodes" and a list of (first, last) ranges, or
+        "departments" and a list of department codes
+
+    Raises:
+        ValueError: If the specification is malformed
+    """
+    kind, _, values = spec.partition(":")
+    if not values:
+        raise ValueError(f"Invalid shard specification {spec!r}")
+
+    if kind == "nodes":
+        ranges = []
+        for value in values.split(","):
+            first, _, last = value.partition("-")
+            ranges.append((int(first), int(last or first)))
+        return kind, ranges
+    if kind == "departments":
+        return kind, values.split(",")
+
+    raise ValueError(f"Unknown shard kind {kind!r}, expected nodes or departments")
+
+
+def shard_node_ids_query(spec: str, schema: str = "main") -> tuple[str, list]:
+    """
+    Build the query selecting the node ids of a shard.
+
+    Args:
+        spec: Shard specification
+        schema: Database schema to read from (e.g. an attached shard)
+
+    Returns:
+        Tuple of (SQL query, parameters)
+    """
+    kind, values = parse_shard_spec(spec)
+    if kind == "nodes":
+        # Ranges are bound as one JSON array, whatever their number
+        return (
+            f"""
+            SELECT n.id FROM json_each(?) r
+            JOIN {schema}.t_nodes n
+                ON n.id BETWEEN json_extract(r.value, '$[0]') AND json_extract(r.value, '$[1]')
+            """,
+            [json.dumps(values)],
+        )
+    placeholders = ",".join("?" * len(values))
+    return (
+        f"SELECT node_id FROM {schema}.t_insee WHERE department_code IN ({placeholders})",
+        values,
+    )
+
+
+def shard_node_ids(cursor: sqlite3.Cursor, spec: str) -> set[int]:
+    """
+    Get the node ids of a shard.
+
+    Args:
+        cursor: SQLite database cursor
+        spec: Shard specification
+
+    Returns:
+        Set of node ids
+    """
+    kind, _ = parse_shard_spec(spec)
+    if kind == "departments" and not table_exists(cursor, "t_insee"):
+        raise ValueError("Department shards require t_insee, run insee_code.py first")
+    query, params = shard_node_ids_query(spec)
+    cursor.execute(query, params)
+    return {row[0] for row in cursor.fetchall()}
+
+
+def prepare_shard_db(db_path: Path, shard_db_path: Path, spec: str) -> None:
+    """
+    Create a shard database as a copy of the main database, if it does not exist.
+
+    The copy is self-contained, so a shard can run on another machine. The
+    shard specification is recorded in t_shard for the merge step.
+
+    Args:
+        db_path: Path to the main database
+        shard_db_path: Path to the shard database
+        spec: Shard specification
+    """
+    if shard_db_path.exists():
+        return
+
+    print(f"Creating shard database {shard_db_path} from {db_path}...")
+    source = sqlite3.connect(db_path)
+    shard = sqlite3.connect(shard_db_path)
+    source.backup(shard)
+    source.close()
+
+    shard.execute("CREATE TABLE t_shard (spec TEXT NOT NULL)")
+    shard.execute("INSERT INTO t_shard (spec) VALUES (?)", (spec,))
+    shard.commit()
+    shard.close()
+
+
+def add_shard_arguments(parser) -> None:
+    """
+    Add the --shard and --shard-db options to a script parser.
+
+    Args:
+        parser: argparse.ArgumentParser of the script
+    """
+    parser.add_argument(
+        "--shard",
+        metavar="SPEC",
+        help="Only process a shard of the nodes, e.g. nodes:1-5000 or departments:13,75",
+    )
+    parser.add_argument(
+        "--shard-db",
+        type=Path,
+        help="Shard database to write to (default: next to --db, named after the shard)",
+    )
+
+
+def shard_db_from_args(args) -> Path:
+    """
+    Get the database a script should work on, preparing the shard database if needed.
+
+    Args:
+        args: Parsed arguments, with the options of add_shard_arguments and --db
+
+    Returns:
+        The shard database path with --shard, the main database path otherwise
+    """
+    if args.shard is None:
+        return args.db
+
+    parse_shard_spec(args.shard)
+    shard_db_path = args.shard_db or args.db.with_name(
+        f"{args.db.stem}.{args.shard.replace(':', '-').replace(',', '_')}{args.db.suffix}"
+    )
+    prepare_shard_db(args.db, shard_db_path, args.shard)
+    return shard_db_path
+
+
+def merge_shards(
+    db_path: Path, shard_db_paths: list[Path], on_conflict: str = "fail"
+) -> dict[str, int]:
+    """
+    Merge shard databases into the main database.
+
+    Only the rows of the nodes of each shard are taken, except in tables with a
+    row preference (see SHARDED_TABLES). They are first staged from every
+    shard, in path order, so that a row written with different values by two
+    shards is detected as a conflict before anything is written. The main
+    database is then updated in a single transaction, shard rows replacing
+    existing rows.
+
+    Args:
+        db_path: Path to the main database
+        shard_db_paths: Paths to the shard databases
+        on_conflict: "fail" to abort the merge on conflicts, "keep-first" to
+            keep the row of the first shard
+
+    Returns:
+        Dictionary mapping table name to number of merged rows
+
+    Raises:
+        RuntimeError: If on_conflict is "fail" and shards conflict
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    tables = {}
+
+    # Stage the rows of every shard
+    for shard_index, shard_db_path in enumerate(sorted(shard_db_paths)):
+        cursor.execute("ATTACH DATABASE ? AS shard", (str(shard_db_path),))
+        cursor.execute("SELECT spec FROM shard.t_shard")
+        spec = cursor.fetchone()[0]
+        node_ids_query, params = shard_node_ids_query(spec, "shard")
+        print(f"Staging {shard_db_path} ({spec})...")
+
+        for table, (keys, values, preference) in SHARDED_TABLES.items():
+            cursor.execute(
+                "SELECT 1 FROM shard.sqlite_master WHERE type = 'table' AND name = ?",
+                (table,),
+            )
+            if cursor.fetchone() is None:
+                continue
+
+            if table not in tables:
+                # The stage may not have run on the main database yet
+                if not table_exists(cursor, table):
+                    cursor.execute(
+                        """
+                        SELECT sql FROM shard.sqlite_master
+                        WHERE tbl_name = ? AND type IN ('table', 'index') AND sql IS NOT NULL
+                        ORDER BY type DESC
+                        """,
+                        (table,),
+                    )
+                    for (sql,) in cursor.fetchall():
+                        cursor.execute(sql)
+                cursor.execute(f"""
+                    CREATE TEMP TABLE staged_{table} AS
+                    SELECT 0 AS shard, {", ".join((*keys, *values))} FROM main.{table} WHERE 0
+                """)
+                tables[table] = (keys, values, preference)
+
+            columns = ", ".join((*keys, *values))
+            if preference is None:
+                condition = f"WHERE node_id IN ({node_ids_query})"
+                condition_params = params
+            else:
+                condition, condition_params = "", []
+            cursor.execute(
+                f"""
+                INSERT INTO temp.staged_{table} (shard, {columns})
+                SELECT ?, {columns} FROM shard.{table}
+                {condition}
+                """,
+                (shard_index, *condition_params),
+            )
+
+        conn.commit()
+        cursor.execute("DETACH DATABASE shard")
+
+    # Detect rows written with different values by several shards
+    conflicts = []
+    for table, (keys, values, preference) in tables.items():
+        if preference is not None:
+            continue
+        key_match = " AND ".join(f"a.{key} = b.{key}" for key in keys)
+        differs = " OR ".join(f"a.{value} IS NOT b.{value}" for value in values)
+        cursor.execute(f"""
+            SELECT DISTINCT {", ".join(f"a.{key}" for key in keys)}
+            FROM temp.staged_{table} a
+            JOIN temp.staged_{table} b ON {key_match} AND a.shard < b.shard
+            WHERE {differs}
+        """)
+        conflicts.extend(f"{table} {dict(zip(keys, row))}" for row in cursor.fetchall())
+
+    if conflicts and on_conflict == "fail":
+        conn.close()
+        for conflict in conflicts:
+            print(f"Conflict: {conflict}", file=sys.stderr)
+        raise RuntimeError(f"{len(conflicts)} conflicting rows between shards")
+
+    if conflicts:
+        print(
+            f"Warning: kept the first shard's row for {len(conflicts)} conflicts",
+            file=sys.stderr,
+        )
+
+    # Write the staged rows, the first shard winning
+    start_change_tracking(conn)
+    merged = {}
+    for table, (keys, values, preference) in tables.items():
+        columns = ", ".join((*keys, *values))
+        if preference is None:
+            key_match = " AND ".join(f"t.{key} = s.{key}" for key in keys)
+            cursor.execute(f"""
+                INSERT OR REPLACE INTO main.{table} ({columns})
+                SELECT {columns} FROM temp.staged_{table} s
+                WHERE s.shard = (
+                    SELECT MIN(t.shard) FROM temp.staged_{table} t WHERE {key_match}
+                )
+            """)
+        else:
+            # The main database ranks as shard -1, its preferred rows are kept
+            cursor.execute(f"""
+                INSERT OR REPLACE INTO main.{table} ({columns})
+                SELECT {columns} FROM (
+                    SELECT shard, {columns}, ROW_NUMBER() OVER (
+                        PARTITION BY {", ".join(keys)} ORDER BY {preference}, shard
+                    ) AS position
+                    FROM (
+                        SELECT -1 AS shard, {columns} FROM main.{table}
+                        UNION ALL
+                        SELECT shard, {columns} FROM temp.staged_{table}
+                    )
+                )
+                WHERE position = 1 AND shard >= 0
+            """)
+        merged[table] = cursor.rowcount
+    conn.commit()
+
+    refresh_tracked_profiles(conn)
+    optimize_database(conn)
+    conn.close()
+
+    return merged
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Merge shard databases written by insee_code.py and weather_data.py --shard"
+    )
+    parser.add_argument(
+        "shards",
+        type=Path,
+        nargs="+",
+        help="Shard database files",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+    parser.add_argument(
+        "--on-conflict",
+        choices=["fail", "keep-first"],
+        default="fail",
+        help="What to do when two shards wrote different values for the same row (default: fail)",
+    )
+
+    args = parser.parse_args()
+
+    for path in [args.db, *args.shards]:
+        if not path.exists():
+            print(f"Error: Database file {path} does not exist", file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        merged = merge_shards(args.db, args.shards, args.on_conflict)
+    except RuntimeError as e:
+        print(f"Error: {e}, nothing merged", file=sys.stderr)
+        sys.exit(1)
+
+    for table, count in merged.items():
+        print(f"✓ Merged {count} rows into {table}")
+
+
+if __name__ == "__main__":
+    main()
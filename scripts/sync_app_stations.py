@@ -0,0 +1,302 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "httpx>=0.28.1",
+#     "python-dotenv>=1.0.0",
+# ]
+# ///
+
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from http_fixtures import add_http_fixture_arguments, configure_http_fixtures_from_args
+from ingest_nodes import (
+    build_physical_stations,
+    create_nodes_table,
+    create_physical_station_table,
+    parse_uic_code,
+)
+from insee_code import enrich_cities_from_db
+from migrate import optimize_database, table_exists
+from node_profile import refresh_tracked_profiles, start_change_tracking
+from profiling import Profiler, add_profile_arguments
+from weather_data import (
+    compute_all_monthly_averages,
+    fetch_weather_data_for_nodes,
+    insert_weather_data,
+    weather_storage,
+)
+
+
+def create_app_station_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the t_app_station table, mapping the app's stations to nodes.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS t_app_station (
+            source TEXT NOT NULL,
+            source_id TEXT NOT NULL,
+            node_id INTEGER NOT NULL,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            enriched_at TIMESTAMP,
+            PRIMARY KEY (source, source_id),
+            FOREIGN KEY (node_id) REFERENCES t_nodes(id)
+        ) WITHOUT ROWID
+    """)
+
+
+def node_sncf_id(source: str, source_id: str) -> str:
+    """
+    Get the t_nodes identifier of an app station.
+
+    Args:
+        source: GTFS provider of the station in the app (e.g. "sncf")
+        source_id: GTFS stop ID
+
+    Returns:
+        The stop ID for SNCF stations, prefixed with the provider otherwise
+    """
+    return source_id if source == "sncf" else f"{source}:{source_id}"
+
+
+def sync_app_stations(db_path: Path, app_db_path: Path, sources: list[str]) -> set[int]:
+    """
+    Copy the stations added or moved in the app database since the last sync
+    into t_nodes.
+
+    The app recreates its t_stations rows on every GTFS import, so stations
+    are matched on (source, source_id) rather than on their id. Nodes keep
+    their id when updated, and stations removed from the app are kept.
+    Stations stay pending until mark_app_stations_enriched is called, so an
+    interrupted run is resumed by the next one.
+
+    Args:
+        db_path: Path to SQLite database file
+        app_db_path: Path to the app database (train_data_v2.db)
+        sources: GTFS providers whose stations are synced
+
+    Returns:
+        Ids of the canonical nodes of the pending physical stations
+    """
+    app_conn = sqlite3.connect(f"file:{app_db_path}?mode=ro", uri=True)
+    placeholders = ",".join("?" * len(sources))
+    stations = app_conn.execute(
+        f"SELECT source, source_id, name, lat, lon FROM t_stations WHERE source IN ({placeholders})",
+        sources,
+    ).fetchall()
+    app_conn.close()
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_nodes_table(cursor)
+    create_app_station_table(cursor)
+
+    cursor.execute("SELECT source, source_id, lat, lon FROM t_app_station")
+    synced = {(source, source_id): (lat, lon) for source, source_id, lat, lon in cursor}
+
+    changed_uic_codes = set()
+    for source, source_id, name, lat, lon in stations:
+        if synced.get((source, source_id)) == (lat, lon):
+            continue
+
+        sncf_id = node_sncf_id(source, source_id)
+        uic_code = parse_uic_code(sncf_id)
+        cursor.execute(
+            """
+            INSERT INTO t_nodes (sncf_id, name, lat, lon, uic_code)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (sncf_id) DO UPDATE
+            SET name = excluded.name, lat = excluded.lat, lon = excluded.lon,
+                uic_code = excluded.uic_code
+            RETURNING id
+            """,
+            (sncf_id, name, lat, lon, uic_code),
+        )
+        node_id = cursor.fetchone()[0]
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO t_app_station (source, source_id, node_id, lat, lon)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (source, source_id, node_id, lat, lon),
+        )
+        changed_uic_codes.add(uic_code)
+
+    print(
+        f"{len(changed_uic_codes)} physical stations added or moved "
+        f"out of {len(stations)} app stations"
+    )
+
+    create_physical_station_table(cursor)
+    if changed_uic_codes:
+        # New variants can move the representative coordinate of a station
+        build_physical_stations(cursor)
+
+        # Profiles of the new nodes are refreshed here, the enrichment of the
+        # canonical nodes refreshes every variant
+        if table_exists(cursor, "t_node_profile"):
+            cursor.execute(
+                "CREATE TEMP TABLE changed_uic_codes (uic_code TEXT PRIMARY KEY)"
+            )
+            cursor.executemany(
+                "INSERT INTO temp.changed_uic_codes VALUES (?)",
+                [(uic_code,) for uic_code in changed_uic_codes],
+            )
+            start_change_tracking(conn)
+            cursor.execute("""
+                INSERT INTO temp.changed_nodes (node_id)
+                SELECT id FROM t_nodes
+                WHERE uic_code IN (SELECT uic_code FROM temp.changed_uic_codes)
+            """)
+            refresh_tracked_profiles(conn)
+
+    cursor.execute("""
+        SELECT DISTINCT p.node_id
+        FROM t_app_station a
+        JOIN t_nodes n ON n.id = a.node_id
+        JOIN t_physical_station p ON p.uic_code = n.uic_code
+        WHERE a.enriched_at IS NULL
+    """)
+    node_ids = {row[0] for row in cursor.fetchall()}
+
+    conn.commit()
+    conn.close()
+
+    return node_ids
+
+
+def mark_app_stations_enriched(db_path: Path) -> int:
+    """
+    Mark the pending app stations whose canonical node got weather data, in
+    row or packed storage, as enriched. The others (orders still pending, no
+    CSV or no weather station in range) stay pending for the next run.
+
+    Args:
+        db_path: Path to SQLite database file
+
+    Returns:
+        Number of app stations marked as enriched
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    weather = " UNION ALL ".join(
+        f"SELECT node_id FROM {table}"
+        for table in ("t_weather_data", "t_weather_vector")
+        if table_exists(cursor, table)
+    )
+    if not weather:
+        conn.close()
+        return 0
+    cursor.execute(f"""
+        UPDATE t_app_station SET enriched_at = CURRENT_TIMESTAMP
+        WHERE enriched_at IS NULL
+          AND node_id IN (
+            SELECT n.id
+            FROM t_nodes n
+            JOIN t_physical_station p ON p.uic_code = n.uic_code
+            WHERE p.node_id IN ({weather})
+          )
+    """)
+    marked = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return marked
+
+
+def main() -> None:
+    import argparse
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Enrich the stations added or moved by the app's GTFS imports since the last run"
+    )
+    parser.add_argument(
+        "--app-db",
+        type=Path,
+        required=True,
+        help="Path to the app database (train_data_v2.db in the app data location)",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+    parser.add_argument(
+        "--source",
+        action="append",
+        help="GTFS provider whose stations are enriched, can be repeated (default: sncf)",
+    )
+    parser.add_argument(
+        "--api-key-env",
+        default="METEO_FRANCE_API_KEY",
+        help="Environment variable holding the Météo-France API key (default: METEO_FRANCE_API_KEY)",
+    )
+    add_http_fixture_arguments(parser)
+    add_profile_arguments(parser)
+
+    args = parser.parse_args()
+    profiler = Profiler.from_args(args)
+    configure_http_fixtures_from_args(args)
+
+    for path in (args.db, args.app_db):
+        if not path.exists():
+            print(f"Error: Database file {path} does not exist", file=sys.stderr)
+            sys.exit(1)
+
+    with profiler.phase("sync_app_stations"):
+        node_ids = sync_app_stations(args.db, args.app_db, args.source or ["sncf"])
+    if not node_ids:
+        print("✓ No new or moved stations to enrich")
+        return
+
+    print(f"\nEnriching {len(node_ids)} stations with city data...")
+    with profiler.phase("enrich_cities_from_db"):
+        enrich_cities_from_db(args.db, node_ids=node_ids)
+
+    api_token = os.getenv(args.api_key_env)
+    conn = sqlite3.connect(args.db)
+    has_weather_stations = table_exists(conn.cursor(), "t_weather_station")
+    conn.close()
+    if not api_token or not has_weather_stations:
+        # The stations stay pending, to get weather data on the next run
+        print(
+            f"Warning: skipping weather data, set {args.api_key_env} and run "
+            "ingest_weather_stations.py first",
+            file=sys.stderr,
+        )
+    else:
+        print(f"\nEnriching {len(node_ids)} stations with weather data...")
+        with profiler.phase("fetch_weather_data_for_nodes"):
+            node_to_csv_by_year, node_to_station = fetch_weather_data_for_nodes(
+                args.db, api_token, node_ids=node_ids
+            )
+        with profiler.phase("compute_all_monthly_averages"):
+            node_to_monthly_averages = compute_all_monthly_averages(node_to_csv_by_year)
+        with profiler.phase("insert_weather_data"):
+            insert_weather_data(
+                args.db,
+                node_to_monthly_averages,
+                node_to_station,
+                weather_storage(args.db),
+            )
+        marked = mark_app_stations_enriched(args.db)
+        print(f"✓ Marked {marked} app stations as enriched")
+
+    conn = sqlite3.connect(args.db)
+    optimize_database(conn)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import json
+import sqlite3
+from collections.abc import Iterator
+
+import pytest
+
+from migrate import (
+    KEY_QUERIES,
+    MIGRATIONS,
+    apply_migrations,
+    explain_query_plan,
+    unexpected_plan_details,
+)
+
+# Schema of the ingestion scripts before migrate.py, with the non-unique
+# idx_insee_node_id and the indexes duplicating UNIQUE constraints
+LEGACY_SCHEMA = """
+    CREATE TABLE t_nodes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sncf_id TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        lat REAL NOT NULL,
+        lon REAL NOT NULL
+    );
+    CREATE INDEX idx_sncf_id ON t_nodes(sncf_id);
+
+    CREATE TABLE t_insee (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        node_id INTEGER NOT NULL,
+        insee_code TEXT,
+        city_name TEXT,
+        department_code TEXT,
+        region_code TEXT,
+        population INTEGER,
+        postal_codes TEXT,
+        error_message TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (node_id) REFERENCES t_nodes(id)
+    );
+    CREATE INDEX idx_insee_node_id ON t_insee(node_id);
+
+    CREATE TABLE t_weather_station (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        station_id TEXT UNIQUE NOT NULL,
+        nom TEXT NOT NULL,
+        department_code TEXT NOT NULL,
+        poste_ouvert BOOLEAN NOT NULL,
+        type_poste INTEGER NOT NULL,
+        lon REAL NOT NULL,
+        lat REAL NOT NULL,
+        alt INTEGER NOT NULL,
+        poste_public BOOLEAN NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX idx_station_id ON t_weather_station(station_id);
+    CREATE INDEX idx_weather_station_coords ON t_weather_station(lat, lon);
+    CREATE INDEX idx_weather_station_dept ON t_weather_station(department_code);
+
+    CREATE TABLE t_weather_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        node_id INTEGER NOT NULL,
+        weather_station_id INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        precipitation REAL,
+        average_temp REAL,
+        sunny_days REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (node_id) REFERENCES t_nodes(id),
+        FOREIGN KEY (weather_station_id) REFERENCES t_weather_station(id),
+        UNIQUE(node_id, month)
+    );
+    CREATE INDEX idx_weather_data_node ON t_weather_data(node_id);
+    CREATE INDEX idx_weather_data_station ON t_weather_data(weather_station_id);
+    CREATE INDEX idx_weather_data_month ON t_weather_data(month);
+
+    CREATE TABLE t_museum (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        postal_code TEXT UNIQUE NOT NULL,
+        museum_count INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX idx_museum_postal_code ON t_museum(postal_code);
+"""
+
+NODE_COUNT = 1000
+
+
+@pytest.fixture
+def migrated() -> Iterator[sqlite3.Connection]:
+    """
+    Legacy database with nodes enriched twice, migrated to the latest schema.
+    """
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.executescript(LEGACY_SCHEMA)
+
+    cursor.executemany(
+        "INSERT INTO t_nodes (id, sncf_id, name, lat, lon) VALUES (?, ?, ?, ?, ?)",
+        (
+            (i, f"stop_point:SNCF:87{i:06d}:Train", f"Station {i}", 45.0, 2.0)
+            for i in range(1, NODE_COUNT + 1)
+        ),
+    )
+    cursor.executemany(
+        """
+        INSERT INTO t_weather_station
+        (id, station_id, nom, department_code, poste_ouvert, type_poste, lon, lat, alt, poste_public)
+        VALUES (?, ?, ?, '13', 1, 0, 2.0, 45.0, 0, 1)
+        """,
+        ((i, f"{i:08d}", f"Station {i}") for i in range(1, 21)),
+    )
+    # Every node is enriched twice, the second record being the most recent
+    for city in ("Old", "New"):
+        cursor.executemany(
+            """
+            INSERT INTO t_insee (node_id, insee_code, city_name, department_code, postal_codes)
+            VALUES (?, ?, ?, '13', ?)
+            """,
+            (
+                (
+                    i,
+                    f"13{i % 1000:03d}",
+                    f"{city} {i}",
+                    json.dumps([f"13{i % 100:03d}"]),
+                )
+                for i in range(1, NODE_COUNT + 1)
+            ),
+        )
+    cursor.executemany(
+        """
+        INSERT INTO t_weather_data (node_id, weather_station_id, month, average_temp)
+        VALUES (?, ?, ?, ?)
+        """,
+        (
+            (i, i % 20 + 1, month, (i * month) % 30)
+            for i in range(1, NODE_COUNT + 1)
+            for month in range(1, 13)
+        ),
+    )
+    cursor.executemany(
+        "INSERT INTO t_museum (postal_code, museum_count) VALUES (?, ?)",
+        ((f"13{i:03d}", i % 3) for i in range(100)),
+    )
+    conn.commit()
+
+    assert apply_migrations(conn) == len(MIGRATIONS)
+    yield conn
+    conn.close()
+
+
+def test_user_version(migrated: sqlite3.Connection) -> None:
+    assert migrated.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert apply_migrations(migrated) == 0
+
+
+def test_duplicate_insee_rows_collapsed(migrated: sqlite3.Connection) -> None:
+    cursor = migrated.cursor()
+    cursor.execute("SELECT COUNT(*), COUNT(DISTINCT node_id) FROM t_insee")
+    assert cursor.fetchone() == (NODE_COUNT, NODE_COUNT)
+    cursor.execute("SELECT city_name FROM t_insee WHERE node_id = 1")
+    assert cursor.fetchone() == ("New 1",)
+
+    cursor.execute("PRAGMA index_list(t_insee)")
+    unique = {name: bool(is_unique) for _, name, is_unique, *_ in cursor.fetchall()}
+    assert unique["idx_insee_node_id"]
+
+
+@pytest.mark.parametrize("name", KEY_QUERIES)
+def test_key_query_plan(migrated: sqlite3.Connection, name: str) -> None:
+    query, forbidden = KEY_QUERIES[name]
+    plan = explain_query_plan(migrated.cursor(), query)
+    assert unexpected_plan_details(plan, forbidden) == [], plan
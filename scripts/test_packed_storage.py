@@ -0,0 +1,131 @@
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+import pytest
+
+from bench_queries import generate_database
+from climate_lookup import ClimateLookup, export_climate
+from climate_similarity import ClimateIndex
+from export_dataset import export_dataset
+from ingest_nodes import build_physical_stations, create_physical_station_table
+from insee_code import create_node_insee_view
+from sharding import merge_shards, prepare_shard_db
+from weather_data import (
+    WEATHER_FIELDS,
+    create_weather_command_table,
+    insert_weather_data,
+    weather_storage,
+)
+
+# Stop point variant of the physical station of node 2
+VARIANT_ID = 10_000
+
+
+@pytest.fixture
+def packed_db(tmp_path: Path) -> Path:
+    """
+    Synthetic database converted to packed storage, with a stop point variant.
+    """
+    db_path = tmp_path / "nodes.db"
+    generate_database(db_path, 200)
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        INSERT INTO t_nodes (id, sncf_id, name, lat, lon, uic_code)
+        SELECT ?, 'variant', name, lat, lon, uic_code FROM t_nodes WHERE id = 2
+    """,
+        (VARIANT_ID,),
+    )
+    create_physical_station_table(cursor)
+    build_physical_stations(cursor)
+    create_node_insee_view(cursor)
+
+    cursor.execute(
+        f"SELECT node_id, weather_station_id, month, {', '.join(WEATHER_FIELDS)} FROM t_weather_data"
+    )
+    node_to_monthly_averages = {}
+    node_to_station = {}
+    for node_id, weather_station_id, month, *values in cursor.fetchall():
+        node_to_monthly_averages.setdefault(node_id, {})[month] = dict(
+            zip(WEATHER_FIELDS, values)
+        )
+        node_to_station[node_id] = (weather_station_id, "", 0.0)
+    cursor.execute("DROP TABLE t_weather_data")
+    conn.commit()
+    conn.close()
+
+    insert_weather_data(db_path, node_to_monthly_averages, node_to_station, "packed")
+    assert weather_storage(db_path) == "packed"
+    return db_path
+
+
+def test_export_climate(packed_db: Path, tmp_path: Path) -> None:
+    out_path = tmp_path / "climate.bin"
+    assert export_climate(packed_db, out_path) == 201
+
+    lookup = ClimateLookup(out_path)
+    assert np.array_equal(
+        lookup.climate_for(VARIANT_ID), lookup.climate_for(2), equal_nan=True
+    )
+    assert not np.isnan(lookup.climate_for(2)).all()
+
+
+def test_climate_index(packed_db: Path) -> None:
+    conn = sqlite3.connect(packed_db)
+    conn.execute("UPDATE t_weather_vector SET created_at = '2000-01-01'")
+    conn.commit()
+    index = ClimateIndex.build(packed_db)
+    assert len(index) == 200
+    assert index.update(packed_db) == 0
+
+    conn.execute(
+        "UPDATE t_weather_vector SET created_at = '9999-01-01' WHERE node_id = 2"
+    )
+    conn.execute("DELETE FROM t_weather_vector WHERE node_id = 3")
+    conn.commit()
+    conn.close()
+    assert index.update(packed_db) == 2
+    assert len(index) == 199
+
+
+def test_export_dataset(packed_db: Path, tmp_path: Path) -> None:
+    exported = export_dataset(packed_db, tmp_path / "export")
+    assert exported["climate"] == 201 * 12
+
+    climate = pq.read_table(tmp_path / "export" / "climate.parquet").to_pylist()
+    variant = [row for row in climate if row["node_id"] == VARIANT_ID]
+    canonical = [row for row in climate if row["node_id"] == 2]
+    assert [{**row, "node_id": 2} for row in variant] == canonical
+
+
+def test_merge_shards(packed_db: Path, tmp_path: Path) -> None:
+    shard_db = tmp_path / "shard.db"
+    prepare_shard_db(packed_db, shard_db, "nodes:1-100")
+
+    conn = sqlite3.connect(shard_db)
+    create_weather_command_table(conn.cursor())
+    conn.execute("UPDATE t_weather_vector SET climate = zeroblob(144)")
+    conn.execute("""
+        INSERT INTO t_weather_command (station_id, year, command_id, status, csv_data)
+        VALUES ('00000001', 2020, 'c1', 'done', 'csv')
+    """)
+    conn.commit()
+    conn.close()
+
+    merged = merge_shards(packed_db, [shard_db])
+    assert merged["t_weather_vector"] == 100
+    assert merged["t_weather_command"] == 1
+
+    conn = sqlite3.connect(packed_db)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT COUNT(*) FROM t_weather_vector WHERE climate = zeroblob(144)"
+    )
+    assert cursor.fetchone()[0] == 100
+    cursor.execute("SELECT status, csv_data FROM t_weather_command")
+    assert cursor.fetchall() == [("done", "csv")]
+    conn.close()
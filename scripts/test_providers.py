@@ -0,0 +1,24 @@
+import threading
+
+from providers import Provider, fetch_stage, provider_for, register_provider
+
+STAGE = "test"
+
+
+def test_fetch_stage_parallel_and_unknown_country() -> None:
+    # Each hook waits for the other: fetched one after the other, they would
+    # time out
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fetch(node_ids: set[int], **options) -> set[int]:
+        barrier.wait()
+        return node_ids
+
+    french = register_provider(Provider("fr", STAGE, {"FR"}, fetch=fetch))
+    german = register_provider(Provider("de", STAGE, {"DE"}, fetch=fetch))
+    assert provider_for(STAGE, None) is None
+
+    nodes = [(1, "87000001"), (2, "80000002"), (3, "stop_point"), (4, None)]
+    results = fetch_stage(STAGE, nodes)
+    assert results == [(french, {1}), (german, {2})]
+    assert french.calls == german.calls == 1
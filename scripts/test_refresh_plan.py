@@ -0,0 +1,33 @@
+import sqlite3
+from pathlib import Path
+
+from bench_queries import generate_database
+from refresh_plan import climate_station_years
+from sharding import shard_node_ids
+from weather_data import select_weather_stations
+
+# More ranges than SQLite's maximum expression depth (1000)
+NODE_IDS = set(range(1, 2400, 2))
+
+
+def test_climate_station_years_non_contiguous_nodes(tmp_path: Path) -> None:
+    db_path = tmp_path / "nodes.db"
+    generate_database(db_path, 2500)
+
+    node_to_station = select_weather_stations(db_path, node_ids=NODE_IDS)
+    assert node_to_station and set(node_to_station) <= NODE_IDS
+
+    station_years = climate_station_years(db_path, sorted(NODE_IDS))
+    assert {station_id for station_id, _ in station_years} == {
+        station_id for _, station_id, _ in node_to_station.values()
+    }
+
+
+def test_shard_node_ids_many_ranges() -> None:
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t_nodes (id INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT INTO t_nodes VALUES (?)", ((i,) for i in range(1, 2500)))
+
+    spec = "nodes:" + ",".join(map(str, sorted(NODE_IDS)))
+    assert shard_node_ids(conn.cursor(), spec) == NODE_IDS
+    conn.close()
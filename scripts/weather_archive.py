@@ -0,0 +1,163 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "httpx>=0.28.1",
+# ]
+# ///
+
+import gzip
+import os
+import sys
+from pathlib import Path
+
+import httpx
+
+# Météo-France monthly climatology, one gzipped CSV per department and period,
+# published on data.gouv.fr
+ARCHIVE_URL = (
+    "https://object.files.data.gouv.fr/meteofrance/data/synchro_ftp/BASE/MENS/{name}"
+)
+ARCHIVE_PERIODS = ("previous-1950-2023", "latest-2024-2025")
+
+# Archive columns kept, in the order of the CSV files of the DPClim API
+ARCHIVE_STATION_COLUMN = "NUM_POSTE"
+ARCHIVE_DATE_COLUMN = "AAAAMM"
+ARCHIVE_VALUE_COLUMNS = ("RR", "TMM", "NBSIGMA80")
+
+
+def archive_name(department_code: str, period: str) -> str:
+    """
+    Get the file name of a department archive.
+
+    Args:
+        department_code: Department code (e.g. "13", "2A")
+        period: One of ARCHIVE_PERIODS
+
+    Returns:
+        File name, e.g. "MENSQ_13_latest-2024-2025.csv.gz"
+    """
+    return f"MENSQ_{department_code.zfill(2)}_{period}.csv.gz"
+
+
+def download_archive(url: str, path: Path) -> bool:
+    """
+    Stream an archive to disk, replacing the file atomically.
+
+    Args:
+        url: Archive URL
+        path: Destination path
+
+    Returns:
+        True if downloaded, False otherwise
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with httpx.stream("GET", url, timeout=60.0, follow_redirects=True) as response:
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_bytes(1 << 20):
+                    f.write(chunk)
+    except httpx.HTTPError as e:
+        print(f"Error downloading {url}: {type(e).__name__}: {e}", file=sys.stderr)
+        tmp_path.unlink(missing_ok=True)
+        return False
+
+    os.replace(tmp_path, path)
+    return True
+
+
+def read_archive(
+    path: Path, station_ids: set[str], years: set[int]
+) -> dict[str, dict[int, list[str]]]:
+    """
+    Stream-decompress a department archive, keeping only the rows of the given
+    stations and years and the DATE, RR, TMM and NBSIGMA80 columns.
+
+    Args:
+        path: Path to the gzipped archive
+        station_ids: Météo-France station IDs to keep
+        years: Years to keep
+
+    Returns:
+        Dictionary mapping station_id to year to CSV lines (DATE;RR;TMM;NBSIGMA80)
+    """
+    rows = {}
+    with gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="") as f:
+        header = f.readline().rstrip("\r\n").split(";")
+        station_idx = header.index(ARCHIVE_STATION_COLUMN)
+        date_idx = header.index(ARCHIVE_DATE_COLUMN)
+        value_idx = [
+            header.index(column) if column in header else -1
+            for column in ARCHIVE_VALUE_COLUMNS
+        ]
+
+        for line in f:
+            columns = line.rstrip("\r\n").split(";")
+            if len(columns) <= max(station_idx, date_idx):
+                continue
+            station_id = columns[station_idx]
+            if station_id not in station_ids:
+                continue
+            date_str = columns[date_idx]
+            if not date_str[:4].isdigit() or int(date_str[:4]) not in years:
+                continue
+
+            values = [
+                columns[idx] if 0 <= idx < len(columns) else "" for idx in value_idx
+            ]
+            rows.setdefault(station_id, {}).setdefault(int(date_str[:4]), []).append(
+                ";".join([date_str, *values])
+            )
+
+    return rows
+
+
+def load_archived_station_csvs(
+    archive_dir: Path,
+    station_departments: dict[str, str],
+    years: list[int],
+    download: bool = True,
+) -> dict[str, dict[int, str]]:
+    """
+    Get the monthly CSV data of stations from the department archives.
+
+    Args:
+        archive_dir: Directory holding the archives
+        station_departments: Dictionary mapping station_id to department code
+        years: Years to keep
+        download: Download the archives missing from archive_dir
+
+    Returns:
+        Dictionary mapping station_id to year to CSV data, in the format of the
+        files of the DPClim API (header DATE;RR;TMM;NBSIGMA80)
+    """
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    departments = {}
+    for station_id, department_code in station_departments.items():
+        departments.setdefault(department_code, set()).add(station_id)
+
+    header = ";".join(["DATE", *ARCHIVE_VALUE_COLUMNS])
+    station_to_csv_by_year = {}
+
+    for i, (department_code, station_ids) in enumerate(sorted(departments.items())):
+        for period in ARCHIVE_PERIODS:
+            name = archive_name(department_code, period)
+            path = archive_dir / name
+            if not path.exists():
+                if not download:
+                    print(f"Warning: {path} not found, skipping", file=sys.stderr)
+                    continue
+                print(f"Downloading {name}...")
+                if not download_archive(ARCHIVE_URL.format(name=name), path):
+                    continue
+
+            for station_id, lines_by_year in read_archive(
+                path, station_ids, set(years)
+            ).items():
+                csv_by_year = station_to_csv_by_year.setdefault(station_id, {})
+                for year, lines in lines_by_year.items():
+                    csv_by_year[year] = "\n".join([header, *lines]) + "\n"
+
+        print(f"Progress: {i + 1}/{len(departments)} departments processed")
+
+    return station_to_csv_by_year
@@ -0,0 +1,458 @@
+# /// script
+# requires-python = ">=3.14"
+# dependencies = [
+#     "httpx>=0.28.1",
+#     "numpy>=2.0.0",
+#     "python-dotenv>=1.0.0",
+# ]
+# ///
+
+import numpy as np
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from http_fixtures import add_http_fixture_arguments, configure_http_fixtures_from_args
+from weather_data import (
+    collect_weather_orders,
+    create_weather_command_table,
+    find_closest_weather_stations,
+    submit_weather_orders,
+)
+
+# Daily CSV columns kept: precipitation (mm), mean and max temperature (°C)
+DAILY_VARIABLES = ("RR", "TM", "TX")
+
+# One float32 slot per day of year, the last one is NaN on non-leap years
+DAYS_PER_YEAR = 366
+
+# A day is rainy above 1 mm of precipitation, hot above 30 °C max temperature
+RAINY_DAY_THRESHOLD = 1.0
+HEAT_DAY_THRESHOLD = 30.0
+
+
+def create_weather_daily_tables(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the t_weather_daily and t_weather_daily_stats tables.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS t_weather_daily (
+            station_id TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            variable TEXT NOT NULL,
+            series BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (station_id, year, variable)
+        ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS t_weather_daily_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            node_id INTEGER NOT NULL,
+            weather_station_id INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            temp_p10 REAL,
+            temp_p50 REAL,
+            temp_p90 REAL,
+            rainy_day_probability REAL,
+            heat_days REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (node_id) REFERENCES t_nodes(id),
+            FOREIGN KEY (weather_station_id) REFERENCES t_weather_station(id),
+            UNIQUE(node_id, month)
+        )
+    """)
+
+
+def pack_series(series: np.ndarray) -> bytes:
+    """
+    Pack a daily series into a little-endian float32 BLOB.
+
+    Args:
+        series: Array of DAYS_PER_YEAR values, NaN where missing
+
+    Returns:
+        Packed bytes
+    """
+    return series.astype("<f4").tobytes()
+
+
+def unpack_series(blob: bytes) -> np.ndarray:
+    """
+    Unpack a float32 BLOB written by pack_series, without copying.
+
+    Args:
+        blob: Packed bytes
+
+    Returns:
+        Read-only array of DAYS_PER_YEAR values
+    """
+    return np.frombuffer(blob, dtype="<f4")
+
+
+def parse_daily_csv(csv_data: str, year: int) -> dict[str, np.ndarray]:
+    """
+    Parse a daily CSV into one float32 array per variable, indexed by day of year.
+
+    Args:
+        csv_data: CSV data string (semicolon-separated)
+        year: Year covered by the CSV
+
+    Returns:
+        Dictionary mapping each of DAILY_VARIABLES to an array of DAYS_PER_YEAR
+        values, NaN where missing
+    """
+    series = {
+        variable: np.full(DAYS_PER_YEAR, np.nan, dtype=np.float32)
+        for variable in DAILY_VARIABLES
+    }
+
+    lines = csv_data.splitlines()
+    if not lines:
+        return series
+
+    header = lines[0].split(";")
+    if "DATE" not in header:
+        return series
+    date_idx = header.index("DATE")
+    value_idx = {
+        variable: header.index(variable)
+        for variable in DAILY_VARIABLES
+        if variable in header
+    }
+
+    first_day = np.datetime64(f"{year}-01-01", "D")
+
+    for line in lines[1:]:
+        columns = line.split(";")
+        if len(columns) <= date_idx:
+            continue
+
+        date_str = columns[date_idx]
+        if len(date_str) != 8 or not date_str.startswith(str(year)):  # YYYYMMDD
+            continue
+        try:
+            day = np.datetime64(f"{date_str[0:4]}-{date_str[4:6]}-{date_str[6:8]}", "D")
+        except ValueError:
+            continue
+        day_of_year = int((day - first_day).astype(int))
+
+        for variable, idx in value_idx.items():
+            if idx >= len(columns) or not columns[idx]:
+                continue
+            try:
+                series[variable][day_of_year] = float(columns[idx].replace(",", "."))
+            except ValueError:
+                continue
+
+    return series
+
+
+def month_of_day(year: int) -> np.ndarray:
+    """
+    Month (1-12) of each day-of-year slot, 0 for the padding slot of non-leap years.
+
+    Args:
+        year: Year
+
+    Returns:
+        Array of DAYS_PER_YEAR month numbers
+    """
+    days = np.arange(f"{year}-01-01", f"{year + 1}-01-01", dtype="datetime64[D]")
+    months = np.zeros(DAYS_PER_YEAR, dtype=np.int8)
+    months[: len(days)] = days.astype("datetime64[M]").astype(int) % 12 + 1
+    return months
+
+
+def compute_daily_statistics(
+    series_by_year: dict[int, dict[str, np.ndarray]],
+) -> dict[int, dict[str, float]]:
+    """
+    Compute monthly statistics from daily series over several years.
+
+    Args:
+        series_by_year: Dictionary mapping year to variable to daily series
+
+    Returns:
+        Dictionary mapping month (1-12) to temperature percentiles (p10, p50, p90
+        of daily mean temperature), probability of a rainy day and average number
+        of heat days per year
+    """
+    years = sorted(series_by_year)
+    empty = np.full(DAYS_PER_YEAR, np.nan, dtype=np.float32)
+
+    def stacked(variable: str) -> np.ndarray:
+        return np.concatenate(
+            [series_by_year[year].get(variable, empty) for year in years]
+        )
+
+    months = np.concatenate([month_of_day(year) for year in years])
+    year_of_day = np.repeat(np.arange(len(years)), DAYS_PER_YEAR)
+    rr, tm, tx = stacked("RR"), stacked("TM"), stacked("TX")
+
+    statistics = {}
+    for month in range(1, 13):
+        in_month = months == month
+
+        temps = tm[in_month & ~np.isnan(tm)]
+        if temps.size:
+            p10, p50, p90 = np.percentile(temps, [10, 50, 90])
+        else:
+            p10 = p50 = p90 = None
+
+        rain = rr[in_month & ~np.isnan(rr)]
+        rainy_day_probability = (
+            float(np.mean(rain >= RAINY_DAY_THRESHOLD)) if rain.size else None
+        )
+
+        # Heat days are averaged over the years with max temperature data
+        has_tx = in_month & ~np.isnan(tx)
+        observed_years = np.unique(year_of_day[has_tx]).size
+        heat_days = (
+            float(np.count_nonzero(tx[has_tx] >= HEAT_DAY_THRESHOLD)) / observed_years
+            if observed_years
+            else None
+        )
+
+        statistics[month] = {
+            "temp_p10": None if p10 is None else float(p10),
+            "temp_p50": None if p50 is None else float(p50),
+            "temp_p90": None if p90 is None else float(p90),
+            "rainy_day_probability": rainy_day_probability,
+            "heat_days": heat_days,
+        }
+
+    return statistics
+
+
+def fetch_daily_data_for_stations(
+    conn: sqlite3.Connection,
+    api_key: str,
+    station_ids: set[str],
+    years: list[int],
+    max_polls: int = 10,
+    poll_interval: float = 60.0,
+) -> None:
+    """
+    Fetch and store daily series for each station and year not already stored.
+
+    Orders are tracked in the t_weather_command ledger as "quotidienne"
+    products: orders placed by a previous run are collected instead of being
+    placed again, and station-years whose orders are still pending are left
+    without series until a later run.
+
+    Args:
+        conn: SQLite database connection
+        api_key: Meteo France API key
+        station_ids: Météo-France station IDs to fetch
+        years: Years to fetch
+        max_polls: Maximum number of rounds polling the pending orders
+        poll_interval: Seconds to wait between polling rounds
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT station_id, year FROM t_weather_daily")
+    stored = set(cursor.fetchall())
+
+    station_years = {
+        (station_id, year)
+        for station_id in station_ids
+        for year in years
+        if (station_id, year) not in stored
+    }
+    print(
+        f"Fetching daily data for {len(station_years)} station-years "
+        f"({len(stored)} already stored)..."
+    )
+    if not station_years:
+        return
+
+    create_weather_command_table(cursor)
+    submit_weather_orders(conn, api_key, station_years, product="quotidienne")
+    collect_weather_orders(
+        conn, api_key, max_polls, poll_interval, product="quotidienne"
+    )
+
+    cursor.execute("""
+        SELECT station_id, year, csv_data
+        FROM t_weather_command
+        WHERE product = 'quotidienne' AND status = 'done'
+    """)
+    collected = [row for row in cursor.fetchall() if row[:2] in station_years]
+    for station_id, year, csv_data in collected:
+        series = parse_daily_csv(csv_data, year)
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO t_weather_daily (station_id, year, variable, series)
+            VALUES (?, ?, ?, ?)
+            """,
+            [
+                (station_id, year, variable, pack_series(values))
+                for variable, values in series.items()
+            ],
+        )
+    conn.commit()
+
+    print(f"✓ Stored daily series of {len(collected)} station-years")
+
+
+def load_daily_series(
+    cursor: sqlite3.Cursor, station_id: str, years: list[int]
+) -> dict[int, dict[str, np.ndarray]]:
+    """
+    Load the stored daily series of a station.
+
+    Args:
+        cursor: SQLite database cursor
+        station_id: Météo-France station ID
+        years: Years to load
+
+    Returns:
+        Dictionary mapping year to variable to daily series
+    """
+    cursor.execute(
+        f"""
+        SELECT year, variable, series
+        FROM t_weather_daily
+        WHERE station_id = ? AND year IN ({",".join("?" * len(years))})
+        """,
+        (station_id, *years),
+    )
+    series_by_year = {}
+    for year, variable, blob in cursor.fetchall():
+        series_by_year.setdefault(year, {})[variable] = unpack_series(blob)
+    return series_by_year
+
+
+def insert_daily_statistics(
+    conn: sqlite3.Connection,
+    node_to_station: dict[int, tuple[int, str, float]],
+    years: list[int],
+) -> None:
+    """
+    Compute monthly statistics per station and insert them for every node.
+
+    Args:
+        conn: SQLite database connection
+        node_to_station: Dictionary mapping node_id to (weather_station_id, station_id, distance)
+        years: Years to compute statistics over
+    """
+    cursor = conn.cursor()
+    statistics_by_station = {}
+    inserted_count = 0
+
+    for node_id, (weather_station_id, station_id, _) in node_to_station.items():
+        if station_id not in statistics_by_station:
+            series_by_year = load_daily_series(cursor, station_id, years)
+            statistics_by_station[station_id] = (
+                compute_daily_statistics(series_by_year) if series_by_year else None
+            )
+
+        statistics = statistics_by_station[station_id]
+        if statistics is None:
+            continue
+
+        cursor.executemany(
+            """
+            INSERT OR REPLACE INTO t_weather_daily_stats
+            (node_id, weather_station_id, month, temp_p10, temp_p50, temp_p90,
+             rainy_day_probability, heat_days)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    node_id,
+                    weather_station_id,
+                    month,
+                    values["temp_p10"],
+                    values["temp_p50"],
+                    values["temp_p90"],
+                    values["rainy_day_probability"],
+                    values["heat_days"],
+                )
+                for month, values in statistics.items()
+            ],
+        )
+        inserted_count += len(statistics)
+
+    conn.commit()
+
+    print(f"✓ Inserted {inserted_count} daily statistics records")
+
+
+def main() -> None:
+    import argparse
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Fetch daily weather data for each node and compute monthly statistics"
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(__file__).parent / "nodes.db",
+        help="Path to SQLite database file (default: nodes.db in script directory)",
+    )
+    parser.add_argument(
+        "--years",
+        type=int,
+        nargs="+",
+        default=[2020, 2021, 2022, 2023, 2024, 2025],
+        help="Years to fetch (default: 2020-2025)",
+    )
+    parser.add_argument(
+        "--max-polls",
+        type=int,
+        default=10,
+        help="Maximum number of rounds polling pending orders (default: 10)",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=60.0,
+        metavar="SECONDS",
+        help="Seconds between polling rounds (default: 60)",
+    )
+    add_http_fixture_arguments(parser)
+
+    args = parser.parse_args()
+    configure_http_fixtures_from_args(args)
+
+    if not args.db.exists():
+        print(f"Error: Database file {args.db} does not exist", file=sys.stderr)
+        sys.exit(1)
+
+    api_token = os.getenv("METEO_FRANCE_API_KEY")
+    if not api_token:
+        print(
+            "Error: API token required. Set METEO_FRANCE_API_KEY in .env file",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    node_to_station = find_closest_weather_stations(args.db)
+
+    conn = sqlite3.connect(args.db)
+    print("Creating tables t_weather_daily and t_weather_daily_stats...")
+    create_weather_daily_tables(conn.cursor())
+
+    station_ids = {station_id for _, station_id, _ in node_to_station.values()}
+    fetch_daily_data_for_stations(
+        conn, api_token, station_ids, args.years, args.max_polls, args.poll_interval
+    )
+
+    print("\nComputing monthly statistics from daily series...")
+    insert_daily_statistics(conn, node_to_station, args.years)
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
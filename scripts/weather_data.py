@@ -6,18 +6,44 @@
 # ]
 # ///
 
-import csv
+import gzip
 import httpx
-import io
 import math
 import os
 import sqlite3
+import struct
 import sys
 import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from dotenv import load_dotenv
 
+from http_fixtures import (
+    add_http_fixture_arguments,
+    add_raw_archive_argument,
+    configure_http_fixtures_from_args,
+    http_get,
+    print_http_stats,
+    pace,
+    raw_archive_path,
+)
+from migrate import optimize_database, table_exists
+from node_profile import refresh_tracked_profiles, start_change_tracking
+from profiling import Profiler, add_profile_arguments
+from providers import Provider, fetch_stage, load_stage_nodes, register_provider
+from shadow_db import (
+    add_shadow_arguments,
+    publish_shadow_from_args,
+    shadow_db_from_args,
+)
+from sharding import add_shard_arguments, shard_db_from_args, shard_node_ids
+from weather_archive import load_archived_station_csvs
+
+# Years averaged into the monthly climate of each node
+WEATHER_YEARS = [2020, 2021, 2022, 2023, 2024, 2025]
+
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
@@ -49,44 +75,83 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     return earth_radius * c
 
 
-def find_closest_weather_stations(db_path: Path) -> dict[int, tuple[int, str, float]]:
+def load_nodes_with_departments(cursor: sqlite3.Cursor) -> list[tuple]:
     """
-    For each node with known department code, find the closest weather station.
+    Load the nodes to enrich with weather data, with their department code.
+
+    When nodes are grouped into physical stations only canonical nodes are
+    enriched, located at the station's representative coordinate.
 
     Args:
-        db_path: Path to SQLite database file
+        cursor: SQLite database cursor
 
     Returns:
-        Dictionary mapping node_id to (weather_station_id, distance_km)
+        List of (node_id, sncf_id, name, lat, lon, department_code)
     """
-    # Connect to database
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 't_physical_station'"
+    )
+    if cursor.fetchone() is not None:
+        cursor.execute("""
+            SELECT n.id, n.sncf_id, n.name, p.lat, p.lon, i.department_code
+            FROM t_physical_station p
+            JOIN t_nodes n ON n.id = p.node_id
+            JOIN t_insee i ON n.id = i.node_id
+            WHERE i.department_code IS NOT NULL
+        """)
+    else:
+        cursor.execute("""
+            SELECT n.id, n.sncf_id, n.name, n.lat, n.lon, i.department_code
+            FROM t_nodes n
+            JOIN t_insee i ON n.id = i.node_id
+            WHERE i.department_code IS NOT NULL
+        """)
+    return cursor.fetchall()
+
+
+def load_open_stations_by_department(cursor: sqlite3.Cursor) -> dict[str, list[tuple]]:
+    """
+    Load open weather stations grouped by department for faster lookup.
 
-    # Get nodes with department codes
-    cursor.execute("""
-        SELECT DISTINCT n.id, n.sncf_id, n.name, n.lat, n.lon, i.department_code
-        FROM t_nodes n
-        JOIN t_insee i ON n.id = i.node_id
-        WHERE i.department_code IS NOT NULL
-    """)
-    nodes = cursor.fetchall()
+    Args:
+        cursor: SQLite database cursor
 
-    # Get all weather stations grouped by department
+    Returns:
+        Dictionary mapping department code to a list of
+        (weather_station_id, station_id, nom, lat, lon, type_poste)
+    """
     cursor.execute("""
-        SELECT id, station_id, nom, department_code, lat, lon
+        SELECT id, station_id, nom, department_code, lat, lon, type_poste
         FROM t_weather_station
         WHERE poste_ouvert IS TRUE;
     """)
-    all_stations = cursor.fetchall()
 
-    # Group stations by department for faster lookup
     stations_by_dept = {}
-    for station in all_stations:
-        ws_id, station_id, nom, dept_code, lat, lon = station
+    for ws_id, station_id, nom, dept_code, lat, lon, type_poste in cursor.fetchall():
         if dept_code not in stations_by_dept:
             stations_by_dept[dept_code] = []
-        stations_by_dept[dept_code].append((ws_id, station_id, nom, lat, lon))
+        stations_by_dept[dept_code].append(
+            (ws_id, station_id, nom, lat, lon, type_poste)
+        )
+    return stations_by_dept
+
+
+def find_closest_weather_stations(db_path: Path) -> dict[int, tuple[int, str, float]]:
+    """
+    For each node with known department code, find the closest weather station.
+
+    Args:
+        db_path: Path to SQLite database file
+
+    Returns:
+        Dictionary mapping node_id to (weather_station_id, distance_km)
+    """
+    # Connect to database
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    nodes = load_nodes_with_departments(cursor)
+    stations_by_dept = load_open_stations_by_department(cursor)
 
     # Find closest station for each node
     node_to_station = {}
@@ -104,15 +169,13 @@ def find_closest_weather_stations(db_path: Path) -> dict[int, tuple[int, str, fl
         min_distance = float("inf")
         closest_station_id = None
         closest_ws_id = None
-        closest_station_name = None
 
-        for ws_id, station_id, station_name, station_lat, station_lon in dept_stations:
+        for ws_id, station_id, _, station_lat, station_lon, _ in dept_stations:
             distance = haversine_distance(node_lat, node_lon, station_lat, station_lon)
             if distance < min_distance:
                 min_distance = distance
                 closest_ws_id = ws_id
                 closest_station_id = station_id
-                closest_station_name = station_name
 
         # Store mapping
         if closest_station_id:
@@ -133,12 +196,110 @@ def find_closest_weather_stations(db_path: Path) -> dict[int, tuple[int, str, fl
     return node_to_station
 
 
+def plan_covering_weather_stations(
+    db_path: Path, max_distance_km: float
+) -> dict[int, tuple[int, str, float]]:
+    """
+    Select a small set of weather stations covering every node, and assign nodes to them.
+
+    Solves a greedy set cover per department: a station covers the nodes of its
+    department within max_distance_km, and the station covering the most
+    uncovered nodes is picked first. Ties go to stations with a lower type_poste
+    (better equipped stations, with longer and more complete records), then to
+    the smallest total distance. A node without any station within range is
+    covered by its closest station, as in find_closest_weather_stations.
+
+    Args:
+        db_path: Path to SQLite database file
+        max_distance_km: Maximum distance between a node and its station
+
+    Returns:
+        Dictionary mapping node_id to (weather_station_id, station_id, distance_km),
+        each node being assigned its closest selected station
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    nodes = load_nodes_with_departments(cursor)
+    stations_by_dept = load_open_stations_by_department(cursor)
+    conn.close()
+
+    nodes_by_dept = {}
+    for node_id, _, _, lat, lon, dept_code in nodes:
+        nodes_by_dept.setdefault(dept_code, []).append((node_id, lat, lon))
+
+    node_to_station = {}
+    no_station_count = 0
+
+    for dept_code, dept_nodes in nodes_by_dept.items():
+        dept_stations = stations_by_dept.get(dept_code, [])
+        if not dept_stations:
+            no_station_count += len(dept_nodes)
+            continue
+
+        # distances[node_id][station index]
+        distances = {
+            node_id: [
+                haversine_distance(lat, lon, station[3], station[4])
+                for station in dept_stations
+            ]
+            for node_id, lat, lon in dept_nodes
+        }
+
+        # Nodes each station can serve: those within range, plus the nodes
+        # whose closest station is out of range but is this one
+        covers = [set() for _ in dept_stations]
+        for node_id, node_distances in distances.items():
+            in_range = [
+                idx
+                for idx, distance in enumerate(node_distances)
+                if distance <= max_distance_km
+            ]
+            if not in_range:
+                in_range = [
+                    min(range(len(node_distances)), key=node_distances.__getitem__)
+                ]
+            for idx in in_range:
+                covers[idx].add(node_id)
+
+        uncovered = set(distances)
+        selected = []
+        while uncovered:
+            best = min(
+                range(len(dept_stations)),
+                key=lambda idx: (
+                    -len(covers[idx] & uncovered),
+                    dept_stations[idx][5],
+                    sum(distances[node_id][idx] for node_id in covers[idx] & uncovered),
+                ),
+            )
+            selected.append(best)
+            uncovered -= covers[best]
+
+        for node_id, node_distances in distances.items():
+            idx = min(
+                (idx for idx in selected if node_id in covers[idx]),
+                key=node_distances.__getitem__,
+            )
+            ws_id, station_id = dept_stations[idx][:2]
+            node_to_station[node_id] = (ws_id, station_id, node_distances[idx])
+
+    if no_station_count > 0:
+        print(
+            f"Warning: {no_station_count} nodes could not be matched to a weather station",
+            file=sys.stderr,
+        )
+
+    return node_to_station
+
+
 def request_weather_data(
     api_key: str,
     station_id: str,
     date_start: str,
     date_end: str,
     max_retries: int = 5,
+    product: str = "mensuelle",
 ) -> str | None:
     """
     Request weather data for a station and time period. Returns command ID.
@@ -149,12 +310,13 @@ def request_weather_data(
         date_start: Start date in format YYYY-MM-DDT00:00:00Z
         date_end: End date in format YYYY-MM-DDT00:00:00Z
         max_retries: Maximum number of retries for rate limiting
+        product: Data resolution, "mensuelle" (monthly) or "quotidienne" (daily)
 
     Returns:
         Command ID string if successful, None otherwise
     """
     url = (
-        "https://public-api.meteofrance.fr/public/DPClim/v1/commande-station/mensuelle"
+        f"https://public-api.meteofrance.fr/public/DPClim/v1/commande-station/{product}"
     )
     headers = {"accept": "*/*", "apikey": api_key}
     params = {
@@ -167,7 +329,8 @@ def request_weather_data(
 
     for attempt in range(max_retries):
         try:
-            response = httpx.get(url, headers=headers, params=params, timeout=30.0)
+            # Not hedged: each request places an order
+            response = http_get(url, headers=headers, params=params, timeout=30.0)
             response.raise_for_status()
             data = response.json()
             command_id = data.get("elaboreProduitAvecDemandeResponse", {}).get("return")
@@ -199,15 +362,23 @@ def request_weather_data(
 
 
 def fetch_weather_csv(
-    api_key: str, command_id: str, max_retries: int = 5
+    api_key: str,
+    command_id: str,
+    max_retries: int = 5,
+    archive_dir: Path | None = None,
 ) -> str | None:
     """
     Fetch weather data CSV using command ID.
 
+    The file of one station-year is small and kept whole in the ledger, so it
+    is not streamed. The request is not hedged: Météo-France requests count
+    against the API quota.
+
     Args:
         api_key: Meteo France API key
         command_id: Command ID from request_weather_data
         max_retries: Maximum number of retries for rate limiting
+        archive_dir: Directory receiving a gzipped copy of the raw CSV, if set
 
     Returns:
         CSV data as string if successful, None otherwise
@@ -220,8 +391,11 @@ def fetch_weather_csv(
 
     for attempt in range(max_retries):
         try:
-            response = httpx.get(url, headers=headers, params=params, timeout=30.0)
+            response = http_get(url, headers=headers, params=params, timeout=30.0)
             response.raise_for_status()
+            archive = raw_archive_path(archive_dir, f"commande_{command_id}.csv.gz")
+            if archive is not None:
+                archive.write_bytes(gzip.compress(response.content))
             return response.text
         except httpx.HTTPStatusError as e:
             # Either the file is not yet available (404) or we are rate-limited (429)
@@ -231,7 +405,7 @@ def fetch_weather_csv(
                     time.sleep(wait_time)
                 else:
                     print(
-                        f"Rate limited fetching CSV for command {command_id}",
+                        f"CSV not ready or rate limited for command {command_id}",
                         file=sys.stderr,
                     )
             else:
@@ -250,185 +424,619 @@ def fetch_weather_csv(
     return None
 
 
-def fetch_weather_data_for_nodes(
+def create_weather_command_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the t_weather_command table, the ledger of Météo-France orders.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS t_weather_command (
+            station_id TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            product TEXT NOT NULL DEFAULT 'mensuelle',
+            command_id TEXT NOT NULL,
+            submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            csv_data TEXT,
+            PRIMARY KEY (station_id, year, product)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_weather_command_status ON t_weather_command(status)
+    """)
+
+
+def submit_weather_orders(
+    conn: sqlite3.Connection,
+    api_key: str,
+    station_years: set[tuple[str, int]],
+    product: str = "mensuelle",
+) -> int:
+    """
+    Order the data of each station and year that has no live order in the ledger.
+
+    Each command ID is committed to t_weather_command as soon as it is received,
+    so that an order is never placed twice. Failed orders are placed again.
+
+    Args:
+        conn: SQLite database connection
+        api_key: Meteo France API key
+        station_years: (station_id, year) pairs to order
+        product: Data resolution, "mensuelle" (monthly) or "quotidienne" (daily)
+
+    Returns:
+        Number of placed orders
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT station_id, year FROM t_weather_command WHERE product = ? AND status != 'failed'",
+        (product,),
+    )
+    ordered = set(cursor.fetchall())
+    to_order = sorted(station_years - ordered)
+    print(
+        f"Ordering {len(to_order)} station-years ({len(station_years) - len(to_order)} already ordered)..."
+    )
+
+    submitted = 0
+    for i, (station_id, year) in enumerate(to_order):
+        # Prepare date range for the year
+        date_start = f"{year}-01-01T00:00:00Z"
+        date_end = f"{year + 1}-01-01T00:00:00Z"
+
+        command_id = request_weather_data(
+            api_key, station_id, date_start, date_end, product=product
+        )
+        if command_id:
+            cursor.execute(
+                """
+                INSERT OR REPLACE INTO t_weather_command (station_id, year, product, command_id)
+                VALUES (?, ?, ?, ?)
+                """,
+                (station_id, year, product, command_id),
+            )
+            conn.commit()
+            submitted += 1
+        else:
+            print(
+                f"Failed to request data for station {station_id}, year {year}",
+                file=sys.stderr,
+            )
+
+        if (i + 1) % 10 == 0:
+            print(f"Progress: {i + 1}/{len(to_order)} orders placed")
+
+        # Small delay to avoid rate limiting (100 req/min theoretical limit)
+        pace(60 / 100)
+
+    return submitted
+
+
+def collect_weather_orders(
+    conn: sqlite3.Connection,
+    api_key: str,
+    max_polls: int = 10,
+    poll_interval: float = 60.0,
+    max_attempts: int = 20,
+    archive_dir: Path | None = None,
+    product: str | None = None,
+) -> int:
+    """
+    Poll the pending orders of the ledger and store the CSV files that are ready.
+
+    Orders still pending after max_polls rounds stay in the ledger, to be
+    collected by a later run. An order is marked failed after max_attempts
+    unsuccessful polls, across runs, and is then placed again by
+    submit_weather_orders.
+
+    Args:
+        conn: SQLite database connection
+        api_key: Meteo France API key
+        max_polls: Maximum number of polling rounds
+        poll_interval: Seconds to wait between polling rounds
+        max_attempts: Unsuccessful polls after which an order is failed
+        archive_dir: Directory receiving a gzipped copy of each raw CSV, if set
+        product: Only poll the orders of this data resolution, if set
+
+    Returns:
+        Number of orders still pending
+    """
+    cursor = conn.cursor()
+
+    for poll in range(max_polls):
+        cursor.execute(
+            """
+            SELECT station_id, year, product, command_id, attempts
+            FROM t_weather_command
+            WHERE status = 'pending' AND product = COALESCE(?, product)
+            ORDER BY submitted_at
+        """,
+            (product,),
+        )
+        pending = cursor.fetchall()
+        if not pending:
+            return 0
+        if poll > 0:
+            pace(poll_interval)
+
+        print(
+            f"Polling {len(pending)} pending orders (round {poll + 1}/{max_polls})..."
+        )
+        for station_id, year, product, command_id, attempts in pending:
+            csv_data = fetch_weather_csv(
+                api_key, command_id, max_retries=2, archive_dir=archive_dir
+            )
+            if csv_data:
+                status = "done"
+            elif attempts + 1 >= max_attempts:
+                status = "failed"
+            else:
+                status = "pending"
+            cursor.execute(
+                """
+                UPDATE t_weather_command
+                SET status = ?, attempts = attempts + 1, csv_data = ?
+                WHERE station_id = ? AND year = ? AND product = ?
+                """,
+                (status, csv_data, station_id, year, product),
+            )
+            conn.commit()
+
+            # Small delay to avoid rate limiting (100 req/min theoretical limit)
+            pace(60 / 100)
+
+    cursor.execute(
+        "SELECT COUNT(*) FROM t_weather_command WHERE status = 'pending' AND product = COALESCE(?, product)",
+        (product,),
+    )
+    still_pending = cursor.fetchone()[0]
+    if still_pending:
+        print(
+            f"{still_pending} orders still pending, run again (or with --collect) to collect them"
+        )
+    return still_pending
+
+
+def select_weather_stations(
+    db_path: Path,
+    cover_distance_km: float | None = None,
+    shard: str | None = None,
+    node_ids: set[int] | None = None,
+) -> dict[int, tuple[int, str, float]]:
+    """
+    Select the weather station of each node.
+
+    Args:
+        db_path: Path to SQLite database
+        cover_distance_km: If set, select a minimal set of stations covering
+            every node within this distance (see plan_covering_weather_stations)
+        shard: Shard specification restricting the nodes (see sharding.py)
+        node_ids: Node ids restricting the nodes
+
+    Returns:
+        Dictionary mapping node_id to (weather_station_id, station_id, distance_km)
+    """
+    # Find closest stations for all nodes, or a minimal covering set of stations
+    if cover_distance_km is None:
+        node_to_station = find_closest_weather_stations(db_path)
+    else:
+        node_to_station = plan_covering_weather_stations(db_path, cover_distance_km)
+        closest_count = len(
+            {
+                station_id
+                for _, station_id, _ in find_closest_weather_stations(db_path).values()
+            }
+        )
+        selected_count = len(
+            {station_id for _, station_id, _ in node_to_station.values()}
+        )
+        print(
+            f"Covering {len(node_to_station)} nodes within {cover_distance_km} km "
+            f"with {selected_count} stations (instead of {closest_count} closest stations)"
+        )
+
+    if shard is not None:
+        conn = sqlite3.connect(db_path)
+        shard_ids = shard_node_ids(conn.cursor(), shard)
+        conn.close()
+        node_to_station = {
+            node_id: station
+            for node_id, station in node_to_station.items()
+            if node_id in shard_ids
+        }
+        print(f"Restricting to {len(node_to_station)} nodes of shard {shard}")
+
+    if node_ids is not None:
+        node_to_station = {
+            node_id: station
+            for node_id, station in node_to_station.items()
+            if node_id in node_ids
+        }
+
+    return node_to_station
+
+
+def fetch_meteo_france_data(
+    node_ids: set[int],
     db_path: Path,
     api_key: str,
+    cover_distance_km: float | None = None,
+    max_polls: int = 10,
+    poll_interval: float = 60.0,
+    archive_dir: Path | None = None,
+    **options,
 ) -> tuple[dict[int, dict[int, str]], dict[int, tuple[int, str, float]]]:
     """
-    Fetch weather data for all nodes for years 2020-2025 (split into yearly requests as per API limit).
+    Fetch weather data of French nodes for years 2020-2025 (split into yearly
+    requests as per API limit): fetch hook of the Météo-France climate provider.
+
+    Orders are tracked in the t_weather_command ledger: orders placed by a
+    previous run are collected instead of being placed again, and nodes whose
+    orders are still pending are left without data until a later run.
 
     Args:
+        node_ids: Nodes to fetch
         db_path: Path to SQLite database
         api_key: Meteo France API key
+        cover_distance_km: If set, only order data for a minimal set of stations
+            covering every node within this distance (see plan_covering_weather_stations)
+        max_polls: Maximum number of rounds polling the pending orders
+        poll_interval: Seconds to wait between polling rounds
+        archive_dir: Directory receiving a gzipped copy of each raw CSV, if set
+        **options: Options of the other climate providers
 
     Returns:
         Tuple of (node_to_csv_by_year, node_to_station) where:
         - node_to_csv_by_year: Dictionary mapping node_id to year to CSV data
         - node_to_station: Dictionary mapping node_id to (weather_station_id, station_id, distance_km)
     """
-    # Find closest stations for all nodes
-    node_to_station = find_closest_weather_stations(db_path)
-
-    # Define years to fetch (2020-2025)
-    years = [2020, 2021, 2022, 2023, 2024, 2025]
+    node_to_station = select_weather_stations(
+        db_path, cover_distance_km, node_ids=node_ids
+    )
 
-    # Fetch weather data for each unique station
-    station_to_csv_by_year = {}  # station_id -> year -> csv_data
-    node_to_csv_by_year = {}  # node_id -> year -> csv_data
+    years = WEATHER_YEARS
 
-    total_requests = len(node_to_station) * len(years)
+    # Order each station-year once, then collect the orders through the ledger
+    station_years = {
+        (station_id, year)
+        for _, station_id, _ in node_to_station.values()
+        for year in years
+    }
     print(
         f"Fetching weather data for {len(node_to_station)} nodes across {len(years)} years..."
     )
 
-    request_count = 0
+    conn = sqlite3.connect(db_path)
+    create_weather_command_table(conn.cursor())
+    submit_weather_orders(conn, api_key, station_years)
+    collect_weather_orders(
+        conn, api_key, max_polls, poll_interval, archive_dir=archive_dir
+    )
 
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT station_id, year, csv_data
+        FROM t_weather_command
+        WHERE product = 'mensuelle' AND status = 'done'
+    """)
+    station_to_csv_by_year = {}  # station_id -> year -> csv_data
+    for station_id, year, csv_data in cursor.fetchall():
+        station_to_csv_by_year.setdefault(station_id, {})[year] = csv_data
+    conn.close()
+
+    node_to_csv_by_year = {}  # node_id -> year -> csv_data
     for node_id, (ws_id, station_id, distance) in node_to_station.items():
-        # Initialize year dict for this node
-        if node_id not in node_to_csv_by_year:
-            node_to_csv_by_year[node_id] = {}
-
-        for year in years:
-            # Check if we already fetched data for this station and year
-            if (
-                station_id in station_to_csv_by_year
-                and year in station_to_csv_by_year.get(station_id, {})
-            ):
-                node_to_csv_by_year[node_id][year] = station_to_csv_by_year[station_id][
-                    year
-                ]
-                request_count += 1
-                continue
+        node_to_csv_by_year[node_id] = {
+            year: csv_data
+            for year, csv_data in station_to_csv_by_year.get(station_id, {}).items()
+            if year in years
+        }
 
-            # Prepare date range for the year
-            date_start = f"{year}-01-01T00:00:00Z"
-            date_end = f"{year + 1}-01-01T00:00:00Z"
+    successful_node_years = sum(
+        len(years_dict) for years_dict in node_to_csv_by_year.values()
+    )
+    print(f"Successfully fetched {successful_node_years} node-year combinations")
 
-            # Request weather data
-            command_id = request_weather_data(api_key, station_id, date_start, date_end)
+    return node_to_csv_by_year, node_to_station
 
-            if not command_id:
-                print(
-                    f"Failed to request data for node {node_id}, station {station_id}, year {year}",
-                    file=sys.stderr,
-                )
-                request_count += 1
-                continue
 
-            # Fetch CSV data
-            csv_data = fetch_weather_csv(api_key, command_id)
+# Climate of the French nodes, ordered from the Météo-France DPClim API
+register_provider(
+    Provider(
+        "public-api.meteofrance.fr",
+        "climate",
+        {"FR"},
+        fetch=fetch_meteo_france_data,
+    )
+)
 
-            if csv_data:
-                # Cache at station level
-                if station_id not in station_to_csv_by_year:
-                    station_to_csv_by_year[station_id] = {}
-                station_to_csv_by_year[station_id][year] = csv_data
-                node_to_csv_by_year[node_id][year] = csv_data
-            else:
-                print(
-                    f"Failed to fetch CSV for node {node_id}, station {station_id}, year {year}",
-                    file=sys.stderr,
-                )
 
-            request_count += 1
+def fetch_weather_data_for_nodes(
+    db_path: Path,
+    api_key: str,
+    cover_distance_km: float | None = None,
+    shard: str | None = None,
+    max_polls: int = 10,
+    poll_interval: float = 60.0,
+    archive_dir: Path | None = None,
+    node_ids: set[int] | None = None,
+) -> tuple[dict[int, dict[int, str]], dict[int, tuple[int, str, float]]]:
+    """
+    Fetch weather data for all nodes through the providers of the "climate"
+    stage, each node dispatched by the country of its UIC code (see
+    providers.py). The fetch hook of every climate provider returns the same
+    tuple as fetch_meteo_france_data for its nodes.
 
-            # Progress update every 10 requests
-            if request_count % 10 == 0:
-                print(f"Progress: {request_count}/{total_requests} requests processed")
+    Args:
+        db_path: Path to SQLite database
+        api_key: Meteo France API key
+        cover_distance_km: If set, only order data for a minimal set of stations
+            covering every node within this distance (see plan_covering_weather_stations)
+        shard: Shard specification restricting the nodes to fetch (see sharding.py)
+        max_polls: Maximum number of rounds polling the pending orders
+        poll_interval: Seconds to wait between polling rounds
+        archive_dir: Directory receiving a gzipped copy of each raw CSV, if set
+        node_ids: Node ids restricting the nodes to fetch
 
-            # Small delay to avoid rate limiting (100 req/min theoretical limit)
-            time.sleep(60 / 100)
+    Returns:
+        Tuple of (node_to_csv_by_year, node_to_station) where:
+        - node_to_csv_by_year: Dictionary mapping node_id to year to CSV data
+        - node_to_station: Dictionary mapping node_id to (weather_station_id, station_id, distance_km)
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    nodes = load_stage_nodes(cursor)
+    if shard is not None:
+        shard_ids = shard_node_ids(cursor, shard)
+        nodes = [node for node in nodes if node[0] in shard_ids]
+        print(f"Restricting to {len(nodes)} nodes of shard {shard}")
+    conn.close()
+    if node_ids is not None:
+        nodes = [node for node in nodes if node[0] in node_ids]
+
+    node_to_csv_by_year = {}
+    node_to_station = {}
+    for _, (csv_by_year, stations) in fetch_stage(
+        "climate",
+        nodes,
+        db_path=db_path,
+        api_key=api_key,
+        cover_distance_km=cover_distance_km,
+        max_polls=max_polls,
+        poll_interval=poll_interval,
+        archive_dir=archive_dir,
+    ):
+        node_to_csv_by_year.update(csv_by_year)
+        node_to_station.update(stations)
+
+    return node_to_csv_by_year, node_to_station
+
+
+def fetch_weather_data_from_archives(
+    db_path: Path,
+    archive_dir: Path,
+    cover_distance_km: float | None = None,
+    shard: str | None = None,
+    download: bool = True,
+) -> tuple[dict[int, dict[int, str]], dict[int, tuple[int, str, float]]]:
+    """
+    Get weather data for all nodes for years 2020-2025 from the department-level
+    climatology archives instead of the DPClim API (see weather_archive.py).
+
+    Args:
+        db_path: Path to SQLite database
+        archive_dir: Directory holding the archives
+        cover_distance_km: If set, only read a minimal set of stations covering
+            every node within this distance (see plan_covering_weather_stations)
+        shard: Shard specification restricting the nodes (see sharding.py)
+        download: Download the archives missing from archive_dir
+
+    Returns:
+        Same as fetch_weather_data_for_nodes
+    """
+    node_to_station = select_weather_stations(db_path, cover_distance_km, shard)
+    years = WEATHER_YEARS
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT station_id, department_code FROM t_weather_station")
+    departments = dict(cursor.fetchall())
+    conn.close()
+
+    station_departments = {
+        station_id: departments[station_id]
+        for _, station_id, _ in node_to_station.values()
+    }
+    print(
+        f"Reading weather data of {len(station_departments)} stations from "
+        f"{len(set(station_departments.values()))} department archives..."
+    )
+    station_to_csv_by_year = load_archived_station_csvs(
+        archive_dir, station_departments, years, download
+    )
+
+    node_to_csv_by_year = {
+        node_id: station_to_csv_by_year.get(station_id, {})
+        for node_id, (ws_id, station_id, distance) in node_to_station.items()
+    }
 
     successful_node_years = sum(
         len(years_dict) for years_dict in node_to_csv_by_year.values()
     )
-    print(f"Successfully fetched {successful_node_years} node-year combinations")
+    print(f"Successfully read {successful_node_years} node-year combinations")
 
     return node_to_csv_by_year, node_to_station
 
 
-def parse_csv_and_compute_monthly_averages(
-    csv_data_by_year: dict[int, str],
-) -> dict[int, dict[str, float]]:
+# Averaged fields and the CSV columns they are read from
+WEATHER_FIELDS = ("precipitation", "average_temp", "sunny_days")
+WEATHER_CSV_COLUMNS = ("RR", "TMM", "NBSIGMA80")
+
+
+def parse_csv_monthly_partials(csv_data: str) -> array:
     """
-    Parse CSV data for multiple years and compute monthly averages.
+    Parse one station-year CSV into per-month partial sums and counts.
+
+    Only the DATE, RR, TMM and NBSIGMA80 columns are touched, so rows are never
+    materialized as dictionaries. The result is a compact array that is cheap to
+    send back from a worker process and to merge with other partials.
 
     Args:
-        csv_data_by_year: Dictionary mapping year to CSV data string
+        csv_data: CSV data string (semicolon-separated)
 
     Returns:
-        Dictionary mapping month (1-12) to averages of precipitation, average daily temperature, number of sunny days
-        Format: {1: {'precipitation': value, 'average_temp': value, 'sunny_days': value}, ...}
+        Array of 72 floats: 12 months × 3 fields of sums, followed by the
+        matching 12 × 3 value counts
     """
-    # Store all values by month
-    monthly_data = {
-        month: {"precipitation": [], "average_temp": [], "sunny_days": []}
-        for month in range(1, 13)
-    }
-
-    for year, csv_data in csv_data_by_year.items():
-        if not csv_data:
+    size = 12 * len(WEATHER_FIELDS)
+    partials = array("d", bytes(8 * 2 * size))
+
+    lines = csv_data.splitlines()
+    if not lines:
+        return partials
+
+    header = lines[0].split(";")
+    if "DATE" not in header:
+        return partials
+    date_idx = header.index("DATE")
+    value_idx = [
+        header.index(column) if column in header else -1
+        for column in WEATHER_CSV_COLUMNS
+    ]
+
+    for line in lines[1:]:
+        columns = line.split(";")
+        if len(columns) <= date_idx:
             continue
 
-        # Parse CSV (semicolon-separated)
-        reader = csv.DictReader(io.StringIO(csv_data), delimiter=";")
+        date_str = columns[date_idx]
+        if len(date_str) != 6:  # Should be YYYYMM
+            continue
+        try:
+            month = int(date_str[4:6])
+        except ValueError:
+            continue
+        if not 1 <= month <= 12:
+            continue
 
-        for row in reader:
+        base = (month - 1) * len(WEATHER_FIELDS)
+        for field, idx in enumerate(value_idx):
+            if idx < 0 or idx >= len(columns) or not columns[idx]:
+                continue
             try:
-                # Extract date and parse month
-                date_str = row.get("DATE", "")
-                if len(date_str) != 6:  # Should be YYYYMM
-                    continue
-
-                month = int(date_str[4:6])  # Extract MM
-
-                # Extract values (handle empty strings and commas as decimal separators)
-                rr_str = row.get("RR", "").replace(",", ".")
-                tmm_str = row.get("TMM", "").replace(",", ".")
-                nbsigma80_str = row.get("NBSIGMA80", "").replace(",", ".")
-
-                if rr_str:
-                    monthly_data[month]["precipitation"].append(float(rr_str))
-                if tmm_str:
-                    monthly_data[month]["average_temp"].append(float(tmm_str))
-                if nbsigma80_str:
-                    monthly_data[month]["sunny_days"].append(float(nbsigma80_str))
-
-            except (ValueError, KeyError) as e:
-                # Skip rows with parsing errors
+                # Values use commas as decimal separators
+                value = float(columns[idx].replace(",", "."))
+            except ValueError:
                 continue
+            partials[base + field] += value
+            partials[size + base + field] += 1
+
+    return partials
+
+
+def monthly_averages_from_partials(
+    partials_list: list[array],
+) -> dict[int, dict[str, float]]:
+    """
+    Merge partial aggregates and compute monthly averages.
+
+    Args:
+        partials_list: Arrays returned by parse_csv_monthly_partials
+
+    Returns:
+        Dictionary mapping month (1-12) to averages of precipitation, average daily temperature, number of sunny days
+    """
+    size = 12 * len(WEATHER_FIELDS)
+    totals = array("d", bytes(8 * 2 * size))
+    for partials in partials_list:
+        for i, value in enumerate(partials):
+            totals[i] += value
 
-    # Compute averages
     monthly_averages = {}
     for month in range(1, 13):
         monthly_averages[month] = {}
-        for field in ["precipitation", "average_temp", "sunny_days"]:
-            values = monthly_data[month][field]
-            if values:
-                monthly_averages[month][field] = sum(values) / len(values)
+        base = (month - 1) * len(WEATHER_FIELDS)
+        for field_idx, field in enumerate(WEATHER_FIELDS):
+            count = totals[size + base + field_idx]
+            if count:
+                monthly_averages[month][field] = totals[base + field_idx] / count
             else:
                 monthly_averages[month][field] = None
 
     return monthly_averages
 
 
+def parse_csv_and_compute_monthly_averages(
+    csv_data_by_year: dict[int, str],
+) -> dict[int, dict[str, float]]:
+    """
+    Parse CSV data for multiple years and compute monthly averages.
+
+    Args:
+        csv_data_by_year: Dictionary mapping year to CSV data string
+
+    Returns:
+        Dictionary mapping month (1-12) to averages of precipitation, average daily temperature, number of sunny days
+        Format: {1: {'precipitation': value, 'average_temp': value, 'sunny_days': value}, ...}
+    """
+    return monthly_averages_from_partials(
+        [
+            parse_csv_monthly_partials(csv_data)
+            for csv_data in csv_data_by_year.values()
+            if csv_data
+        ]
+    )
+
+
 def compute_all_monthly_averages(
     node_to_csv_by_year: dict[int, dict[int, str]],
+    workers: int = 1,
 ) -> dict[int, dict[int, dict[str, float]]]:
     """
     Compute monthly averages for all nodes.
 
+    Each distinct station-year CSV is parsed once. With more than one worker,
+    parsing is spread over a process pool and the main process only merges
+    the partial aggregates.
+
     Args:
         node_to_csv_by_year: Dictionary mapping node_id to year to CSV data
+        workers: Number of parsing processes
 
     Returns:
         Dictionary mapping node_id to month to averages
     """
+    # Nodes sharing a station share the same CSV payloads
+    payloads = list(
+        {
+            csv_data: None
+            for csv_by_year in node_to_csv_by_year.values()
+            for csv_data in csv_by_year.values()
+            if csv_data
+        }
+    )
+
+    if workers > 1 and len(payloads) > 1:
+        chunksize = max(1, len(payloads) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            partials = list(
+                executor.map(parse_csv_monthly_partials, payloads, chunksize=chunksize)
+            )
+    else:
+        partials = [parse_csv_monthly_partials(csv_data) for csv_data in payloads]
+
+    partials_by_csv = dict(zip(payloads, partials))
+
     node_to_monthly_averages = {}
 
     for node_id, csv_by_year in node_to_csv_by_year.items():
-        monthly_averages = parse_csv_and_compute_monthly_averages(csv_by_year)
-        node_to_monthly_averages[node_id] = monthly_averages
+        node_to_monthly_averages[node_id] = monthly_averages_from_partials(
+            [partials_by_csv[csv_data] for csv_data in csv_by_year.values() if csv_data]
+        )
 
     return node_to_monthly_averages
 
@@ -457,22 +1065,194 @@ def create_weather_data_table(cursor: sqlite3.Cursor) -> None:
     """)
 
     cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_weather_data_node ON t_weather_data(node_id)
+        CREATE INDEX IF NOT EXISTS idx_weather_data_station ON t_weather_data(weather_station_id)
     """)
 
     cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_weather_data_station ON t_weather_data(weather_station_id)
+        CREATE INDEX IF NOT EXISTS idx_weather_data_month_temp
+        ON t_weather_data(month, average_temp, precipitation, node_id)
     """)
 
+
+def create_node_weather_data_view(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the v_node_weather_data view, fanning weather data out to every node.
+
+    Only the canonical node of each physical station is enriched; the view
+    exposes its 12 monthly rows for every stop point variant of the same station.
+
+    Args:
+        cursor: SQLite database cursor
+    """
     cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_weather_data_month ON t_weather_data(month)
+        CREATE VIEW IF NOT EXISTS v_node_weather_data AS
+        SELECT n.id AS node_id, w.weather_station_id, w.month, w.precipitation,
+               w.average_temp, w.sunny_days, w.created_at
+        FROM t_nodes n
+        JOIN t_physical_station p ON p.uic_code = n.uic_code
+        JOIN t_weather_data w ON w.node_id = p.node_id
     """)
 
 
+# Packed storage: 12 months × WEATHER_FIELDS little-endian float32, month-major,
+# NaN for missing values
+CLIMATE_VECTOR = struct.Struct(f"<{12 * len(WEATHER_FIELDS)}f")
+
+
+def pack_climate_vector(monthly_averages: dict[int, dict[str, float | None]]) -> bytes:
+    """
+    Pack the monthly averages of a node into a climate vector BLOB.
+
+    Args:
+        monthly_averages: Dictionary mapping month (1-12) to field to average
+
+    Returns:
+        36 float32 values, month-major, NaN where missing
+    """
+    values = []
+    for month in range(1, 13):
+        averages = monthly_averages.get(month, {})
+        for field in WEATHER_FIELDS:
+            value = averages.get(field)
+            values.append(math.nan if value is None else value)
+    return CLIMATE_VECTOR.pack(*values)
+
+
+def unpack_climate_vector(blob: bytes) -> dict[int, dict[str, float | None]]:
+    """
+    Unpack a climate vector BLOB written by pack_climate_vector.
+
+    Args:
+        blob: Climate vector BLOB
+
+    Returns:
+        Dictionary mapping month (1-12) to field to average, None where missing
+    """
+    values = CLIMATE_VECTOR.unpack(blob)
+    return {
+        month: {
+            field: None if math.isnan(value) else value
+            for field, value in zip(
+                WEATHER_FIELDS,
+                values[(month - 1) * len(WEATHER_FIELDS) : month * len(WEATHER_FIELDS)],
+            )
+        }
+        for month in range(1, 13)
+    }
+
+
+def create_weather_vector_table(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the t_weather_vector table, holding one packed climate vector per node.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS t_weather_vector (
+            node_id INTEGER PRIMARY KEY,
+            weather_station_id INTEGER NOT NULL,
+            climate BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (node_id) REFERENCES t_nodes(id),
+            FOREIGN KEY (weather_station_id) REFERENCES t_weather_station(id)
+        )
+    """)
+
+
+def _hex_byte_sql(hex_column: str, index: int) -> str:
+    # Value of the index-th byte of a hex() string, 0-based
+    digit = "instr('0123456789ABCDEF', substr({}, {}, 1)) - 1"
+    return (
+        f"(({digit.format(hex_column, 2 * index + 1)}) * 16 "
+        f"+ {digit.format(hex_column, 2 * index + 2)})"
+    )
+
+
+def _pow2_sql(exponent: str) -> str:
+    # 2^exponent for 0 <= exponent <= 186, without the optional math functions
+    return (
+        f"(1.0 * (1 << min({exponent}, 62)) * (1 << max(min({exponent} - 62, 62), 0))"
+        f" * (1 << max({exponent} - 124, 0)))"
+    )
+
+
+def _float32_sql(b0: str, b1: str, b2: str, b3: str) -> str:
+    # Decode a little-endian IEEE 754 float32 from its bytes, NaN and
+    # infinities as NULL
+    exponent = f"((({b3} & 127) << 1) | ({b2} >> 7))"
+    mantissa = f"((({b2} & 127) << 16) | ({b1} << 8) | {b0})"
+    return f"""CASE
+            WHEN {exponent} = 255 THEN NULL
+            ELSE (CASE WHEN {b3} >= 128 THEN -1 ELSE 1 END) * CASE
+                WHEN {exponent} = 0 THEN {mantissa} / {_pow2_sql("149")}
+                WHEN {exponent} >= 127 THEN (1 + {mantissa} / 8388608.0) * {_pow2_sql(f"{exponent} - 127")}
+                ELSE (1 + {mantissa} / 8388608.0) / {_pow2_sql(f"127 - {exponent}")}
+            END
+        END"""
+
+
+def create_weather_vector_view(cursor: sqlite3.Cursor) -> None:
+    """
+    Create the v_weather_vector_data view, decoding the packed climate vectors
+    into the 12 monthly rows of t_weather_data, for SQL consumers.
+
+    Args:
+        cursor: SQLite database cursor
+    """
+    size = CLIMATE_VECTOR.size // 12
+    byte_columns = ", ".join(
+        f"{_hex_byte_sql('h', 4 * f + k)} AS b{f}_{k}"
+        for f in range(len(WEATHER_FIELDS))
+        for k in range(4)
+    )
+    field_columns = ", ".join(
+        f"{_float32_sql(*(f'b{f}_{k}' for k in range(4)))} AS {field}"
+        for f, field in enumerate(WEATHER_FIELDS)
+    )
+    cursor.execute(f"""
+        CREATE VIEW IF NOT EXISTS v_weather_vector_data AS
+        WITH months(month) AS (
+            VALUES (1), (2), (3), (4), (5), (6), (7), (8), (9), (10), (11), (12)
+        )
+        SELECT node_id, weather_station_id, month, {field_columns}, created_at
+        FROM (
+            SELECT node_id, weather_station_id, month, created_at, {byte_columns}
+            FROM (
+                SELECT v.node_id, v.weather_station_id, m.month, v.created_at,
+                       hex(substr(v.climate, (m.month - 1) * {size} + 1, {size})) AS h
+                FROM t_weather_vector v
+                CROSS JOIN months m
+            )
+        )
+    """)
+
+
+def weather_storage(db_path: Path) -> str:
+    """
+    Detect the weather storage of a database: packed once t_weather_vector
+    exists without t_weather_data, rows otherwise.
+
+    Args:
+        db_path: Path to SQLite database
+
+    Returns:
+        "rows" or "packed", the storage argument of insert_weather_data
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    packed = table_exists(cursor, "t_weather_vector") and not table_exists(
+        cursor, "t_weather_data"
+    )
+    conn.close()
+    return "packed" if packed else "rows"
+
+
 def insert_weather_data(
     db_path: Path,
     node_to_monthly_averages: dict[int, dict[int, dict[str, float]]],
     node_to_station: dict[int, tuple[int, str, float]],
+    storage: str = "rows",
 ) -> None:
     """
     Insert monthly weather averages into the database.
@@ -481,13 +1261,21 @@ def insert_weather_data(
         db_path: Path to SQLite database
         node_to_monthly_averages: Dictionary mapping node_id to month to averages
         node_to_station: Dictionary mapping node_id to (weather_station_id, station_id, distance)
+        storage: "rows" for 12 rows per node in t_weather_data, "packed" for
+            one climate vector BLOB per node in t_weather_vector
     """
+    if storage == "packed":
+        insert_weather_vectors(db_path, node_to_monthly_averages, node_to_station)
+        return
+
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
     # Create table
     print("Creating table t_weather_data...")
     create_weather_data_table(cursor)
+    create_node_weather_data_view(cursor)
+    start_change_tracking(conn)
 
     # Insert data
     print("Inserting weather data...")
@@ -527,11 +1315,62 @@ def insert_weather_data(
 
     # Final commit
     conn.commit()
+    refresh_tracked_profiles(conn)
+    optimize_database(conn)
     conn.close()
 
     print(f"✓ Inserted {inserted_count} weather data records")
 
 
+def insert_weather_vectors(
+    db_path: Path,
+    node_to_monthly_averages: dict[int, dict[int, dict[str, float]]],
+    node_to_station: dict[int, tuple[int, str, float]],
+) -> None:
+    """
+    Insert monthly weather averages as one packed climate vector per node.
+
+    Args:
+        db_path: Path to SQLite database
+        node_to_monthly_averages: Dictionary mapping node_id to month to averages
+        node_to_station: Dictionary mapping node_id to (weather_station_id, station_id, distance)
+    """
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    print("Creating table t_weather_vector...")
+    create_weather_vector_table(cursor)
+    create_weather_vector_view(cursor)
+    start_change_tracking(conn)
+
+    print("Inserting weather vectors...")
+    rows = []
+    for node_id, monthly_averages in node_to_monthly_averages.items():
+        if node_id not in node_to_station:
+            print(
+                f"Warning: No weather station found for node {node_id}", file=sys.stderr
+            )
+            continue
+        weather_station_id, _, _ = node_to_station[node_id]
+        rows.append(
+            (node_id, weather_station_id, pack_climate_vector(monthly_averages))
+        )
+
+    cursor.executemany(
+        """
+        INSERT OR REPLACE INTO t_weather_vector (node_id, weather_station_id, climate)
+        VALUES (?, ?, ?)
+        """,
+        rows,
+    )
+    conn.commit()
+    refresh_tracked_profiles(conn)
+    optimize_database(conn)
+    conn.close()
+
+    print(f"✓ Inserted {len(rows)} weather vectors")
+
+
 def main() -> None:
     import argparse
 
@@ -546,34 +1385,138 @@ def main() -> None:
         default=Path(__file__).parent / "nodes.db",
         help="Path to SQLite database file (default: nodes.db in script directory)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes used to parse CSV data (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--cover-distance",
+        type=float,
+        metavar="KM",
+        help="Only fetch a minimal set of stations such that every node has one within KM kilometres",
+    )
+    parser.add_argument(
+        "--api-key-env",
+        default="METEO_FRANCE_API_KEY",
+        help="Environment variable holding the API key, e.g. one per shard (default: METEO_FRANCE_API_KEY)",
+    )
+    parser.add_argument(
+        "--max-polls",
+        type=int,
+        default=10,
+        help="Maximum number of rounds polling pending orders (default: 10)",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=60.0,
+        metavar="SECONDS",
+        help="Seconds between polling rounds (default: 60)",
+    )
+    parser.add_argument(
+        "--archive-dir",
+        type=Path,
+        metavar="DIR",
+        help="Read the department-level climatology archives cached in DIR instead of ordering from the API",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="With --archive-dir, do not download the missing archives",
+    )
+    parser.add_argument(
+        "--collect",
+        action="store_true",
+        help="Only collect the pending orders of the ledger, without placing new ones",
+    )
+    parser.add_argument(
+        "--storage",
+        choices=("rows", "packed"),
+        help="Store 12 rows per node in t_weather_data, or one packed climate vector per node in t_weather_vector (default: the storage of the database, rows for a new one)",
+    )
+    add_shard_arguments(parser)
+    add_shadow_arguments(parser)
+    add_raw_archive_argument(parser)
+    add_http_fixture_arguments(parser)
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
+    profiler = Profiler.from_args(args)
+    configure_http_fixtures_from_args(args)
 
     if not args.db.exists():
         print(f"Error: Database file {args.db} does not exist", file=sys.stderr)
         sys.exit(1)
 
-    api_token = os.getenv("METEO_FRANCE_API_KEY")
-    if not api_token:
+    api_token = os.getenv(args.api_key_env)
+    if not api_token and args.archive_dir is None:
         print(
-            "Error: API token required. Set METEO_FRANCE_API_KEY in .env file",
+            f"Error: API token required. Set {args.api_key_env} in .env file",
             file=sys.stderr,
         )
         sys.exit(1)
 
+    db_path = shadow_db_from_args(args, shard_db_from_args(args))
+
+    if args.collect:
+        conn = sqlite3.connect(db_path)
+        create_weather_command_table(conn.cursor())
+        collect_weather_orders(
+            conn,
+            api_token,
+            args.max_polls,
+            args.poll_interval,
+            archive_dir=args.raw_archive,
+        )
+        conn.close()
+        publish_shadow_from_args(args)
+        return
+
     # Fetch weather data for years 2020-2025
-    node_to_csv_by_year, node_to_station = fetch_weather_data_for_nodes(
-        args.db, api_token
-    )
+    if args.archive_dir is not None:
+        with profiler.phase("fetch_weather_data_from_archives"):
+            node_to_csv_by_year, node_to_station = fetch_weather_data_from_archives(
+                db_path,
+                args.archive_dir,
+                args.cover_distance,
+                args.shard,
+                not args.offline,
+            )
+    else:
+        with profiler.phase("fetch_weather_data_for_nodes"):
+            node_to_csv_by_year, node_to_station = fetch_weather_data_for_nodes(
+                db_path,
+                api_token,
+                args.cover_distance,
+                args.shard,
+                args.max_polls,
+                args.poll_interval,
+                args.raw_archive,
+            )
 
     # Compute monthly averages
     print("\nComputing monthly averages across years...")
-    node_to_monthly_averages = compute_all_monthly_averages(node_to_csv_by_year)
+    with profiler.phase("compute_all_monthly_averages"):
+        node_to_monthly_averages = compute_all_monthly_averages(
+            node_to_csv_by_year, args.workers
+        )
     print(f"Computed monthly averages for {len(node_to_monthly_averages)} nodes")
 
     # Insert into database
     print("\nInserting weather data into database...")
-    insert_weather_data(args.db, node_to_monthly_averages, node_to_station)
+    with profiler.phase("insert_weather_data"):
+        insert_weather_data(
+            db_path,
+            node_to_monthly_averages,
+            node_to_station,
+            args.storage or weather_storage(db_path),
+        )
+    publish_shadow_from_args(args)
+
+    print("\nHTTP latency:")
+    print_http_stats()
 
     return node_to_monthly_averages
 